@@ -1,69 +1,134 @@
 import streamlit as st
-import pandas as pd
 import os
 import sys
 from datetime import datetime
 import tempfile
 import re
-import json
 import base64
+import html
+import io
 import secrets
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
+import time
+import importlib
+from urllib.parse import quote
+
+# Início desta execução do script (base dos tempos de inicialização)
+INICIO_EXECUCAO = time.perf_counter()
 
 # Adicionar o diretório atual ao path para importar módulos locais
 sys.path.append('.')
 
-# Tentar importar os módulos locais
-try:
-    from operacional import GeradorPDFPTrab
-    MODULO_OPERACIONAL_CARREGADO = True
-except ImportError as e:
-    st.error(f"❌ Erro ao carregar módulo operacional: {e}")
-    MODULO_OPERACIONAL_CARREGADO = False
+@st.cache_resource(show_spinner=False)
+def tempos_inicializacao():
+    """Tempos do processo: módulos carregados sob demanda e primeira renderização de cada página"""
+    return {'modulos': {}, 'renderizacoes': {}}
 
-try:
-    from codom_manager import codom_manager
-    CODOM_MANAGER_CARREGADO = True
-except ImportError as e:
-    st.error(f"❌ Erro ao carregar gerenciador CODOM: {e}")
-    CODOM_MANAGER_CARREGADO = False
+@st.cache_resource(show_spinner=False)
+def obter_modulo(modulo, atributo=None):
+    """Importa o módulo local (e obtém sua instância global) uma única vez por processo"""
+    inicio = time.perf_counter()
+    objeto = importlib.import_module(modulo)
+    if atributo:
+        objeto = getattr(objeto, atributo)
+    decorrido = (time.perf_counter() - inicio) * 1000
+    tempos_inicializacao()['modulos'][modulo] = decorrido
+    print(f"⏱️ Módulo {modulo} carregado sob demanda em {decorrido:.0f} ms")
+    return objeto
 
-try:
-    from saldo_manager import saldo_manager
-    SALDO_MANAGER_CARREGADO = True
-except ImportError as e:
-    st.error(f"❌ Erro ao carregar gerenciador de saldo: {e}")
-    SALDO_MANAGER_CARREGADO = False
+class ModuloSobDemanda:
+    """Módulo local carregado apenas no primeiro uso (a tela de login não paga pelos gerenciadores)"""
+    def __init__(self, modulo, atributo, descricao):
+        self.modulo = modulo
+        self.atributo = atributo
+        self.descricao = descricao
+        self.erro = None
+    
+    def obter(self):
+        """Instância (ou módulo) carregada; None se a importação falhou nesta execução"""
+        if self.erro is not None:
+            return None
+        try:
+            return obter_modulo(self.modulo, self.atributo)
+        except Exception as e:
+            self.erro = e
+            st.error(f"❌ Erro ao carregar {self.descricao}: {e}")
+            return None
+    
+    @property
+    def carregado(self):
+        return self.obter() is not None
+    
+    def __getattr__(self, nome):
+        objeto = self.obter()
+        if objeto is None:
+            raise AttributeError(nome)
+        return getattr(objeto, nome)
 
+# O banco é necessário já no login; os demais módulos são importados no primeiro uso
 try:
-    from homologacao_system import homologacao_system
-    HOMOLOGACAO_SYSTEM_CARREGADO = True
-except ImportError as e:
-    st.error(f"❌ Erro ao carregar sistema de homologação: {e}")
-    HOMOLOGACAO_SYSTEM_CARREGADO = False
+    from storage import storage
+    STORAGE_CARREGADO = True
+except Exception as e:
+    st.error(f"❌ Erro ao abrir o banco de dados: {e}")
+    STORAGE_CARREGADO = False
+
+operacional = ModuloSobDemanda('operacional', None, "módulo operacional")
+codom_manager = ModuloSobDemanda('codom_manager', 'codom_manager', "gerenciador CODOM")
+saldo_manager = ModuloSobDemanda('saldo_manager', 'saldo_manager', "gerenciador de saldo")
+homologacao_system = ModuloSobDemanda('homologacao_system', 'homologacao_system', "sistema de homologação")
+controle_numeracao = ModuloSobDemanda('controle_numeracao', 'controle_numeracao', "controle de numeração")
+arquivo_morto = ModuloSobDemanda('arquivo_morto', None, "arquivo morto")
+pdf_processor = ModuloSobDemanda('pdf_processor', 'pdf_processor', "processador de PDFs")
+
+@st.cache_resource(show_spinner=False)
+def arquivar_exercicios_encerrados(ano_aberto):
+    """Verifica uma vez por processo (e exercício) se há exercícios a arquivar; homologação e saldo
+    só são carregados, por obter_modulo, quando há o que arquivar"""
+    if not arquivo_morto.carregado or not arquivo_morto.arquivamento_pendente(ano_aberto):
+        return False
+    homologacao, saldo = homologacao_system.obter(), saldo_manager.obter()
+    if homologacao is None or saldo is None:
+        raise RuntimeError("homologação ou saldo indisponível")
+    return arquivo_morto.arquivar_exercicios_encerrados(ano_aberto, homologacao, saldo)
 
 # Sistema de autenticação simplificado
 class AuthenticationSystem:
+    # Segundos entre consultas à versão da coleção; dentro do intervalo os reruns não acessam o banco
+    INTERVALO_VERIFICACAO = 5
+
     def __init__(self):
-        self.users_file = 'users.json'
-        self.tokens_file = 'password_tokens.json'
+        self.colecao = None
+        self.verificado_em = 0
         self.load_users()
     
+    @property
+    def users(self):
+        """Usuários compartilhados entre as sessões (relidos do banco apenas quando mudam)"""
+        return self.carregar_colecao()
+    
+    def carregar_colecao(self, forcar=False):
+        """Coleção de usuários; a versão no banco é conferida no máximo a cada INTERVALO_VERIFICACAO segundos"""
+        agora = time.monotonic()
+        if not forcar and self.colecao is not None and agora - self.verificado_em < self.INTERVALO_VERIFICACAO:
+            return self.colecao
+        try:
+            self.colecao = storage.colecao_compartilhada('users')
+            self.verificado_em = agora
+            return self.colecao
+        except Exception as e:
+            st.error(f"Erro ao carregar usuários: {e}")
+            return {}
+    
+    def invalidar(self):
+        """Após uma gravação, a próxima leitura confere a versão no banco"""
+        self.verificado_em = 0
+    
     def load_users(self):
-        """Carrega os usuários do arquivo JSON"""
+        """Carrega os usuários do banco de dados"""
         try:
-            if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    self.users = json.load(f)
-            else:
+            if not self.users:
                 # Usuário master padrão
-                self.users = {
+                storage.salvar_registros('users', {
                     "00000000000": {
                         'nome': "ADMINISTRADOR MASTER",
                         'posto': "CEL", 
@@ -75,19 +140,31 @@ class AuthenticationSystem:
                         'cadastrado_por': "SISTEMA",
                         'ativo': True
                     }
-                }
-                self.save_users()
+                })
+                self.invalidar()
         except Exception as e:
             st.error(f"Erro ao carregar usuários: {e}")
-            self.users = {}
     
     def save_users(self):
-        """Salva os usuários no arquivo JSON"""
+        """Salva todos os usuários no banco de dados"""
         try:
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, ensure_ascii=False, indent=2)
+            storage.salvar_registros('users', self.users)
         except Exception as e:
             st.error(f"Erro ao salvar usuários: {e}")
+        finally:
+            self.invalidar()
+    
+    def save_user(self, cpf, registro):
+        """Salva o registro do usuário informado. O registro deve ser uma cópia: a coleção
+        compartilhada entre as sessões só muda depois de gravada (storage)"""
+        try:
+            storage.salvar_registro('users', cpf, registro)
+            return True
+        except Exception as e:
+            st.error(f"Erro ao salvar usuário: {e}")
+            return False
+        finally:
+            self.invalidar()
     
     def hash_password(self, password):
         """Faz o hash da senha usando SHA-256"""
@@ -127,7 +204,7 @@ class AuthenticationSystem:
         cpf_clean = cpf_result
         
         # Verifica se CPF já existe - GARANTIR 1 CADASTRO POR CPF
-        if cpf_clean in self.users:
+        if cpf_clean in self.carregar_colecao(forcar=True):
             return False, "CPF já cadastrado"
         
         # Valida senha
@@ -140,7 +217,7 @@ class AuthenticationSystem:
             return False, "Email inválido"
         
         # Cria usuário
-        self.users[cpf_clean] = {
+        registro = {
             'nome': nome.upper(),
             'posto': posto,
             'om': om,
@@ -152,7 +229,8 @@ class AuthenticationSystem:
             'ativo': True
         }
         
-        self.save_users()
+        if not self.save_user(cpf_clean, registro):
+            return False, "Erro ao salvar usuário"
         return True, "Usuário cadastrado com sucesso"
     
     def update_user(self, cpf, updates):
@@ -160,21 +238,23 @@ class AuthenticationSystem:
         if cpf not in self.users:
             return False, "Usuário não encontrado"
         
-        # Atualizar campos permitidos
+        # Atualizar campos permitidos (numa cópia, gravada antes de chegar às demais sessões)
+        registro = dict(self.users[cpf])
         allowed_fields = ['nome', 'posto', 'om', 'email', 'perfil', 'ativo', 'password']
         for field, value in updates.items():
             if field in allowed_fields:
                 if field == 'nome':
-                    self.users[cpf][field] = value.upper()
+                    registro[field] = value.upper()
                 elif field == 'email':
-                    self.users[cpf][field] = value.lower()
+                    registro[field] = value.lower()
                 elif field == 'password':
                     # Se for atualização de senha, fazer o hash
-                    self.users[cpf][field] = self.hash_password(value)
+                    registro[field] = self.hash_password(value)
                 else:
-                    self.users[cpf][field] = value
+                    registro[field] = value
         
-        self.save_users()
+        if not self.save_user(cpf, registro):
+            return False, "Erro ao salvar usuário"
         return True, "Usuário atualizado com sucesso"
     
     def change_password(self, cpf, current_password, new_password):
@@ -192,8 +272,8 @@ class AuthenticationSystem:
             return False, msg
         
         # Atualizar senha
-        self.users[cpf]['password'] = self.hash_password(new_password)
-        self.save_users()
+        if not self.save_user(cpf, dict(self.users[cpf], password=self.hash_password(new_password))):
+            return False, "Erro ao salvar a nova senha"
         
         return True, "Senha alterada com sucesso"
     
@@ -206,8 +286,12 @@ class AuthenticationSystem:
         if cpf == "00000000000":
             return False, "Não é possível excluir o usuário master"
         
-        del self.users[cpf]
-        self.save_users()
+        try:
+            storage.excluir_registro('users', cpf)
+        except Exception as e:
+            return False, f"Erro ao excluir usuário: {e}"
+        finally:
+            self.invalidar()
         return True, "Usuário excluído com sucesso"
     
     def get_users_by_om(self, om_filter):
@@ -234,7 +318,8 @@ class AuthenticationSystem:
         if len(cpf_clean) != 11:
             return False, "CPF deve conter 11 dígitos"
         
-        if cpf_clean not in self.users:
+        # Login sempre confere o banco: usuário desativado em outro processo não entra
+        if cpf_clean not in self.carregar_colecao(forcar=True):
             return False, "CPF não encontrado"
         
         user = self.users[cpf_clean]
@@ -340,8 +425,13 @@ class AuthenticationSystem:
             # Em caso de erro, retorna a senha para o usuário
             return True, f"Erro no envio do email: {str(e)}. Sua nova senha é: {temp_password}"
 
-# Instância global do sistema de autenticação
-auth_system = AuthenticationSystem()
+@st.cache_resource(show_spinner=False)
+def obter_auth_system():
+    """Sistema de autenticação único por processo: criado (e o master verificado) só na primeira execução"""
+    sistema = AuthenticationSystem()
+    verificar_e_criar_usuario_master(sistema)
+    testar_login_master(sistema)
+    return sistema
 
 # Configuração da página
 st.set_page_config(
@@ -522,6 +612,14 @@ POSTOS_GRADUACOES = [
 
 # FUNÇÕES AUXILIARES PARA VISUALIZAÇÃO DE PDF E NC AUDITOR
 
+def url_pdf_upload(file_path):
+    """Retorna a URL estática (app/static/...) de um arquivo dentro da pasta static.
+    A rota estática não passa pelo login: quem tiver a URL acessa o arquivo (ver .streamlit/config.toml)"""
+    caminho_relativo = os.path.relpath(file_path, 'static')
+    if caminho_relativo.startswith('..'):
+        return None
+    return "app/static/" + quote(caminho_relativo.replace(os.sep, '/'))
+
 def mostrar_visualizador_pdf(pdf_id, pdf_data):
     """Exibe um visualizador de PDF para o homologador - ATUALIZADA"""
     st.markdown("---")
@@ -529,15 +627,18 @@ def mostrar_visualizador_pdf(pdf_id, pdf_data):
     st.warning("⚠️ **OBRIGATÓRIO:** Visualize o documento completo antes de homologar!")
     
     # Caminho do arquivo PDF
-    uploads_dir = "pdf_uploads"
-    file_path = os.path.join(uploads_dir, f"{pdf_id}_{pdf_data['nome_arquivo']}")
+    file_path = homologacao_system.get_pdf_path(pdf_id)
     
-    if os.path.exists(file_path):
+    if file_path and os.path.exists(file_path):
         # Mostrar informações do documento
         col1, col2 = st.columns(2)
         with col1:
             st.write(f"**Arquivo:** {pdf_data['nome_arquivo']}")
-            st.write(f"**Tamanho:** {os.path.getsize(file_path) / 1024:.1f} KB")
+            metadados = pdf_data.get('metadados') or {}
+            tamanho_bytes = metadados.get('tamanho_bytes') or os.path.getsize(file_path)
+            st.write(f"**Tamanho:** {tamanho_bytes / 1024:.1f} KB")
+            if metadados.get('paginas'):
+                st.write(f"**Páginas:** {metadados['paginas']}")
             st.write(f"**Status atual:** {pdf_data['status'].upper()}")
         with col2:
             st.write(f"**Tipo de Operação:** {'PREPARO' if pdf_data.get('tipo_operacao', '1') == '2' else 'EMPREGO'}")
@@ -548,29 +649,44 @@ def mostrar_visualizador_pdf(pdf_id, pdf_data):
             if pdf_data.get('numero_ptrab'):
                 st.write(f"**Nº P Trab:** {pdf_data['numero_ptrab']}")
         
-        # Botão para abrir o PDF
-        with open(file_path, "rb") as file:
-            pdf_bytes = file.read()
+        # O navegador busca o arquivo direto da rota estática (com suporte a Range),
+        # sem trafegar os bytes do PDF a cada execução do script
+        pdf_url = url_pdf_upload(file_path)
+        if not pdf_url:
+            st.error("❌ Arquivo PDF fora da pasta de publicação (static/).")
+            return
         
         # Exibir PDF embed
         st.markdown("### 📋 Visualização do PDF")
-        base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-        pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600" type="application/pdf"></iframe>'
+        pdf_display = f'<iframe src="{pdf_url}" width="100%" height="600" type="application/pdf"></iframe>'
         st.markdown(pdf_display, unsafe_allow_html=True)
         
-        # Botão de download
-        st.download_button(
-            label="📥 BAIXAR PDF PARA ANÁLISE",
-            data=pdf_bytes,
-            file_name=pdf_data['nome_arquivo'],
-            mime="application/pdf",
-            use_container_width=True
+        # Botão de download: o atributo download salva o arquivo (com o nome original) em vez de abri-lo
+        st.markdown(
+            f'<a href="{pdf_url}" download="{html.escape(pdf_data["nome_arquivo"], quote=True)}" '
+            'style="display: block; text-align: center; padding: 0.5rem; border: 1px solid #dee2e6; '
+            'border-radius: 0.5rem; text-decoration: none; color: inherit;">📥 BAIXAR PDF PARA ANÁLISE</a>',
+            unsafe_allow_html=True
         )
         
     else:
         st.error("❌ Arquivo PDF não encontrado no servidor.")
         st.info("📝 O arquivo pode ter sido movido ou excluído.")
 
+def mostrar_previa_pdf(pdf_data):
+    """Exibe miniatura, páginas e tamanho extraídos no upload, sem abrir o arquivo original"""
+    metadados = pdf_data.get('metadados')
+    if not metadados:
+        st.caption("⏳ Prévia em processamento...")
+        return
+    
+    thumbnail_url = url_pdf_upload(metadados['thumbnail']) if metadados.get('thumbnail') else None
+    if thumbnail_url:
+        st.markdown(f'<img src="{thumbnail_url}" style="width: 100%; max-width: 200px; border: 1px solid #dee2e6;">', unsafe_allow_html=True)
+    
+    paginas = metadados.get('paginas') or '?'
+    st.caption(f"{paginas} página(s) • {metadados.get('tamanho_bytes', 0) / 1024:.1f} KB")
+
 def verificar_visualizacao_pdf(pdf_id):
     """Verifica se o PDF foi visualizado antes da homologação"""
     if f'pdf_viewed_{pdf_id}' not in st.session_state:
@@ -580,7 +696,10 @@ def verificar_visualizacao_pdf(pdf_id):
 def abrir_planilha_nc_auditor():
     """Abre a planilha NC Auditor.xlsx usando o aplicativo padrão do sistema"""
     try:
-        nc_auditor_file = 'nc_auditor.xlsx'
+        nc_auditor_file = homologacao_system.nc_auditor_file
+        
+        # A planilha é gerada a partir do diário de aprovações apenas quando solicitada
+        homologacao_system.materializar_nc_auditor()
         
         if os.path.exists(nc_auditor_file):
             # Abrir o arquivo com o aplicativo padrão
@@ -663,10 +782,22 @@ def extrair_numero_ptrab_do_nome(nome_arquivo):
         print(f"Erro ao extrair número do P Trab: {e}")
         return None
 
+def detectar_numero_ptrab(pdf_data):
+    """Retorna (número do P Trab, origem): primeiro o lido do conteúdo do PDF, depois o do nome do arquivo"""
+    numero_ptrab = (pdf_data.get('metadados') or {}).get('numero_ptrab')
+    if numero_ptrab:
+        return numero_ptrab, "conteúdo do PDF"
+    
+    numero_ptrab = extrair_numero_ptrab_do_nome(pdf_data['nome_arquivo'])
+    if numero_ptrab:
+        return numero_ptrab, "nome do arquivo"
+    
+    return None, None
+
 # FUNÇÕES AUXILIARES PARA ALIMENTAÇÃO
 def atualizar_dados_automaticos_auth(tipo_item, codom_selecionado, vinculacao_ativa):
     """Atualiza OM e CODUG automaticamente baseado no CODOM e tipo selecionados - CORRIGIDO"""
-    if not CODOM_MANAGER_CARREGADO or not codom_selecionado or codom_selecionado == "Selecione o CODOM":
+    if not codom_manager.carregado or not codom_selecionado or codom_selecionado == "Selecione o CODOM":
         return "", ""
     
     # Determinar tipo para busca no CODOM
@@ -851,7 +982,7 @@ def criar_pdf_real(dados_cabecalho, dados_operacao, itens_alimentacao, dados_ass
         from reportlab.lib.units import mm
         
         # Usar o gerador do módulo operacional para garantir formatação consistente
-        gerador = GeradorPDFPTrab()
+        gerador = operacional.GeradorPDFPTrab()
         
         # Configurar documento
         doc = SimpleDocTemplate(
@@ -875,14 +1006,16 @@ def criar_pdf_real(dados_cabecalho, dados_operacao, itens_alimentacao, dados_ass
         
         # Processar itens para o formato correto
         itens_processados = []
+        # Um único retrato do CODOM para o documento inteiro, mesmo que uma recarga termine no meio
+        diretorio_codom = codom_manager.snapshot if codom_manager.carregado else None
         for item in itens_alimentacao:
             # CORREÇÃO CRÍTICA: Obter a sigla CORRETA baseada no tipo (QR/QS) para a coluna OM (UGE) CODUG
-            if CODOM_MANAGER_CARREGADO:
+            if codom_manager.carregado:
                 # Usar a sigla específica para o tipo selecionado - ESTA É A SIGLA QUE VAI NA COLUNA OM (UGE) CODUG
-                sigla_para_codug = codom_manager.get_sigla_for_tipo(item['codom'], item['tipo'])
+                sigla_para_codug = diretorio_codom.get_sigla_for_tipo(item['codom'], item['tipo'])
                 
                 # Para a coluna CODOM, usar a descrição completa
-                codom_completo = codom_manager.get_descricao_completa(item['codom'])
+                codom_completo = diretorio_codom.get_descricao_completa(item['codom'])
             else:
                 sigla_para_codug = item['om']
                 codom_completo = f"{item['codom']} - {item['om']}"
@@ -1031,18 +1164,9 @@ def criar_pdf_real(dados_cabecalho, dados_operacao, itens_alimentacao, dados_ass
 # Função para carregar OMs do CODOM
 def carregar_oms_do_codom():
     """Carrega a lista de OMs do arquivo CODOM.xlsx com formato CODOM - Descrição"""
-    oms = []
-    
-    if CODOM_MANAGER_CARREGADO and hasattr(codom_manager, 'codom_data'):
-        for codom, dados in codom_manager.codom_data.items():
-            descricao = dados.get('descricao', '')
-            
-            # Usar formato: CODOM - Descrição (ao invés de sigla)
-            display_text = f"{codom} - {descricao}"
-            oms.append(display_text)
-        
-        # Ordenar por CODOM
-        oms.sort()
+    if codom_manager.carregado and hasattr(codom_manager, 'get_lista_oms'):
+        # Lista ordenada montada uma única vez pelo codom_manager
+        oms = codom_manager.get_lista_oms()
     else:
         # Fallback caso o CODOM não esteja carregado
         oms = [
@@ -1059,6 +1183,11 @@ def pesquisar_oms(termo, lista_oms):
     if not termo:
         return lista_oms
     
+    if codom_manager.carregado and hasattr(codom_manager, 'buscar'):
+        # Índice do CODOM: resultados limitados e ordenados por relevância
+        resultados = codom_manager.buscar(termo)
+        return resultados if resultados else ["Nenhuma OM encontrada"]
+    
     termo = termo.lower().strip()
     resultados = []
     
@@ -1139,18 +1268,16 @@ def show_forgot_password():
                         # Gerar senha temporária
                         temp_password = auth_system.generate_temporary_password()
                         
-                        # Atualizar senha no sistema
-                        auth_system.users[cpf_clean]['password'] = auth_system.hash_password(temp_password)
-                        auth_system.save_users()
-                        
-                        # Enviar email
-                        success, message = auth_system.send_password_reset_email(cpf_clean, temp_password)
-                        
-                        if success:
-                            st.success(f"✅ {message}")
-                            st.info("⚠️ Por segurança, altere sua senha após o primeiro acesso.")
-                        else:
-                            st.error(f"❌ {message}")
+                        # Atualizar senha no sistema (se a gravação falhar, save_user já exibiu o erro)
+                        if auth_system.save_user(cpf_clean, dict(user, password=auth_system.hash_password(temp_password))):
+                            # Enviar email
+                            success, message = auth_system.send_password_reset_email(cpf_clean, temp_password)
+                            
+                            if success:
+                                st.success(f"✅ {message}")
+                                st.info("⚠️ Por segurança, altere sua senha após o primeiro acesso.")
+                            else:
+                                st.error(f"❌ {message}")
                     else:
                         st.error("❌ E-mail não corresponde ao cadastrado para este CPF")
                 else:
@@ -1295,6 +1422,7 @@ def show_user_registration():
 
 def show_users_management():
     """Exibe a gestão completa de usuários (apenas para master) - CORRIGIDO"""
+    import pandas as pd
     st.markdown('<div class="section-header">👥 GESTÃO DE USUÁRIOS</div>', unsafe_allow_html=True)
     
     # Verificar se é master
@@ -1302,6 +1430,8 @@ def show_users_management():
         st.error("❌ Acesso não autorizado. Esta funcionalidade requer perfil master.")
         return
     
+    mostrar_diretorio_codom()
+    
     # DEBUG: Verificar se o sistema de autenticação está carregado
     st.write("🔍 DEBUG: Verificando sistema de autenticação...")
     
@@ -1424,11 +1554,250 @@ def show_users_management():
     else:
         st.info("📝 Nenhum usuário encontrado com os filtros aplicados.")
 
+def mostrar_diretorio_codom():
+    """Situação do diretório CODOM e recarga do CODOM.xlsx sem reiniciar o sistema (apenas master)"""
+    if not codom_manager.carregado or not hasattr(codom_manager, 'recarregar'):
+        return
+    
+    with st.expander("🗂️ Diretório CODOM"):
+        diretorio = codom_manager.snapshot
+        st.write(f"**OMs carregadas:** {len(diretorio.codom_data)}")
+        st.write(f"**Carregado em:** {diretorio.carregado_em.strftime('%d/%m/%Y %H:%M:%S')}")
+        if codom_manager.recarga and codom_manager.recarga.is_alive():
+            st.info("🔄 Recarga em andamento. As consultas continuam usando o diretório atual.")
+        if codom_manager.ultimo_erro:
+            st.error(f"❌ Última recarga falhou: {codom_manager.ultimo_erro}")
+        
+        if st.button("🔄 RECARREGAR CODOM.xlsx", key="recarregar_codom"):
+            if codom_manager.recarregar():
+                st.success("✅ Recarga iniciada em segundo plano. O novo diretório entra em uso ao terminar.")
+            else:
+                st.warning("⚠️ Já existe uma recarga em andamento.")
+        
+        st.markdown("---")
+        st.write("**Importar nova planilha** (mostra o que muda antes de aplicar):")
+        novo_codom = st.file_uploader("Nova planilha CODOM.xlsx", type=['xlsx'], key="codom_importacao")
+        if novo_codom is not None:
+            mostrar_importacao_codom(novo_codom)
+        else:
+            # Upload descartado: a comparação anterior não fica presa à sessão
+            st.session_state.pop('importacao_codom', None)
+
+def mostrar_importacao_codom(arquivo):
+    """Diferenças entre a nova planilha e o diretório em uso, com os P Trab pendentes e itens do rascunho afetados"""
+    import pandas as pd
+    identificacao = (arquivo.name, arquivo.size)
+    importacao = st.session_state.get('importacao_codom')
+    if not importacao or importacao['identificacao'] != identificacao:
+        # A planilha é interpretada e comparada uma única vez por arquivo enviado (em memória, sem arquivo temporário)
+        conteudo = arquivo.getvalue()
+        try:
+            dados, diferencas = codom_manager.comparar_planilha(io.BytesIO(conteudo))
+        except Exception as e:
+            st.error(f"❌ Erro ao ler a nova planilha: {e}")
+            return
+        importacao = {'identificacao': identificacao, 'conteudo': conteudo, 'dados': dados, 'diferencas': diferencas}
+        st.session_state.importacao_codom = importacao
+    
+    diferencas = importacao['diferencas']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("OMs adicionadas", len(diferencas['adicionadas']))
+    col2.metric("OMs removidas", len(diferencas['removidas']))
+    col3.metric("OMs alteradas", len({a['codom'] for a in diferencas['alteradas']}))
+    col4.metric("CODUGs envolvidos", len(diferencas['codugs']))
+    
+    if diferencas['adicionadas']:
+        st.write("**Adicionadas:**")
+        st.dataframe(pd.DataFrame(diferencas['adicionadas']), use_container_width=True, hide_index=True)
+    if diferencas['removidas']:
+        st.write("**Removidas:**")
+        st.dataframe(pd.DataFrame(diferencas['removidas']), use_container_width=True, hide_index=True)
+    if diferencas['alteradas']:
+        st.write("**Alterações:**")
+        st.dataframe(pd.DataFrame(diferencas['alteradas']), use_container_width=True, hide_index=True)
+    
+    # P Trab pendentes e itens do rascunho atual que citam OMs ou UGs alteradas
+    if homologacao_system.carregado and diferencas['codoms_afetados']:
+        afetados = homologacao_system.get_pdfs_pendentes_afetados(diferencas['codoms_afetados'] + diferencas['codugs'])
+        if afetados:
+            st.warning(f"⚠️ {len(afetados)} P Trab pendente(s) citam OMs ou CODUGs alterados:")
+            pendentes = homologacao_system.get_pdfs_pendentes()
+            st.dataframe(pd.DataFrame([{
+                'Arquivo': pendentes[pdf_id]['nome_arquivo'],
+                'Enviado por': pendentes[pdf_id]['usuario'],
+                'OM': pendentes[pdf_id].get('om_usuario', ''),
+                'Cita': ", ".join(citados)
+            } for pdf_id, citados in afetados.items()]), use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhum P Trab pendente cita as OMs ou CODUGs alterados.")
+    
+    itens_afetados = codom_manager.itens_afetados(diferencas, st.session_state.get('itens_alimentacao', []))
+    for numero, motivos in itens_afetados.items():
+        for motivo in motivos:
+            st.warning(f"⚠️ Item {numero} do rascunho: {motivo}")
+    
+    if st.button("✅ APLICAR NOVA PLANILHA", type="primary", key="aplicar_importacao_codom"):
+        try:
+            codom_manager.importar_planilha(io.BytesIO(importacao['conteudo']), importacao['dados'])
+            del st.session_state.importacao_codom
+            st.success(f"✅ Diretório CODOM atualizado: {len(codom_manager.codom_data)} OMs")
+        except Exception as e:
+            st.error(f"❌ Erro ao aplicar a nova planilha: {e}")
+
+def show_busca_pdfs():
+    """Busca textual nos P Trab enviados (nome da operação, local, OM, número...)"""
+    consulta = st.text_input(
+        "🔎 **Buscar P Trab:**",
+        key="busca_pdfs",
+        placeholder="Nome da operação, local, OM, número do P Trab..."
+    )
+    
+    if not consulta.strip():
+        return
+    
+    resultados = homologacao_system.buscar_pdfs(consulta)
+    if not resultados:
+        st.info("📝 Nenhum documento encontrado.")
+        return
+    
+    st.caption(f"{len(resultados)} documento(s) encontrado(s)")
+    for pdf_id, relevancia in resultados:
+        pdf_data = homologacao_system.pdf_uploads[pdf_id]
+        col1, col2, col3 = st.columns([4, 2, 1])
+        with col1:
+            st.write(f"**{pdf_data['nome_arquivo']}** — {pdf_data['dados_operacao'].get('nome_operacao', 'N/A')}")
+            st.caption(f"{pdf_data['usuario']} • {pdf_data['om_usuario']} • {pdf_data['data_upload'][:10]}")
+        with col2:
+            st.write(f"**Status:** {pdf_data['status'].upper()}")
+            if pdf_data.get('numero_ptrab'):
+                st.caption(pdf_data['numero_ptrab'])
+        with col3:
+            if st.button("👁️", key=f"view_busca_{pdf_id}", help=f"Relevância: {relevancia:.2f}"):
+                st.session_state['current_viewing_pdf'] = pdf_id
+                st.rerun()
+        
+        if st.session_state.get('current_viewing_pdf') == pdf_id:
+            mostrar_visualizador_pdf(pdf_id, pdf_data)
+    
+    st.markdown("---")
+
+def mostrar_exercicios_arquivados():
+    """Consulta (somente leitura) aos uploads de exercícios encerrados"""
+    import pandas as pd
+    exercicios = homologacao_system.get_exercicios_arquivados()
+    if not exercicios:
+        return
+    
+    with st.expander("📦 Exercícios encerrados (arquivo morto)"):
+        ano = st.selectbox("Exercício:", exercicios, key="exercicio_arquivado")
+        pdfs = homologacao_system.get_pdfs_exercicio(ano)
+        st.caption(f"{len(pdfs)} documento(s) homologado(s) em {ano}")
+        st.dataframe(pd.DataFrame([{
+            'Arquivo': pdf_data['nome_arquivo'],
+            'Nº P Trab': pdf_data.get('numero_ptrab') or '',
+            'Status': pdf_data['status'].upper(),
+            'Usuário': pdf_data['usuario'],
+            'OM': pdf_data['om_usuario'],
+            'Operação': pdf_data['dados_operacao'].get('nome_operacao', 'N/A'),
+            'Valor': pdf_data.get('valor_operacao', 0),
+            'Homologado em': (pdf_data.get('data_homologacao') or '')[:16],
+            'Homologador': pdf_data.get('homologador') or ''
+        } for pdf_data in pdfs.values()]), use_container_width=True)
+
+def show_homologacao_lote(pdfs_pendentes):
+    """Homologação em lote: aprova ou rejeita vários documentos pendentes com uma única gravação"""
+    import pandas as pd
+    with st.expander("📦 HOMOLOGAÇÃO EM LOTE", expanded=False):
+        selecionados = st.multiselect(
+            "**Documentos:**",
+            options=list(pdfs_pendentes.keys()),
+            format_func=lambda pdf_id: f"{pdfs_pendentes[pdf_id]['nome_arquivo']} - {pdfs_pendentes[pdf_id]['usuario']} ({pdf_id})",
+            key="lote_selecionados"
+        )
+        
+        if not selecionados:
+            st.info("📝 Selecione os documentos já visualizados para homologar em lote.")
+            return
+        
+        # Tabela com o número do P Trab detectado (editável) e o valor de cada documento
+        linhas = []
+        for pdf_id in selecionados:
+            pdf_data = pdfs_pendentes[pdf_id]
+            linhas.append({
+                'ID': pdf_id,
+                'Arquivo': pdf_data['nome_arquivo'],
+                'Tipo': 'PREPARO' if pdf_data.get('tipo_operacao', '1') == '2' else 'EMPREGO',
+                'Valor (R$)': pdf_data.get('valor_operacao', 0),
+                'Nº P Trab': pdf_data.get('numero_ptrab') or detectar_numero_ptrab(pdf_data)[0] or ''
+            })
+        
+        tabela = st.data_editor(
+            pd.DataFrame(linhas),
+            disabled=['ID', 'Arquivo', 'Tipo', 'Valor (R$)'],
+            hide_index=True,
+            use_container_width=True,
+            key="lote_tabela"
+        )
+        numeros_ptrab = dict(zip(tabela['ID'], tabela['Nº P Trab']))
+        
+        total_preparo = sum(
+            pdfs_pendentes[pdf_id].get('valor_operacao', 0)
+            for pdf_id in selecionados
+            if pdfs_pendentes[pdf_id].get('tipo_operacao', '1') == '2'
+        )
+        if total_preparo > 0 and saldo_manager.carregado:
+            total_formatado = f"R$ {total_preparo:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            if total_preparo > saldo_manager.get_saldo_atual():
+                st.error(f"⚠️ Saldo insuficiente para o lote! Necessário: {total_formatado}, Disponível: {saldo_manager.get_saldo_formatado()}")
+            else:
+                st.info(f"💰 Total de PREPARO no lote: {total_formatado}")
+        
+        nao_visualizados = [pdf_id for pdf_id in selecionados if not st.session_state.get(f'pdf_viewed_{pdf_id}', False)]
+        if nao_visualizados:
+            st.warning(f"⚠️ **Visualize os documentos antes de homologar:** {', '.join(pdfs_pendentes[p]['nome_arquivo'] for p in nao_visualizados)}")
+            return
+        
+        justificativa = st.text_input(
+            "Justificativa (OBRIGATÓRIA para rejeição):",
+            key="lote_justificativa"
+        )
+        
+        col_btn1, col_btn2 = st.columns(2)
+        with col_btn1:
+            aprovar = st.button(f"✅ APROVAR {len(selecionados)} DOCUMENTO(S)", use_container_width=True, type="primary", key="lote_aprovar")
+        with col_btn2:
+            rejeitar = st.button(f"❌ REJEITAR {len(selecionados)} DOCUMENTO(S)", use_container_width=True, key="lote_rejeitar")
+        
+        if aprovar or rejeitar:
+            if rejeitar and not justificativa.strip():
+                st.error("❌ Justificativa obrigatória para rejeição!")
+                return
+            
+            success, msg = homologacao_system.homologar_lote(
+                numeros_ptrab,
+                st.session_state.user_info['nome'],
+                'aprovado' if aprovar else 'rejeitado',
+                justificativa
+            )
+            if success:
+                st.success(f"✅ {msg}")
+                
+                # Limpar estado de visualização
+                for pdf_id in selecionados:
+                    st.session_state.pop(f'pdf_viewed_{pdf_id}', None)
+                st.session_state.pop('current_viewing_pdf', None)
+                st.session_state.pop('lote_selecionados', None)
+                
+                st.rerun()
+            else:
+                st.error(f"❌ {msg}")
+
 def show_homologacao_tab():
     """Exibe a aba de homologação COTER com gerenciamento de saldo - ATUALIZADA COM EXTRACTION AUTOMÁTICA DO P TRAB"""
+    import pandas as pd
     
     # Verificar se o sistema de homologação está carregado
-    if not HOMOLOGACAO_SYSTEM_CARREGADO:
+    if not homologacao_system.carregado:
         st.error("❌ Sistema de homologação não está carregado. Não é possível acessar esta funcionalidade.")
         return
     
@@ -1441,7 +1810,7 @@ def show_homologacao_tab():
     st.markdown('<div class="section-header">📄 HOMOLOGAÇÃO COTER</div>', unsafe_allow_html=True)
     
     # Card de Saldo
-    if SALDO_MANAGER_CARREGADO:
+    if saldo_manager.carregado:
         saldo_atual = saldo_manager.get_saldo_atual()
         saldo_formatado = saldo_manager.get_saldo_formatado()
         
@@ -1465,7 +1834,10 @@ def show_homologacao_tab():
             if user_perfil == 'master':
                 if st.button("🔄 Resetar Saldo", use_container_width=True, type="secondary"):
                     if st.checkbox("Confirmar reset do saldo?"):
-                        success, msg = saldo_manager.resetar_saldo(st.session_state.user_info['nome'])
+                        try:
+                            success, msg = saldo_manager.resetar_saldo(st.session_state.user_info['nome'])
+                        except Exception as e:
+                            success, msg = False, f"❌ Erro ao resetar o saldo: {e}"
                         if success:
                             st.success(msg)
                             st.rerun()
@@ -1484,6 +1856,8 @@ def show_homologacao_tab():
                     st.error("❌ Erro ao abrir a planilha NC Auditor")
         st.markdown("---")
     
+    show_busca_pdfs()
+    
     tab1, tab2, tab3, tab4 = st.tabs(["⏳ PENDENTES", "✅ APROVADOS", "❌ REJEITADOS", "📊 EXTRATO"])
     
     with tab1:
@@ -1491,9 +1865,13 @@ def show_homologacao_tab():
         pdfs_pendentes = homologacao_system.get_pdfs_pendentes()
         
         if pdfs_pendentes:
+            show_homologacao_lote(pdfs_pendentes)
+            
             for pdf_id, pdf_data in pdfs_pendentes.items():
                 with st.expander(f"📄 {pdf_data['nome_arquivo']} - {pdf_data['usuario']} ({pdf_data['posto_usuario']})", expanded=False):
-                    col1, col2 = st.columns(2)
+                    col_previa, col1, col2 = st.columns([1, 2, 2])
+                    with col_previa:
+                        mostrar_previa_pdf(pdf_data)
                     with col1:
                         st.write(f"**Upload em:** {pdf_data['data_upload'][:16]}")
                         st.write(f"**Usuário:** {pdf_data['usuario']} ({pdf_data['posto_usuario']})")
@@ -1511,7 +1889,7 @@ def show_homologacao_tab():
                     
                     # Verificar saldo para operações de preparo
                     tipo_operacao = pdf_data.get('tipo_operacao', '1')  # Default para EMPREGO se não existir
-                    if tipo_operacao == '2' and SALDO_MANAGER_CARREGADO:
+                    if tipo_operacao == '2' and saldo_manager.carregado:
                         if valor_operacao > saldo_manager.get_saldo_atual():
                             st.error(f"⚠️ Saldo insuficiente! Necessário: R$ {valor_operacao:,.2f}, Disponível: {saldo_manager.get_saldo_formatado()}")
                     
@@ -1537,18 +1915,24 @@ def show_homologacao_tab():
                     if pdf_visualizado:
                         st.markdown("### 🎯 AÇÃO DE HOMOLOGAÇÃO")
                         
-                        # Extrair número do P Trab automaticamente do nome do arquivo
-                        numero_ptrab_extraido = extrair_numero_ptrab_do_nome(pdf_data['nome_arquivo'])
+                        # Número do P Trab lido do conteúdo do PDF no upload (ou, na falta, do nome do arquivo)
+                        numero_ptrab_extraido, origem_numero = detectar_numero_ptrab(pdf_data)
                         
                         if numero_ptrab_extraido:
-                            st.info(f"**Número do P Trab detectado automaticamente:** `{numero_ptrab_extraido}`")
+                            st.info(f"**Número do P Trab detectado automaticamente ({origem_numero}):** `{numero_ptrab_extraido}`")
+                            
+                            # Comparar o TOTAL GERAL impresso no documento com o valor informado no upload
+                            total_geral = (pdf_data.get('metadados') or {}).get('total_geral')
+                            if total_geral is not None and valor_operacao > 0 and abs(total_geral - valor_operacao) >= 0.01:
+                                total_formatado = f"R$ {total_geral:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                                st.warning(f"⚠️ TOTAL GERAL do documento ({total_formatado}) difere do valor informado no upload.")
                             
                             # Mostrar campo editável caso queira corrigir
                             numero_ptrab = st.text_input(
                                 "**Número do P Trab:**", 
                                 value=numero_ptrab_extraido,
                                 key=f"ptrab_{pdf_id}",
-                                help="Número extraído automaticamente do nome do arquivo. Edite se necessário."
+                                help=f"Número extraído automaticamente do {origem_numero}. Edite se necessário."
                             )
                         else:
                             st.warning("⚠️ Não foi possível detectar automaticamente o número do P Trab.")
@@ -1587,17 +1971,17 @@ def show_homologacao_tab():
                                     else:
                                         # Verificar saldo para operações de PREPARO
                                         tipo_operacao = pdf_data.get('tipo_operacao', '1')  # Default para EMPREGO se não existir
-                                        if tipo_operacao == '2' and SALDO_MANAGER_CARREGADO:
+                                        if tipo_operacao == '2' and saldo_manager.carregado:
                                             if valor_operacao > saldo_manager.get_saldo_atual():
                                                 st.error(f"❌ Saldo insuficiente! Necessário: R$ {valor_operacao:,.2f}, Disponível: {saldo_manager.get_saldo_formatado()}")
                                             else:
-                                                # Atualizar o PDF com o número do P Trab antes da homologação
-                                                homologacao_system.pdf_uploads[pdf_id]['numero_ptrab'] = numero_ptrab
+                                                # O número do P Trab é gravado junto com a homologação
                                                 success, msg = homologacao_system.homologar_pdf(
                                                     pdf_id, 
                                                     st.session_state.user_info['nome'], 
                                                     'aprovado', 
-                                                    justificativa_aprovacao
+                                                    justificativa_aprovacao,
+                                                    numero_ptrab=numero_ptrab
                                                 )
                                                 if success:
                                                     st.success(f"✅ {msg}")
@@ -1615,13 +1999,13 @@ def show_homologacao_tab():
                                                     st.error(f"❌ {msg}")
                                         else:
                                             # Para operações de EMPREGO ou quando não há saldo manager
-                                            # Atualizar o PDF com o número do P Trab antes da homologação
-                                            homologacao_system.pdf_uploads[pdf_id]['numero_ptrab'] = numero_ptrab
+                                            # O número do P Trab é gravado junto com a homologação
                                             success, msg = homologacao_system.homologar_pdf(
                                                 pdf_id, 
                                                 st.session_state.user_info['nome'], 
                                                 'aprovado', 
-                                                justificativa_aprovacao
+                                                justificativa_aprovacao,
+                                                numero_ptrab=numero_ptrab
                                             )
                                             if success:
                                                 st.success(f"✅ {msg}")
@@ -1657,13 +2041,13 @@ def show_homologacao_tab():
                                     if not justificativa_rejeicao.strip():
                                         st.error("❌ Justificativa obrigatória para rejeição!")
                                     else:
-                                        # Atualizar o PDF com o número do P Trab antes da homologação
-                                        homologacao_system.pdf_uploads[pdf_id]['numero_ptrab'] = numero_ptrab
+                                        # O número do P Trab é gravado junto com a homologação
                                         success, msg = homologacao_system.homologar_pdf(
                                             pdf_id, 
                                             st.session_state.user_info['nome'], 
                                             'rejeitado', 
-                                            justificativa_rejeicao
+                                            justificativa_rejeicao,
+                                            numero_ptrab=numero_ptrab
                                         )
                                         if success:
                                             st.success(f"✅ {msg}")
@@ -1731,6 +2115,8 @@ def show_homologacao_tab():
                                     st.error(msg)
         else:
             st.info("📝 Nenhum documento aprovado.")
+        
+        mostrar_exercicios_arquivados()
     
     with tab3:
         st.subheader("❌ Documentos Rejeitados")
@@ -1773,7 +2159,7 @@ def show_homologacao_tab():
     
     with tab4:
         st.subheader("📊 Extrato de Transações")
-        if SALDO_MANAGER_CARREGADO:
+        if saldo_manager.carregado:
             extrato = saldo_manager.get_extrato(limite=100)
             
             if extrato:
@@ -1815,6 +2201,21 @@ def show_homologacao_tab():
                     st.metric("Transações P Trab", len(transacoes_preparo))
             else:
                 st.info("📝 Nenhuma transação registrada.")
+            
+            exercicios = saldo_manager.exercicios_arquivados()
+            if exercicios:
+                with st.expander("📦 Extratos de exercícios encerrados"):
+                    ano = st.selectbox("Exercício:", exercicios, key="extrato_exercicio_arquivado")
+                    transacoes = saldo_manager.get_extrato_exercicio(ano)
+                    st.dataframe(pd.DataFrame([{
+                        'Data': t['data'][:16],
+                        'Tipo': t['tipo'].upper(),
+                        'Valor': t['valor'],
+                        'Descrição': t['descricao'],
+                        'Nº P Trab': t.get('numero_ptrab', 'N/A'),
+                        'Homologador': t['homologador'],
+                        'Saldo Posterior': t['saldo_posterior']
+                    } for t in transacoes]), use_container_width=True)
         else:
             st.error("❌ Gerenciador de saldo não carregado.")
 
@@ -1851,17 +2252,26 @@ def show_pdf_upload_tab():
             st.success("✅ Arquivo PDF válido!")
             
             if st.button("📤 ENVIAR PARA HOMOLOGAÇÃO", use_container_width=True):
-                pdf_id = homologacao_system.register_pdf_upload(
+                # Grava em blocos, nomeando o arquivo pelo SHA-256 do conteúdo
+                sha256, file_path = homologacao_system.armazenar_pdf(uploaded_file)
+                
+                # Duplicidade (pendente ou aprovado) verificada na mesma transação do registro
+                success, resultado = homologacao_system.register_pdf_upload(
                     uploaded_file, 
                     st.session_state.user_info, 
                     dados_operacao,
-                    valor_operacao
+                    valor_operacao,
+                    sha256=sha256
                 )
-                uploads_dir = "pdf_uploads"
-                os.makedirs(uploads_dir, exist_ok=True)
-                file_path = os.path.join(uploads_dir, f"{pdf_id}_{uploaded_file.name}")
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                if not success:
+                    st.error(f"❌ {resultado}")
+                    return
+                pdf_id = resultado
+                
+                # Páginas, tamanho e miniatura são extraídos em segundo plano
+                if pdf_processor.carregado:
+                    pdf_processor.processar_upload(pdf_id, file_path, homologacao_system.atualizar_metadados_pdf, sha256=sha256)
+                
                 st.success(f"✅ PDF enviado para homologação com ID: {pdf_id}")
                 if tipo_operacao == '2' and valor_operacao > 0:
                     valor_formatado = f"R$ {valor_operacao:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
@@ -1951,7 +2361,7 @@ def show_alimentacao_tab():
                 st.session_state.codom_pesquisa_anterior_auth = codom_pesquisa
             
             # Lista de CODOMs filtrados
-            if CODOM_MANAGER_CARREGADO:
+            if codom_manager.carregado:
                 if st.session_state.get('codom_pesquisa_auth', ''):
                     opcoes_codom = codom_manager.search_options(st.session_state.codom_pesquisa_auth)
                 else:
@@ -1959,6 +2369,11 @@ def show_alimentacao_tab():
             else:
                 opcoes_codom = ["CODOM não disponível"]
             
+            if codom_manager.carregado and st.session_state.get('codom_pesquisa_auth', ''):
+                from codom_manager import LIMITE_RESULTADOS as LIMITE_RESULTADOS_CODOM
+                if len(opcoes_codom) > LIMITE_RESULTADOS_CODOM:
+                    st.caption(f"Mostrando os {LIMITE_RESULTADOS_CODOM} resultados mais relevantes. Refine a pesquisa.")
+            
             # Selectbox com todas as opções
             codom_selecionado = st.selectbox(
                 "**Selecione o CODOM:**",
@@ -2020,7 +2435,7 @@ def show_alimentacao_tab():
         
         # DEBUG - Verificar Vinculação CODOM-CODUG
         with st.expander("🔍 DEBUG - Verificar Vinculação CODOM-CODUG"):
-            if codom_selecionado and CODOM_MANAGER_CARREGADO and codom_selecionado != "Selecione o CODOM":
+            if codom_selecionado and codom_manager.carregado and codom_selecionado != "Selecione o CODOM":
                 codom_limpo = codom_manager.extract_codom_from_selection(codom_selecionado)
                 if codom_limpo in codom_manager.codom_data:
                     dados = codom_manager.codom_data[codom_limpo]
@@ -2081,7 +2496,7 @@ def show_alimentacao_tab():
                         errors.append("Refeições intermediárias devem estar entre 1-3 para QR/QS em operações de EMPREGO")
                 
                 # Validar vinculação CODOM-CODUG
-                if vinculacao_ativa and CODOM_MANAGER_CARREGADO:
+                if vinculacao_ativa and codom_manager.carregado:
                     # Verificar se o CODUG gerado corresponde ao esperado para o tipo
                     codug_esperado = codom_manager.get_codug_for_tipo(codom_selecionado, tipo_item)
                     if codug != codug_esperado:
@@ -2166,10 +2581,52 @@ def show_alimentacao_tab():
         with col_stat4:
             tipos_racao = len([item for item in st.session_state.itens_alimentacao if item['eh_racao_operacional']])
             st.metric("Rações Operacionais", tipos_racao)
+        
+        mostrar_validacao_itens(st.session_state.itens_alimentacao)
+        mostrar_planejamento_empenho(st.session_state.itens_alimentacao)
             
     else:
         st.info("📝 Nenhum item de alimentação adicionado ainda.")
 
+def mostrar_validacao_itens(itens):
+    """Confere todos os itens contra o diretório CODOM (CODOM existente e CODUG vinculado ao tipo)"""
+    if not codom_manager.carregado or not hasattr(codom_manager, 'validar_itens'):
+        return
+    
+    problemas = codom_manager.validar_itens(itens)
+    if problemas:
+        st.warning(f"⚠️ {len(problemas)} item(ns) divergem do diretório CODOM:")
+        for numero, erros in problemas.items():
+            for erro in erros:
+                st.write(f"- **Item {numero}:** {erro}")
+
+def mostrar_planejamento_empenho(itens):
+    """Itens agrupados por UG (CODUG) e tipo: um empenho por UG"""
+    import pandas as pd
+    if not codom_manager.carregado or not hasattr(codom_manager, 'agrupar_itens_por_ug'):
+        return
+    
+    with st.expander("💰 Planejamento de empenho por UG"):
+        grupos = codom_manager.agrupar_itens_por_ug(itens)
+        st.dataframe(pd.DataFrame([{
+            'CODUG': grupo['codug'],
+            'Tipo': grupo['tipo'],
+            'OM vinculada (UG)': grupo['sigla'] or "Não consta no CODOM",
+            'Itens': ", ".join(str(n) for n in grupo['itens']),
+            'OMs atendidas': ", ".join(grupo['oms']),
+            'Efetivo': grupo['efetivo'],
+            'OMs da UG no diretório': grupo['oms_vinculadas']
+        } for grupo in grupos]), use_container_width=True, hide_index=True)
+        
+        # OMs do diretório ligadas a uma UG do plano (índice reverso CODUG -> CODOM)
+        ug = st.selectbox("Ver OMs vinculadas à UG:", options=[f"{g['codug']} - {g['tipo']}" for g in grupos],
+                          key="ug_planejamento_empenho")
+        if ug:
+            codug, tipo = ug.split(" - ")
+            oms = codom_manager.get_oms_por_codug(codug, tipo)
+            st.write(f"**{len(oms)} OM(s) vinculada(s) à UG {codug} para {tipo}:**")
+            st.write(", ".join(oms) if oms else "Nenhuma")
+
 def show_assinatura_tab():
     st.markdown('<div class="section-header">ASSINATURA DO DOCUMENTO</div>', unsafe_allow_html=True)
     
@@ -2230,10 +2687,13 @@ def show_gerar_pdf_tab():
     if not st.session_state.itens_alimentacao:
         st.warning("⚠️ Adicione pelo menos um item de alimentação antes de gerar o PDF.")
     else:
+        mostrar_validacao_itens(st.session_state.itens_alimentacao)
+        
         col_btn1, col_btn2, col_btn3 = st.columns([1, 2, 1])
         with col_btn2:
             if st.button("📄 GERAR PDF DO PLANO DE TRABALHO", type="primary", use_container_width=True):
                 with st.spinner("🔄 Gerando PDF... Aguarde..."):
+                    numero_controle = None
                     try:
                         # Coletar dados completos
                         dados_cabecalho = st.session_state.dados_completos['cabecalho']
@@ -2241,8 +2701,8 @@ def show_gerar_pdf_tab():
                         dados_assinatura = st.session_state.dados_assinatura
                         
                         # Gerar número de controle
-                        gerador = GeradorPDFPTrab()
-                        numero_controle = gerador.obter_numero_controle()
+                        gerador = operacional.GeradorPDFPTrab()
+                        numero_controle = gerador.obter_numero_controle(st.session_state.user_info['nome'])
                         
                         # Nome do arquivo
                         nome_unidade = dados_cabecalho['unidade']
@@ -2262,6 +2722,8 @@ def show_gerar_pdf_tab():
                         )
                         
                         if sucesso:
+                            if controle_numeracao.carregado:
+                                controle_numeracao.registrar_documento(numero_controle, nome_arquivo)
                             st.success(f"✅ PDF gerado com sucesso: {nome_arquivo}")
                             
                             # Mostrar resumo
@@ -2275,7 +2737,7 @@ def show_gerar_pdf_tab():
                                     total_racoes += item.get('quantidade_racoes', 0)
                                 else:
                                     # Calcular valor para QR/QS
-                                    if MODULO_OPERACIONAL_CARREGADO:
+                                    if operacional.carregado:
                                         if dados_operacao['tipo'] == '1':  # EMPREGO
                                             valor_total, _ = gerador.calcular_valores_emprego(
                                                 item['efetivo'], 
@@ -2316,18 +2778,21 @@ def show_gerar_pdf_tab():
                             else:
                                 st.warning("⚠️ Arquivo PDF não foi encontrado para download.")
                         else:
+                            if controle_numeracao.carregado:
+                                controle_numeracao.descartar(numero_controle, "Falha ao gerar o PDF")
                             st.error("❌ Falha ao gerar o PDF. Verifique os dados e tente novamente.")
                         
                     except Exception as e:
+                        if numero_controle and controle_numeracao.carregado:
+                            controle_numeracao.descartar(numero_controle, f"Erro ao gerar o PDF: {e}")
                         st.error(f"❌ Erro ao gerar PDF: {str(e)}")
                         import traceback
                         st.code(traceback.format_exc())
 
 # VERIFICAÇÃO SIMPLIFICADA DO USUÁRIO MASTER
-def verificar_e_criar_usuario_master():
+def verificar_e_criar_usuario_master(auth_system):
     """Verifica e cria o usuário master se necessário"""
     try:
-        auth_system.load_users()
         master_cpf = "00000000000"
         
         if master_cpf not in auth_system.users:
@@ -2353,8 +2818,7 @@ def verificar_e_criar_usuario_master():
         print(f"❌ Erro na verificação do usuário master: {e}")
 
 # DEBUG - Testar login do master
-def testar_login_master():
-    auth_system.load_users()
+def testar_login_master(auth_system):
     master_cpf = "00000000000"
     
     if master_cpf in auth_system.users:
@@ -2364,9 +2828,8 @@ def testar_login_master():
     else:
         print("🔍 DEBUG - Usuário master NÃO encontrado!")
 
-# Executar verificação
-verificar_e_criar_usuario_master()
-testar_login_master()
+# Instância global do sistema de autenticação (a mesma em todos os reruns e sessões do processo)
+auth_system = obter_auth_system()
 
 # Função principal
 def main():
@@ -2395,6 +2858,19 @@ def main():
         show_login_page()
         return
     
+    # Na virada do ano, exercícios encerrados vão para o arquivo morto
+    try:
+        arquivar_exercicios_encerrados(datetime.now().year)
+    except Exception as e:
+        st.error(f"❌ Erro ao arquivar exercícios encerrados: {e}")
+    
+    # CODOM.xlsx alterado: recarrega em segundo plano (no máximo uma verificação a cada poucos segundos)
+    if codom_manager.carregado:
+        try:
+            codom_manager.verificar_atualizacao()
+        except Exception as e:
+            print(f"Erro ao verificar atualização do CODOM: {e}")
+    
     user_perfil = st.session_state.user_info['perfil']
     user_nome = st.session_state.user_info['nome']
     
@@ -2437,12 +2913,12 @@ def main():
     
     st.markdown("---")
     
-    if not MODULO_OPERACIONAL_CARREGADO:
+    if not operacional.carregado:
         st.error("❌ Módulo operacional não carregado!")
         st.markdown('</div>', unsafe_allow_html=True)
         return
         
-    if not CODOM_MANAGER_CARREGADO:
+    if not codom_manager.carregado:
         st.warning("⚠️ Gerenciador CODOM não carregado.")
     
     # CORREÇÃO: Definição correta das abas por perfil
@@ -2479,5 +2955,16 @@ def main():
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def registrar_renderizacao(pagina):
+    """Na primeira renderização de cada página no processo, registra e imprime o relatório de inicialização"""
+    tempos = tempos_inicializacao()
+    if pagina in tempos['renderizacoes']:
+        return
+    tempos['renderizacoes'][pagina] = (time.perf_counter() - INICIO_EXECUCAO) * 1000
+    modulos = ", ".join(f"{nome} {ms:.0f} ms" for nome, ms in tempos['modulos'].items()) or "nenhum"
+    print(f"⏱️ Primeira renderização ({pagina}): {tempos['renderizacoes'][pagina]:.0f} ms | "
+          f"módulos carregados sob demanda: {modulos}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    registrar_renderizacao('aplicação' if st.session_state.get('logged_in') else 'login')
\ No newline at end of file
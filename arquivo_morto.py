@@ -0,0 +1,117 @@
+import gzip
+import json
+import os
+import re
+import stat
+import threading
+from datetime import datetime
+from storage import storage
+from arquivos import trava_arquivo, gravar_arquivo_atomico
+from serializador import carregar, para_bytes
+
+class ArquivoMorto:
+    def __init__(self):
+        # Exercícios encerrados: um arquivo compactado e somente leitura por coleção e ano
+        self.pasta = 'arquivo_morto'
+        self.lock = threading.Lock()
+        self.cache = {}  # {(nome, ano): (mtime, dados)} dos exercícios já consultados
+
+    def caminho(self, nome, ano):
+        return os.path.join(self.pasta, f"{nome}_{ano}.json.gz")
+
+    def anos(self, nome):
+        """Exercícios arquivados de uma coleção, do mais recente para o mais antigo"""
+        if not os.path.isdir(self.pasta):
+            return []
+        padrao = re.compile(rf'^{re.escape(nome)}_(\d{{4}})\.json\.gz$')
+        return sorted((int(m.group(1)) for m in map(padrao.match, os.listdir(self.pasta)) if m), reverse=True)
+
+    def ler(self, nome, ano, padrao=None):
+        """Lê (sob demanda) o exercício arquivado; o conteúdo fica em memória enquanto o arquivo não mudar"""
+        caminho = self.caminho(nome, ano)
+        if not os.path.exists(caminho):
+            return padrao
+        mtime = os.path.getmtime(caminho)
+        with self.lock:
+            em_cache = self.cache.get((nome, ano))
+            if em_cache and em_cache[0] == mtime:
+                return em_cache[1]
+        with gzip.open(caminho, 'rb') as f:
+            dados = carregar(f.read())
+        with self.lock:
+            self.cache[(nome, ano)] = (mtime, dados)
+        return dados
+
+    def gravar(self, nome, ano, dados):
+        """Grava o exercício compactado (substituição atômica) e o deixa somente leitura"""
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = self.caminho(nome, ano)
+
+        def escrever(temp_file):
+            with gzip.open(temp_file, 'wb') as f:
+                f.write(para_bytes(storage.serializador.dumps(dados)))
+            os.chmod(temp_file, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+        if os.path.exists(caminho):
+            # No Windows não é possível substituir um arquivo somente leitura
+            os.chmod(caminho, stat.S_IRUSR | stat.S_IWUSR)
+        gravar_arquivo_atomico(caminho, escrever)
+        with self.lock:
+            self.cache.pop((nome, ano), None)
+
+    def acrescentar(self, nome, ano, novos):
+        """Junta novos registros ao exercício arquivado (dict: por chave; list: ao final)"""
+        os.makedirs(self.pasta, exist_ok=True)
+        with trava_arquivo(self.caminho(nome, ano)):
+            if isinstance(novos, dict):
+                dados = dict(self.ler(nome, ano, {}))
+                dados.update(novos)
+            else:
+                # Uma repetição após interrupção não duplica linhas
+                dados = list(self.ler(nome, ano, []))
+                existentes = {json.dumps(linha, sort_keys=True, ensure_ascii=False) for linha in dados}
+                dados += [linha for linha in novos if json.dumps(linha, sort_keys=True, ensure_ascii=False) not in existentes]
+            self.gravar(nome, ano, dados)
+
+# Instância global do arquivo morto
+arquivo_morto = ArquivoMorto()
+
+def ano_do_registro(data_iso):
+    """Exercício (ano) de uma data ISO; None se ausente ou em outro formato"""
+    try:
+        return int(str(data_iso)[:4]) if data_iso else None
+    except ValueError:
+        return None
+
+def arquivamento_pendente(ano_aberto=None):
+    """True se os exercícios anteriores ao aberto ainda não foram arquivados (só uma consulta ao banco)"""
+    return storage.get_configuracao('exercicio_aberto') != (ano_aberto or datetime.now().year)
+
+def arquivar_exercicios_encerrados(ano_aberto=None, homologacao_system=None, saldo_manager=None):
+    """Move para o arquivo morto os exercícios anteriores ao aberto (uma vez por virada de ano).
+    Os gerenciadores podem ser passados já carregados; senão são importados aqui"""
+    ano_aberto = ano_aberto or datetime.now().year
+    if not arquivamento_pendente(ano_aberto):
+        return False
+
+    os.makedirs(arquivo_morto.pasta, exist_ok=True)
+    with trava_arquivo(os.path.join(arquivo_morto.pasta, 'arquivamento')):
+        # Outro processo pode ter arquivado enquanto esperávamos a trava
+        if not arquivamento_pendente(ano_aberto):
+            return False
+
+        if homologacao_system is None:
+            from homologacao_system import homologacao_system
+        if saldo_manager is None:
+            from saldo_manager import saldo_manager
+
+        print(f"📦 Arquivando exercícios anteriores a {ano_aberto}...")
+        homologacao_system.arquivar_exercicios(ano_aberto)
+        saldo_manager.arquivar_exercicios(ano_aberto)
+        storage.set_configuracoes({'exercicio_aberto': ano_aberto})
+        return True
+
+if __name__ == "__main__":
+    arquivar_exercicios_encerrados()
+    for nome in ['pdf_uploads', 'saldo_transacoes', 'nc_auditor']:
+        print(f"{nome}: {arquivo_morto.anos(nome)}")
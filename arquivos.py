@@ -0,0 +1,60 @@
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_CARREGADO = True
+except ImportError:
+    # Windows
+    import msvcrt
+    FCNTL_CARREGADO = False
+
+# Travas já obtidas pela thread atual: {caminho}
+_local = threading.local()
+
+@contextmanager
+def trava_arquivo(caminho):
+    """Trava exclusiva entre processos (e threads) usando o arquivo caminho.lock; reentrante na mesma thread"""
+    travas = _local.__dict__.setdefault('travas', set())
+    if caminho in travas:
+        yield
+        return
+    
+    travas.add(caminho)
+    try:
+        with _travar(caminho):
+            yield
+    finally:
+        travas.discard(caminho)
+
+@contextmanager
+def _travar(caminho):
+    with open(f"{caminho}.lock", 'a+b') as trava:
+        if FCNTL_CARREGADO:
+            fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+        else:
+            trava.seek(0)
+            msvcrt.locking(trava.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if FCNTL_CARREGADO:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+            else:
+                trava.seek(0)
+                msvcrt.locking(trava.fileno(), msvcrt.LK_UNLCK, 1)
+
+def gravar_arquivo_atomico(caminho, escrever):
+    """Chama escrever(caminho_temporario) e renomeia sobre o destino: leitores nunca veem arquivo pela metade"""
+    pasta = os.path.dirname(caminho) or '.'
+    temp_file = os.path.join(pasta, f".{os.path.basename(caminho)}.{os.getpid()}_{secrets.token_hex(4)}.tmp")
+    try:
+        escrever(temp_file)
+        with open(temp_file, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_file, caminho)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
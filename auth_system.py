@@ -6,58 +6,73 @@ import re
 import smtplib
 from email.mime.text import MimeText
 from email.mime.multipart import MimeMultipart
-import json
 import os
+from storage import storage
 from datetime import datetime, timedelta
 
 class AuthenticationSystem:
     def __init__(self):
-        self.users_file = 'users.json'
-        self.tokens_file = 'password_tokens.json'
         self.load_users()
         self.load_tokens()
     
-    def load_users(self):
-        """Carrega os usuários do arquivo JSON"""
+    @property
+    def users(self):
+        """Usuários compartilhados entre as sessões (relidos do banco apenas quando mudam)"""
         try:
-            if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    self.users = json.load(f)
-            else:
-                self.users = {}
-                self.save_users()
+            return storage.colecao_compartilhada('users')
         except Exception as e:
             st.error(f"Erro ao carregar usuários: {e}")
-            self.users = {}
+            return {}
+    
+    def load_users(self):
+        """Descarta o cache e relê os usuários do banco de dados"""
+        storage.invalidar_cache('users')
     
     def save_users(self):
-        """Salva os usuários no arquivo JSON"""
+        """Salva todos os usuários no banco de dados"""
         try:
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, ensure_ascii=False, indent=2)
+            storage.salvar_registros('users', self.users)
         except Exception as e:
             st.error(f"Erro ao salvar usuários: {e}")
     
-    def load_tokens(self):
-        """Carrega os tokens de recuperação de senha"""
+    def save_user(self, cpf, registro):
+        """Salva o registro do usuário informado. O registro deve ser uma cópia: a coleção
+        compartilhada entre as sessões só muda depois de gravada (storage)"""
         try:
-            if os.path.exists(self.tokens_file):
-                with open(self.tokens_file, 'r') as f:
-                    self.tokens = json.load(f)
-            else:
-                self.tokens = {}
-                self.save_tokens()
+            storage.salvar_registro('users', cpf, registro)
+            return True
+        except Exception as e:
+            st.error(f"Erro ao salvar usuário: {e}")
+            return False
+    
+    @property
+    def tokens(self):
+        """Tokens de recuperação de senha compartilhados entre as sessões"""
+        try:
+            return storage.colecao_compartilhada('password_tokens')
         except Exception as e:
             st.error(f"Erro ao carregar tokens: {e}")
-            self.tokens = {}
+            return {}
     
-    def save_tokens(self):
-        """Salva os tokens no arquivo JSON"""
+    def load_tokens(self):
+        """Descarta o cache e relê os tokens do banco de dados"""
+        storage.invalidar_cache('password_tokens')
+    
+    def save_token(self, token, registro):
+        """Salva um token de recuperação de senha (a coleção compartilhada só muda depois de gravada)"""
         try:
-            with open(self.tokens_file, 'w') as f:
-                json.dump(self.tokens, f, indent=2)
+            storage.salvar_registro('password_tokens', token, registro)
+            return True
         except Exception as e:
-            st.error(f"Erro ao salvar tokens: {e}")
+            st.error(f"Erro ao salvar token: {e}")
+            return False
+    
+    def delete_token(self, token):
+        """Remove um token de recuperação de senha"""
+        try:
+            storage.excluir_registro('password_tokens', token)
+        except Exception as e:
+            st.error(f"Erro ao excluir token: {e}")
     
     def hash_password(self, password):
         """Faz o hash da senha usando SHA-256"""
@@ -100,7 +115,7 @@ class AuthenticationSystem:
             return False, "Email inválido"
         
         # Cria usuário
-        self.users[cpf_clean] = {
+        registro = {
             'nome': nome.upper(),
             'posto': posto.upper(),
             'om': om.upper(),
@@ -112,7 +127,8 @@ class AuthenticationSystem:
             'ativo': True
         }
         
-        self.save_users()
+        if not self.save_user(cpf_clean, registro):
+            return False, "Erro ao salvar usuário"
         return True, "Usuário cadastrado com sucesso"
     
     def update_user(self, cpf, updates):
@@ -120,21 +136,23 @@ class AuthenticationSystem:
         if cpf not in self.users:
             return False, "Usuário não encontrado"
         
-        # Atualizar campos permitidos
+        # Atualizar campos permitidos (numa cópia, gravada antes de chegar às demais sessões)
+        registro = dict(self.users[cpf])
         allowed_fields = ['nome', 'posto', 'om', 'email', 'perfil', 'ativo', 'password']
         for field, value in updates.items():
             if field in allowed_fields:
                 if field == 'nome':
-                    self.users[cpf][field] = value.upper()
+                    registro[field] = value.upper()
                 elif field == 'email':
-                    self.users[cpf][field] = value.lower()
+                    registro[field] = value.lower()
                 elif field == 'password':
                     # Se for atualização de senha, fazer o hash
-                    self.users[cpf][field] = self.hash_password(value)
+                    registro[field] = self.hash_password(value)
                 else:
-                    self.users[cpf][field] = value
+                    registro[field] = value
         
-        self.save_users()
+        if not self.save_user(cpf, registro):
+            return False, "Erro ao salvar usuário"
         return True, "Usuário atualizado com sucesso"
     
     def change_password(self, cpf, current_password, new_password):
@@ -152,8 +170,8 @@ class AuthenticationSystem:
             return False, msg
         
         # Atualizar senha
-        self.users[cpf]['password'] = self.hash_password(new_password)
-        self.save_users()
+        if not self.save_user(cpf, dict(self.users[cpf], password=self.hash_password(new_password))):
+            return False, "Erro ao salvar a nova senha"
         
         return True, "Senha alterada com sucesso"
     
@@ -166,8 +184,10 @@ class AuthenticationSystem:
         if cpf == "00000000000":
             return False, "Não é possível excluir o usuário master"
         
-        del self.users[cpf]
-        self.save_users()
+        try:
+            storage.excluir_registro('users', cpf)
+        except Exception as e:
+            return False, f"Erro ao excluir usuário: {e}"
         return True, "Usuário excluído com sucesso"
     
     def get_users_by_om(self, om_filter):
@@ -208,12 +228,13 @@ class AuthenticationSystem:
         token = secrets.token_urlsafe(32)
         expires = datetime.now() + timedelta(hours=24)
         
-        self.tokens[token] = {
+        registro = {
             'cpf': cpf_clean,
             'expires': expires.isoformat()
         }
         
-        self.save_tokens()
+        if not self.save_token(token, registro):
+            return None
         return token
     
     def validate_token(self, token):
@@ -225,8 +246,7 @@ class AuthenticationSystem:
         expires = datetime.fromisoformat(token_data['expires'])
         
         if datetime.now() > expires:
-            del self.tokens[token]
-            self.save_tokens()
+            self.delete_token(token)
             return False
         
         return token_data['cpf']
@@ -241,11 +261,10 @@ class AuthenticationSystem:
         if not is_valid:
             return False, msg
         
-        self.users[cpf]['password'] = self.hash_password(new_password)
-        del self.tokens[token]
+        if not self.save_user(cpf, dict(self.users[cpf], password=self.hash_password(new_password))):
+            return False, "Erro ao salvar a nova senha"
         
-        self.save_users()
-        self.save_tokens()
+        self.delete_token(token)
         
         return True, "Senha redefinida com sucesso"
     
@@ -0,0 +1,84 @@
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# Processos novos por medição (cada um é uma partida a frio)
+REPETICOES = 5
+
+# Revisão de referência: o app antes do carregamento sob demanda (pode ser trocada na linha de comando)
+REVISAO_BASE = 'b83029d'
+
+# Módulos pesados que a tela de login não deveria importar
+MODULOS_PESADOS = ['pandas', 'reportlab', 'codom_manager', 'homologacao_system', 'saldo_manager',
+                   'pdf_processor', 'operacional']
+
+# Primeira renderização da tela de login em um processo novo (streamlit já importado, como no servidor).
+# O mesmo script mede as duas versões: do início do AppTest até o fim da primeira execução do app.
+SCRIPT_LOGIN = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+inicio = time.perf_counter()
+at = AppTest.from_file('app_streamlit.py', default_timeout=120)
+at.run()
+decorrido = (time.perf_counter() - inicio) * 1000
+print(json.dumps({'ms': decorrido, 'erros': [e.value for e in at.exception],
+                  'carregados': [m for m in %r if m in sys.modules]}))
+""" % MODULOS_PESADOS
+
+# Bancos, caches e arquivos gerados que não entram na cópia: as duas versões partem dos mesmos dados
+IGNORAR = shutil.ignore_patterns('.git', '__pycache__', 'arquivo_morto', 'static', '*.db', '*.db-wal', '*.db-shm',
+                                 '*.lock', '*.bin', '*.jsonl', 'pdf_search_index.json')
+
+def extrair_revisao(revisao, pasta, destino):
+    """Arquivos da revisão (git archive) na pasta destino, sem alterar a árvore de trabalho"""
+    conteudo = subprocess.run(['git', 'archive', '--format=tar', revisao], cwd=pasta,
+                              capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(conteudo)) as tar:
+        tar.extractall(destino)
+
+def medir(pasta):
+    """Resultados de REPETICOES processos novos renderizando o login na pasta do app"""
+    # Execução de preparo, fora da conta: migrações e caches de primeira execução
+    subprocess.run([sys.executable, '-c', SCRIPT_LOGIN], cwd=pasta, capture_output=True, text=True, check=True)
+    resultados = []
+    for _ in range(REPETICOES):
+        saida = subprocess.run([sys.executable, '-c', SCRIPT_LOGIN], cwd=pasta, capture_output=True, text=True, check=True)
+        resultados.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+    return resultados
+
+def main():
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    revisao = sys.argv[1] if len(sys.argv) > 1 else REVISAO_BASE
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pasta_base = os.path.join(temp_dir, 'base')
+        pasta_atual = os.path.join(temp_dir, 'atual')
+        extrair_revisao(revisao, pasta, pasta_base)
+        shutil.copytree(pasta, pasta_atual, ignore=IGNORAR)
+
+        print(f"Medindo {REPETICOES} partidas a frio de cada versão...")
+        base = medir(pasta_base)
+        atual = medir(pasta_atual)
+
+    print()
+    print(f"{'primeira renderização do login':<52}{'mediana':>10}{'mínimo':>10}")
+    for nome, resultados in [(f"antes, tudo importado no início ({revisao})", base),
+                             ("agora, módulos sob demanda", atual)]:
+        tempos = [r['ms'] for r in resultados]
+        print(f"{nome:<52}{statistics.median(tempos):>7.0f} ms{min(tempos):>7.0f} ms")
+
+    for nome, resultados in [("antes", base), ("agora", atual)]:
+        carregados = sorted({m for r in resultados for m in r['carregados']})
+        print(f"\nMódulos pesados importados pela tela de login ({nome}): {', '.join(carregados) or 'nenhum'}")
+        erros = [e for r in resultados for e in r['erros']]
+        if erros:
+            print(f"⚠️ Exceções na renderização ({nome}): {erros}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import gc
+import os
+import subprocess
+import sys
+import tracemalloc
+import types
+
+# Diretório nacional simulado: as OMs do CODOM.xlsx replicadas até este total
+QTD_OMS = 15000
+
+# Revisão com o retrato anterior (dict de dicts, índices em dict/set); pode ser trocada na linha de comando
+REVISAO_ANTERIOR = 'f5c4564^'
+
+def gerar_diretorio(quantidade):
+    """{CODOM: dados} no formato de codom_manager, com as strings separadas como vêm do cache/planilha"""
+    from codom_manager import codom_manager
+
+    base = [dict(codom_manager.codom_data[codom]) for codom in codom_manager.codom_data]
+    dados = {}
+    for i in range(quantidade):
+        registro = dict(base[i % len(base)])
+        registro['descricao'] = f"{registro['descricao']} ({i // len(base) + 1})" if i >= len(base) else registro['descricao']
+        dados[str(10000 + i)] = registro
+    return dados
+
+def tamanho_profundo(*objetos):
+    """Bytes ocupados pelos objetos e tudo o que eles referenciam (objetos compartilhados contam uma vez)"""
+    vistos = set()
+    pilha = list(objetos)
+    total = 0
+    while pilha:
+        obj = pilha.pop()
+        if id(obj) in vistos or isinstance(obj, type):
+            continue
+        vistos.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pilha.extend(obj.keys())
+            pilha.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pilha.extend(obj)
+    return total
+
+def carregar_copia(dados):
+    """Nova cópia dos dados com strings próprias (cada medição parte do mesmo estado da carga real)"""
+    from serializador import obter_serializador, carregar
+    return carregar(obter_serializador().dumps(dados))
+
+def representacao_antiga(dados):
+    """O que cada processo mantinha antes: dict de dicts, all_options e a lista de OMs do app"""
+    all_options = sorted(["Selecione o CODOM"] + [f"{codom} - {d['descricao']}" for codom, d in dados.items()],
+                         key=lambda x: x.lower())
+    lista_app = sorted(f"{codom} - {d['descricao']}" for codom, d in dados.items())
+    return dados, all_options, lista_app
+
+def diretorio_anterior(revisao, pasta):
+    """Classe DiretorioCODOM do codom_manager.py da revisão informada (lido do git, sem alterar a pasta)"""
+    codigo = subprocess.run(['git', 'show', f'{revisao}:codom_manager.py'], cwd=pasta,
+                            capture_output=True, text=True, check=True).stdout
+    modulo = types.ModuleType('codom_manager_anterior')
+    modulo.__file__ = os.path.join(pasta, 'codom_manager.py')
+    exec(compile(codigo, f'{revisao}:codom_manager.py', 'exec'), modulo.__dict__)
+    return modulo.DiretorioCODOM
+
+def medir(construir):
+    """(bytes retidos segundo o tracemalloc, objeto construído)"""
+    gc.collect()
+    tracemalloc.start()
+    inicio = tracemalloc.get_traced_memory()[0]
+    objeto = construir()
+    gc.collect()
+    retido = tracemalloc.get_traced_memory()[0] - inicio
+    tracemalloc.stop()
+    return retido, objeto
+
+def main():
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, pasta)
+    from codom_manager import DiretorioCODOM
+    revisao = sys.argv[1] if len(sys.argv) > 1 else REVISAO_ANTERIOR
+    DiretorioAnterior = diretorio_anterior(revisao, pasta)
+
+    print(f"Gerando diretório com {QTD_OMS} OMs...")
+    dados = gerar_diretorio(QTD_OMS)
+
+    retido_antigo, antigo = medir(lambda: representacao_antiga(carregar_copia(dados)))
+    retido_anterior, _ = medir(lambda: DiretorioAnterior(carregar_copia(dados)))
+    retido_novo, diretorio = medir(lambda: DiretorioCODOM(carregar_copia(dados)))
+
+    dados_antigos = tamanho_profundo(*antigo)
+    dados_novos = tamanho_profundo(diretorio.codoms, diretorio.posicao, diretorio.colunas, diretorio.opcoes,
+                                   diretorio.all_options, diretorio.lista_oms, diretorio.resolucao)
+    indices = tamanho_profundo(diretorio.indice_prefixos, diretorio.indice_trigramas, diretorio.campos_busca,
+                               diretorio.linhas_por_palavra, diretorio.vocabulario, diretorio.qtd_trigramas,
+                               diretorio.trigramas_palavras, diretorio.ordem_opcoes, diretorio.linhas_ordenadas,
+                               diretorio.linhas_por_codug)
+
+    print()
+    print(f"{'representação':<48}{'dados':>12}{'retido (tracemalloc)':>24}")
+    print(f"{'dict de dicts + listas, sem índices':<48}{dados_antigos / 1024 / 1024:>9.2f} MB{retido_antigo / 1024 / 1024:>21.2f} MB")
+    print(f"{f'retrato anterior com índices ({revisao})':<48}{'':>12}{retido_anterior / 1024 / 1024:>21.2f} MB")
+    print(f"{'colunas internadas com índices (atual)':<48}{dados_novos / 1024 / 1024:>9.2f} MB{retido_novo / 1024 / 1024:>21.2f} MB")
+    print(f"\nÍndices de pesquisa do DiretorioCODOM (incluídos no retido): {indices / 1024 / 1024:.2f} MB")
+    print(f"Dados: {dados_novos / dados_antigos:.0%} da representação antiga; "
+          f"retrato completo: {retido_novo / retido_anterior:.0%} do anterior")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Volumes realistas de um exercício
+QTD_UPLOADS = 10000
+QTD_TRANSACOES = 100000
+QTD_USUARIOS = 5000
+
+def gerar_uploads(quantidade):
+    """Registros no formato de homologacao_system.register_pdf_upload"""
+    inicio = datetime(2025, 1, 2)
+    uploads = {}
+    for i in range(quantidade):
+        data = inicio + timedelta(minutes=37 * i)
+        sha256 = secrets.token_hex(32)
+        uploads[f"PDF_{data.strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"] = {
+            'nome_arquivo': f"P_TRAB_{i:05d}_2025.pdf",
+            'sha256': sha256,
+            'arquivo': f"{sha256}.pdf",
+            'data_upload': data.isoformat(),
+            'usuario': f"USUARIO {i % 500}",
+            'cpf_usuario': f"{i:011d}",
+            'posto_usuario': random.choice(['Cap', 'Maj', 'Ten Cel', '1º Ten']),
+            'om_usuario': f"{6000 + i % 300} - {i % 300}º BI",
+            'dados_operacao': {
+                'nome_operacao': f"OPERAÇÃO {i % 120}",
+                'periodo': "01/03/2025 a 15/03/2025",
+                'local': "Cascavel - PR",
+                'solicitante': "15ª Bda Inf Mec",
+                'efetivo_total': random.randint(20, 900),
+                'tipo': random.choice(['1', '2'])
+            },
+            'valor_operacao': round(random.uniform(1000, 250000), 2),
+            'status': random.choice(['pendente', 'aprovado', 'rejeitado']),
+            'data_homologacao': (data + timedelta(days=2)).isoformat(),
+            'homologador': "ADMINISTRADOR MASTER",
+            'justificativa': None,
+            'tipo_operacao': random.choice(['1', '2']),
+            'numero_ptrab': f"P Trab Nr {i:05d}/2025",
+            'metadados': {'tamanho_bytes': random.randint(50000, 900000), 'paginas': random.randint(1, 12),
+                          'sha256': sha256, 'thumbnail': f"static/pdf_thumbnails/{i}.png",
+                          'processado_em': data.isoformat(), 'numero_ptrab': f"P Trab Nr {i:05d}/2025",
+                          'total_geral': round(random.uniform(1000, 250000), 2)}
+        }
+    return uploads
+
+def gerar_transacoes(quantidade):
+    """Transações no formato de saldo_manager"""
+    saldo = 5000000.00
+    inicio = datetime(2025, 1, 2)
+    transacoes = []
+    for i in range(quantidade):
+        valor = round(random.uniform(10, 5000), 2)
+        tipo = 'estorno' if i % 10 == 9 else 'abatimento'
+        anterior = saldo
+        saldo = saldo + valor if tipo == 'estorno' else saldo - valor
+        transacoes.append({
+            'id': f"PTRAB_P Trab Nr {i:05d}/2025",
+            'numero_ptrab': f"P Trab Nr {i:05d}/2025",
+            'tipo': tipo,
+            'valor': valor,
+            'descricao': f"P Trab: P Trab Nr {i:05d}/2025 - OPERAÇÃO {i % 120}",
+            'homologador': "ADMINISTRADOR MASTER",
+            'data': (inicio + timedelta(minutes=3 * i)).isoformat(),
+            'saldo_anterior': anterior,
+            'saldo_posterior': saldo
+        })
+    return transacoes
+
+def gerar_usuarios(quantidade):
+    """Usuários no formato de AuthenticationSystem"""
+    return {
+        f"{i:011d}": {
+            'nome': f"USUÁRIO DE TESTE {i}",
+            'posto': random.choice(['CEL', 'TC', 'MAJ', 'CAP']),
+            'om': f"{6000 + i % 300} - {i % 300}º BI",
+            'email': f"usuario{i}@eb.mil.br",
+            'password': secrets.token_hex(32),
+            'perfil': random.choice(['usuario', 'homologador', 'master']),
+            'data_cadastro': datetime(2025, 1, 1).isoformat(),
+            'cadastrado_por': "SISTEMA",
+            'ativo': True
+        } for i in range(quantidade)
+    }
+
+def cronometrar(funcao, repeticoes=3):
+    """Melhor tempo (ms) entre as repetições"""
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        decorrido = (time.perf_counter() - inicio) * 1000
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor
+
+def benchmark_arquivo_json(nome, dados, pasta):
+    """Referência: o formato antigo (arquivo inteiro com json.dump(indent=2) a cada gravação)"""
+    os.makedirs(os.path.join(pasta, 'json'), exist_ok=True)
+    caminho = os.path.join(pasta, 'json', f"{nome}.json")
+
+    def gravar():
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, indent=2, ensure_ascii=False)
+
+    def ler():
+        with open(caminho, 'r', encoding='utf-8') as f:
+            json.load(f)
+
+    gravacao = cronometrar(gravar)
+    return {'gravar_tudo': gravacao, 'ler_tudo': cronometrar(ler),
+            'gravar_um': gravacao, 'bytes': os.path.getsize(caminho)}
+
+def benchmark_banco(banco, serializador, nome, dados):
+    """Coleção no SQLite com o serializador informado"""
+    banco.serializador = serializador
+    if nome == 'saldo_transacoes':
+        with banco.transacao() as conn:
+            conn.execute("DELETE FROM saldo_transacoes")
+        def gravar_tudo():
+            with banco.transacao() as conn:
+                banco._inserir_transacoes_saldo(conn, dados)
+        ler_tudo = lambda: banco.carregar_transacoes_saldo()
+        gravar_um = lambda: banco.registrar_transacoes_saldo([dados[-1]])
+        tamanho = lambda: banco.conexao().execute("SELECT SUM(LENGTH(dados)) FROM saldo_transacoes").fetchone()[0]
+    else:
+        chave = next(iter(dados))
+        gravar_tudo = lambda: banco.salvar_registros(nome, dados)
+        ler_tudo = lambda: banco.carregar_colecao(nome)
+        gravar_um = lambda: banco.salvar_registro(nome, chave, dados[chave])
+        tamanho = lambda: banco.conexao().execute(
+            "SELECT SUM(LENGTH(valor)) FROM registros WHERE colecao = ?", (nome,)).fetchone()[0]
+
+    resultado = {
+        'gravar_tudo': cronometrar(gravar_tudo, 1),
+        'ler_tudo': cronometrar(ler_tudo),
+        'gravar_um': cronometrar(gravar_um, 20),
+        'bytes': tamanho()
+    }
+    # Conferência: o conteúdo lido é igual ao gravado
+    lido = ler_tudo()
+    assert (lido[:len(dados)] if nome == 'saldo_transacoes' else lido) == dados
+    return resultado
+
+def main():
+    random.seed(42)
+    pasta = tempfile.mkdtemp(prefix='ptrab_bench_')
+    # O banco de teste fica na pasta temporária (e não migra os JSON do diretório atual)
+    os.chdir(pasta)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from storage import SQLiteStorage
+    from serializador import serializadores_disponiveis
+
+    print(f"Gerando dados: {QTD_UPLOADS} uploads, {QTD_TRANSACOES} transações, {QTD_USUARIOS} usuários...")
+    colecoes = {
+        'pdf_uploads': gerar_uploads(QTD_UPLOADS),
+        'saldo_transacoes': gerar_transacoes(QTD_TRANSACOES),
+        'users': gerar_usuarios(QTD_USUARIOS)
+    }
+
+    linhas = []
+    for nome, dados in colecoes.items():
+        linhas.append((nome, 'arquivo json (antigo)', benchmark_arquivo_json(nome, dados, pasta)))
+        for serializador in serializadores_disponiveis().values():
+            banco = SQLiteStorage(db_file=os.path.join(pasta, f"bench_{serializador.nome}.db"))
+            linhas.append((nome, f"sqlite + {serializador.nome}", benchmark_banco(banco, serializador, nome, dados)))
+
+    print()
+    print(f"{'coleção':<18}{'formato':<24}{'gravar tudo':>14}{'ler tudo':>12}{'gravar 1':>12}{'tamanho':>12}")
+    for nome, formato, r in linhas:
+        print(f"{nome:<18}{formato:<24}{r['gravar_tudo']:>11.1f} ms{r['ler_tudo']:>9.1f} ms"
+              f"{r['gravar_um']:>9.2f} ms{r['bytes'] / 1024 / 1024:>9.1f} MB")
+    print("\n'gravar 1' = custo de registrar uma alteração (o formato antigo regrava o arquivo inteiro).")
+    print(f"Arquivos temporários em {pasta}")
+
+if __name__ == "__main__":
+    main()
@@ -1,125 +1,439 @@
-import pandas as pd
+import bisect
+import hashlib
+import heapq
 import os
+import re
+import shutil
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from datetime import datetime
+from serializador import obter_serializador, carregar, para_bytes
+from arquivos import gravar_arquivo_atomico
+
+# Incrementar quando o formato da tabela interpretada mudar (invalida os caches existentes)
+VERSAO_CACHE = 3
+
+# Campos de cada OM no diretório
+CAMPOS_CODOM = ('descricao', 'sigla_qr', 'sigla_qs', 'codug_qr', 'codug_qs')
+
+# Máximo de opções devolvidas por pesquisa (o selectbox não precisa de milhares de itens)
+LIMITE_RESULTADOS = 50
+
+# Similaridade mínima (trigramas em comum / trigramas distintos) para aceitar uma palavra digitada com erro
+LIMIAR_SIMILARIDADE = 0.3
+
+# Peso de uma palavra do diretório que apenas começa pela digitada (a própria palavra vale 1)
+SIMILARIDADE_PREFIXO = 0.9
+
+# Palavras com até este tamanho têm poucos trigramas: aceitam uma letra trocada, a mais ou a menos
+TAMANHO_MAXIMO_EDICAO = 4
+
+# Intervalo mínimo (s) entre verificações de alteração do CODOM.xlsx
+INTERVALO_VERIFICACAO = 5
+
+# Indicador ordinal após número: 40º, 1ª, 2°, 40o
+PADRAO_ORDINAL = re.compile(r'(\d)\s*[ºª°]|(\d)[oa](?=[\s/)\-]|$)')
+
+def normalizar_busca(texto):
+    """Texto comparável na pesquisa: minúsculas, sem acentos e sem ordinais ('40º BI' -> '40 bi')"""
+    texto = PADRAO_ORDINAL.sub(lambda m: m.group(1) or m.group(2), str(texto or ""))
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split())
+
+def dividir_palavras(texto):
+    """Palavras de um texto já normalizado"""
+    return [palavra for palavra in re.split(r'[\s/\-()]+', texto) if palavra]
+
+def trigramas_palavra(palavra):
+    """Trigramas da palavra com bordas marcadas, como no pg_trgm"""
+    palavra = f"  {palavra} "
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+def diferem_em_uma_edicao(a, b):
+    """Se a e b diferem em no máximo uma letra trocada, inserida ou removida (distância de Levenshtein <= 1)"""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + 1:] == b[i + 1:] if len(a) == len(b) else a[i:] == b[i + 1:]
+
+def adicionar_linha(linhas, i):
+    """Acrescenta a linha à lista de ocorrências (as linhas chegam em ordem; repetidas são ignoradas)"""
+    if not linhas or linhas[-1] != i:
+        linhas.append(i)
+
+class TabelaCODOM(Mapping):
+    """Visão somente leitura {CODOM: {descricao, sigla_qr, sigla_qs, codug_qr, codug_qs}} sobre as colunas do diretório"""
+    __slots__ = ('_diretorio',)
+
+    def __init__(self, diretorio):
+        self._diretorio = diretorio
+
+    def __getitem__(self, codom):
+        return self._diretorio.registro(self._diretorio.posicao[codom])
+
+    def __contains__(self, codom):
+        return codom in self._diretorio.posicao
+
+    def __iter__(self):
+        return iter(self._diretorio.codoms)
+
+    def __len__(self):
+        return len(self._diretorio.codoms)
+
+class DiretorioCODOM:
+    """Retrato imutável do diretório CODOM e dos seus índices; a recarga substitui o retrato inteiro"""
+    def __init__(self, codom_data, assinatura=None):
+        # Armazenamento em colunas (uma tupla por campo, linha i = i-ésimo CODOM) com textos internados:
+        # siglas e CODUGs repetidos em milhares de OMs ficam uma única vez na memória
+        registros = list(codom_data.values())
+        self.codoms = tuple(sys.intern(str(codom)) for codom in codom_data)
+        self.posicao = {codom: i for i, codom in enumerate(self.codoms)}
+        self.colunas = {campo: tuple(sys.intern(str(registro[campo])) for registro in registros)
+                        for campo in CAMPOS_CODOM}
+        self.codom_data = TabelaCODOM(self)  # Mesmo acesso de antes: codom_data[codom]['descricao']
+        self.assinatura = assinatura  # mtime/tamanho/sha256 da planilha de origem (None: dados padrão)
+        self.carregado_em = datetime.now()
+        self.all_options = self._criar_lista_opcoes()  # Todas as opções para pesquisa
+        self._construir_indice()
+        self._construir_indices_reversos()
+
+    def registro(self, i):
+        """Linha i do diretório como dicionário (montado na hora)"""
+        return {campo: coluna[i] for campo, coluna in self.colunas.items()}
+
+    def _criar_lista_opcoes(self):
+        """Cria a lista de opções para o Spinner"""
+        # Usar formato: CODOM - Descrição (ao invés de sigla); a mesma string serve à lista, ao índice e ao PDF
+        self.opcoes = tuple(f"{codom} - {descricao}" for codom, descricao in zip(self.codoms, self.colunas['descricao']))
+        return sorted(["Selecione o CODOM", *self.opcoes], key=lambda x: x.lower())
+    
+    def _construir_indice(self):
+        """Monta os índices de prefixo, trechos e palavras sobre CODOM, descrição e siglas QR/QS (já normalizados)"""
+        # Os índices guardam a linha (posição nas colunas), não cópias dos dados
+        # Empates no ranking seguem a ordem alfabética do selectbox
+        self.linhas_ordenadas = array('I', sorted(range(len(self.codoms)), key=lambda i: self.opcoes[i].lower()))
+        self.ordem_opcoes = array('I', bytes(4 * len(self.codoms)))
+        for posicao, i in enumerate(self.linhas_ordenadas):
+            self.ordem_opcoes[i] = posicao
+        self.lista_oms = sorted(self.opcoes)
+        self._resolver_opcoes()
+        campos_busca = []
+        termos = set()
+        trigramas = {}
+        palavras = {}
+        for i, codom in enumerate(self.codoms):
+            campos = [sys.intern(normalizar_busca(valor)) for valor in
+                      (codom, self.colunas['descricao'][i], self.colunas['sigla_qr'][i], self.colunas['sigla_qs'][i])]
+            # Os campos normalizados são as próprias chaves do índice de prefixos (não há texto concatenado por linha)
+            campos_busca += campos
+            # Prefixos: o campo inteiro e cada palavra dele
+            for campo in campos:
+                termos.add((campo, i))
+                for palavra in dividir_palavras(campo):
+                    palavra = sys.intern(palavra)
+                    termos.add((palavra, i))
+                    adicionar_linha(palavras.setdefault(palavra, array('I')), i)
+                for j in range(len(campo) - 2):
+                    adicionar_linha(trigramas.setdefault(campo[j:j + 3], array('I')), i)
+        self.campos_busca = tuple(campos_busca)  # Linha i: campos_busca[4 * i:4 * i + 4]
+        termos = sorted(termos)
+        self.indice_prefixos = ([t for t, _ in termos], array('I', (i for _, i in termos)))
+        self.indice_trigramas = trigramas  # {trigrama: linhas em ordem crescente}
+
+        # Vocabulário para a busca tolerante a erros de digitação; as palavras são referidas pela posição nele
+        self.vocabulario = sorted(palavras)
+        self.linhas_por_palavra = [palavras[palavra] for palavra in self.vocabulario]
+        self.qtd_trigramas = array('H')
+        trigramas_palavras = {}
+        for n, palavra in enumerate(self.vocabulario):
+            tri = trigramas_palavra(palavra)
+            self.qtd_trigramas.append(len(tri))
+            for t in tri:
+                trigramas_palavras.setdefault(t, array('I')).append(n)
+        self.trigramas_palavras = trigramas_palavras
+
+    def _construir_indices_reversos(self):
+        """Índices reversos por tipo (qr/qs): CODUG -> linhas"""
+        self.linhas_por_codug = {}
+        for campo in ('qr', 'qs'):
+            por_codug = {}
+            for i, codug in enumerate(self.colunas[f"codug_{campo}"]):
+                if codug:  # OM sem CODUG na planilha não forma UG
+                    por_codug.setdefault(codug, array('I')).append(i)
+            self.linhas_por_codug[campo] = por_codug
+
+    def get_oms_por_codug(self, codug, tipo):
+        """OMs (CODOM - Descrição) vinculadas à UG para o tipo (QR/QS/Ração)"""
+        linhas = self.linhas_por_codug[self._campo_por_tipo(tipo)].get(str(codug or "").strip(), ())
+        return [self.opcoes[i] for i in linhas]
+
+    def get_sigla_da_ug(self, codug, tipo):
+        """Sigla da OM vinculada que responde pela UG no tipo; vazio se a UG não consta no diretório"""
+        campo = self._campo_por_tipo(tipo)
+        linhas = self.linhas_por_codug[campo].get(str(codug or "").strip())
+        return self.colunas[f"sigla_{campo}"][linhas[0]] if linhas else ""
+
+    def agrupar_itens_por_ug(self, itens):
+        """Planejamento de empenho: itens agrupados pela UG (CODUG) e tipo que recebem o crédito"""
+        grupos = {}
+        for n, item in enumerate(itens, start=1):
+            campo = self._campo_por_tipo(item.get('tipo'))
+            codug = str(item.get('codug') or "").strip()
+            grupo = grupos.get((codug, campo))
+            if grupo is None:
+                grupo = grupos[(codug, campo)] = {
+                    'codug': codug,
+                    'tipo': campo.upper(),
+                    'sigla': self.get_sigla_da_ug(codug, campo.upper()),
+                    'oms_vinculadas': len(self.linhas_por_codug[campo].get(codug, ())),
+                    'itens': [],
+                    'oms': [],
+                    'efetivo': 0
+                }
+            grupo['itens'].append(n)
+            if item.get('om') and item['om'] not in grupo['oms']:
+                grupo['oms'].append(item['om'])
+            grupo['efetivo'] += item.get('efetivo') or 0
+        return sorted(grupos.values(), key=lambda g: (g['codug'], g['tipo']))
+
+    def validar_itens(self, itens):
+        """Confere de uma vez os itens contra o diretório: {número do item: [problemas]} (vazio se todos estão corretos)"""
+        problemas = {}
+        for n, item in enumerate(itens, start=1):
+            erros = []
+            tipo = item.get('tipo')
+            campo = self._campo_por_tipo(tipo)
+            codug = str(item.get('codug') or "").strip()
+            i = self.resolver(str(item.get('codom') or ""))
+            if i is None:
+                erros.append(f"CODOM {item.get('codom')} não encontrado no diretório")
+            elif not self.colunas[f"codug_{campo}"][i]:
+                erros.append(f"CODOM {self.codoms[i]} sem CODUG válido no diretório para {campo.upper()}")
+            elif codug != self.colunas[f"codug_{campo}"][i]:
+                erros.append(f"CODUG {codug} difere do vinculado ao CODOM {self.codoms[i]} para {campo.upper()} "
+                             f"({self.colunas[f'codug_{campo}'][i]})")
+            if codug and codug not in self.linhas_por_codug[campo]:
+                erros.append(f"CODUG {codug} não é UG de nenhuma OM do diretório para {campo.upper()}")
+            if erros:
+                problemas[n] = erros
+        return problemas
+
+    def _resolver_opcoes(self):
+        """Linha já resolvida por opção (o CODOM sozinho usa self.posicao): cada consulta de item ou PDF é uma única busca"""
+        self.resolucao = {opcao: i for i, opcao in enumerate(self.opcoes)}
+
+    def resolver(self, codom_selection):
+        """Linha da seleção (opção do Spinner ou CODOM); None se não existir"""
+        if not codom_selection or codom_selection == "Selecione o CODOM":
+            return None
+        i = self.resolucao.get(codom_selection)
+        if i is None:
+            i = self.posicao.get(self.extract_codom_from_selection(codom_selection))
+        return i
+
+    def _por_prefixo(self, termo):
+        """Linhas com algum campo (ou palavra) começando pelo termo"""
+        chaves, linhas = self.indice_prefixos
+        inicio = bisect.bisect_left(chaves, termo)
+        fim = bisect.bisect_left(chaves, termo + '\uffff', inicio)
+        return set(linhas[inicio:fim])
+
+    def _por_trecho(self, termo, ignorar, limite):
+        """Linhas cujo texto contém o termo; os trigramas do termo restringem os candidatos"""
+        if len(termo) >= 3:
+            # A menor lista de linhas entre os trigramas do termo já restringe; o "in" confirma o trecho
+            listas = [self.indice_trigramas.get(termo[j:j + 3], ()) for j in range(len(termo) - 2)]
+            candidatos = min(listas, key=len)
+            return {i for i in candidatos if i not in ignorar and self._contem(i, termo)}
+        # Termos curtos: percorre na ordem do selectbox e para ao completar o limite
+        encontrados = set()
+        for i in self.linhas_ordenadas:
+            if len(encontrados) >= limite:
+                break
+            if i not in ignorar and self._contem(i, termo):
+                encontrados.add(i)
+        return encontrados
+
+    def _contem(self, i, termo):
+        """Se algum campo normalizado da linha i contém o termo"""
+        campos = self.campos_busca
+        return (termo in campos[4 * i] or termo in campos[4 * i + 1]
+                or termo in campos[4 * i + 2] or termo in campos[4 * i + 3])
+
+    def _palavras_semelhantes(self, palavra):
+        """{posição no vocabulário: similaridade}; a própria palavra vale 1 e as que começam por ela, SIMILARIDADE_PREFIXO"""
+        semelhantes = {}
+        n = bisect.bisect_left(self.vocabulario, palavra)
+        while n < len(self.vocabulario) and self.vocabulario[n].startswith(palavra):
+            semelhantes[n] = 1.0 if self.vocabulario[n] == palavra else SIMILARIDADE_PREFIXO
+            n += 1
+        tri = trigramas_palavra(palavra)
+        comuns = Counter()
+        for t in tri:
+            comuns.update(self.trigramas_palavras.get(t, ()))
+        for candidata, qtd in comuns.items():
+            if candidata not in semelhantes:
+                similaridade = qtd / (len(tri) + self.qtd_trigramas[candidata] - qtd)
+                if similaridade >= LIMIAR_SIMILARIDADE:
+                    semelhantes[candidata] = similaridade
+        # Uma letra errada em palavra curta ('bl', 'mc') derruba a similaridade; números não, pois indicam outra OM
+        if 2 <= len(palavra) <= TAMANHO_MAXIMO_EDICAO and not any(c.isdigit() for c in palavra):
+            for candidata, existente in enumerate(self.vocabulario):
+                if candidata not in semelhantes and diferem_em_uma_edicao(palavra, existente):
+                    semelhantes[candidata] = LIMIAR_SIMILARIDADE
+        # Palavra por extenso e abreviatura no diretório ('logistica' -> 'log', 'infantaria' -> 'inf')
+        for tamanho in range(3, len(palavra)):
+            n = bisect.bisect_left(self.vocabulario, palavra[:tamanho])
+            if n < len(self.vocabulario) and self.vocabulario[n] == palavra[:tamanho] and n not in semelhantes:
+                semelhantes[n] = LIMIAR_SIMILARIDADE
+        return semelhantes
+
+    def _por_semelhanca(self, termo, ignorar):
+        """{linha: pontuação} das OMs que têm uma palavra parecida com cada palavra do termo"""
+        pontuacao = None
+        for palavra in dividir_palavras(termo):
+            por_linha = {}
+            for semelhante, similaridade in self._palavras_semelhantes(palavra).items():
+                for i in self.linhas_por_palavra[semelhante]:
+                    if similaridade > por_linha.get(i, 0):
+                        por_linha[i] = similaridade
+            if pontuacao is None:
+                pontuacao = por_linha
+            else:
+                pontuacao = {i: pontuacao[i] + s for i, s in por_linha.items() if i in pontuacao}
+            if not pontuacao:
+                break
+        return {i: s for i, s in (pontuacao or {}).items() if i not in ignorar}
+
+    def buscar(self, termo, limite=LIMITE_RESULTADOS):
+        """Até limite opções, na ordem: CODOM exato, prefixo, trecho e, por último, palavras parecidas"""
+        termo = normalizar_busca(termo)
+        if not termo:
+            return []
+        resultados = []
+        vistos = set()
+        exato = self.posicao.get(termo)
+        if exato is not None:
+            resultados.append(exato)
+            vistos.add(exato)
+        prefixos = self._por_prefixo(termo) - vistos
+        resultados += heapq.nsmallest(limite - len(resultados), prefixos, key=self.ordem_opcoes.__getitem__)
+        vistos |= prefixos
+        if len(resultados) < limite:
+            trechos = self._por_trecho(termo, vistos, limite - len(resultados))
+            resultados += heapq.nsmallest(limite - len(resultados), trechos, key=self.ordem_opcoes.__getitem__)
+            vistos |= trechos
+        if len(resultados) < limite:
+            semelhantes = self._por_semelhanca(termo, vistos)
+            resultados += heapq.nsmallest(limite - len(resultados), semelhantes,
+                                          key=lambda i: (-semelhantes[i], self.ordem_opcoes[i]))
+        return [self.opcoes[i] for i in resultados[:limite]]
+
+    def get_lista_oms(self):
+        """Lista ordenada de OMs (CODOM - Descrição), montada uma única vez por carga; não modificar"""
+        return self.lista_oms
+
+    def get_all_options(self):
+        """Retorna todas as opções disponíveis"""
+        return self.all_options
+    
+    def search_options(self, termo, limite=LIMITE_RESULTADOS):
+        """Pesquisa opções por CODOM, descrição ou sigla da OM (resultados limitados e ordenados por relevância)"""
+        if not termo:
+            return self.all_options
+        
+        resultados = ["Selecione o CODOM"] + self.buscar(termo, limite)
+        return resultados if len(resultados) > 1 else ["Selecione o CODOM", "Nenhum resultado encontrado"]
+    
+    def extract_codom_from_selection(self, selection):
+        """Extrai apenas o código CODOM da seleção do Spinner"""
+        if selection and ' - ' in selection:
+            return selection.split(' - ')[0].strip()
+        return selection.strip() if selection else ""
+    
+    def _campo_por_tipo(self, tipo):
+        """Sufixo do campo usado pelo tipo: ração operacional usa QR como base"""
+        return 'qr' if tipo == 'QR' or 'Ração Operacional' in str(tipo) else 'qs'
+
+    def get_sigla_for_tipo(self, codom_selection, tipo):
+        """Retorna a SIGLA da OM baseada no CODOM e tipo (QR/QS/Ração) - CORRIGIDO"""
+        i = self.resolver(codom_selection)
+        return self.colunas[f"sigla_{self._campo_por_tipo(tipo)}"][i] if i is not None else ""
+    
+    def get_codug_for_tipo(self, codom_selection, tipo):
+        """Retorna o CODUG correto baseado no CODOM e tipo (QR/QS/Ração) - CORRIGIDO"""
+        i = self.resolver(codom_selection)
+        return self.colunas[f"codug_{self._campo_por_tipo(tipo)}"][i] if i is not None else ""
+    
+    def get_descricao_completa(self, codom):
+        """Retorna a descrição completa para exibição no PDF"""
+        if not codom or codom == "Selecione o CODOM":
+            return ""
+            
+        i = self.resolver(codom)
+        if i is not None:
+            return self.opcoes[i]
+        codom_limpo = self.extract_codom_from_selection(codom) if ' - ' in str(codom) else codom
+        return f"{codom_limpo} - OM Não Identificada"
+    
+    def get_om_from_codom(self, codom_selection):
+        """Retorna a descrição da OM baseada no CODOM selecionado"""
+        i = self.resolver(codom_selection)
+        return self.colunas['descricao'][i] if i is not None else ""
 
 class CODOMManager:
-    def __init__(self):
-        self.codom_data = {}  # {CODOM: {descricao, sigla_qr, sigla_qs, codug_qr, codug_qs}}
-        self.all_options = []  # Todas as opções para pesquisa
+    def __init__(self, arquivo='CODOM.xlsx', arquivo_cache='codom_cache.bin'):
+        self.arquivo = arquivo
+        self.arquivo_cache = arquivo_cache  # Tabela já interpretada: evita reler o Excel a cada início
+        self.snapshot = DiretorioCODOM({})  # Retrato atual; consultas leem sempre um retrato inteiro
+        self.assinatura_verificada = None  # Última versão da planilha lida (com ou sem sucesso)
+        self.ultima_verificacao = 0
+        self.lock_recarga = threading.Lock()
+        self.recarga = None  # Thread da recarga em andamento
+        self.ultimo_erro = None
         self.carregar_dados_codom()
+
+    def __getattr__(self, nome):
+        # Dados e consultas (codom_data, search_options, get_sigla_for_tipo...) vêm do retrato atual
+        if nome == 'snapshot':
+            raise AttributeError(nome)
+        return getattr(self.snapshot, nome)
     
-    def carregar_dados_codom(self):
+    def carregar_dados_codom(self, usar_padrao_em_erro=True):
         """Carrega os dados do CODOM do arquivo Excel usando a DESCRIÇÃO como principal"""
         try:
-            if os.path.exists('CODOM.xlsx'):
-                print("📂 Carregando dados do CODOM.xlsx...")
-                df = pd.read_excel('CODOM.xlsx', sheet_name='Cod_OM_UG')
-                print(f"📊 Colunas encontradas: {list(df.columns)}")
-                print(f"📊 Total de registros: {len(df)}")
-                
-                # Mapear colunas (DAR PRIORIDADE À DESCRIÇÃO)
-                col_map = {}
-                for col in df.columns:
-                    col_lower = col.lower().strip()
-                    if 'codom' in col_lower:
-                        col_map['codom'] = col
-                    elif 'descrição' in col_lower or 'descricao' in col_lower:
-                        col_map['descricao'] = col
-                    elif 'sigla om vinc qr' in col_lower:
-                        col_map['sigla_qr'] = col
-                    elif 'sigla om vinc qs' in col_lower:
-                        col_map['sigla_qs'] = col
-                    elif 'codug_qr' in col_lower or ('codug' in col_lower and 'qr' in col_lower):
-                        col_map['codug_qr'] = col
-                    elif 'codug_qs' in col_lower or ('codug' in col_lower and 'qs' in col_lower):
-                        col_map['codug_qs'] = col
-                
-                print(f"🔍 Mapeamento de colunas: {col_map}")
-                
-                # Verificar se temos todas as colunas necessárias
-                colunas_necessarias = ['codom', 'descricao']
-                for coluna in colunas_necessarias:
-                    if coluna not in col_map:
-                        print(f"❌ Coluna {coluna} não encontrada no arquivo Excel")
+            if os.path.exists(self.arquivo):
+                assinatura = self._assinatura_arquivo()
+                self.assinatura_verificada = dict(assinatura)
+                dados = self._ler_cache(assinatura)
+                if dados is None:
+                    dados = self._interpretar_planilha()
+                    if dados is None:
                         return False
-                
-                # COLUNAS OPCIONAIS - definir fallbacks
-                if 'sigla_qr' not in col_map:
-                    col_map['sigla_qr'] = col_map['descricao']
-                if 'sigla_qs' not in col_map:
-                    col_map['sigla_qs'] = col_map['descricao']
-                if 'codug_qr' not in col_map:
-                    col_map['codug_qr'] = None
-                if 'codug_qs' not in col_map:
-                    col_map['codug_qs'] = None
-                
-                for index, row in df.iterrows():
-                    try:
-                        codom = str(row[col_map['codom']]).strip()
-                        
-                        # Pular linhas vazias
-                        if not codom or codom == 'nan' or codom == 'None':
-                            continue
-                            
-                        # USAR A DESCRIÇÃO COMO PRINCIPAL (não a sigla)
-                        descricao = str(row[col_map['descricao']]).strip() if pd.notna(row[col_map['descricao']]) else ""
-                        
-                        # CORREÇÃO: Extrair SIGLA para QR e QS com fallbacks
-                        sigla_qr = ""
-                        sigla_qs = ""
-                        
-                        if col_map['sigla_qr'] and pd.notna(row[col_map['sigla_qr']]):
-                            sigla_qr = str(row[col_map['sigla_qr']]).strip()
-                        else:
-                            sigla_qr = descricao  # Fallback
-                            
-                        if col_map['sigla_qs'] and pd.notna(row[col_map['sigla_qs']]):
-                            sigla_qs = str(row[col_map['sigla_qs']]).strip()
-                        else:
-                            sigla_qs = descricao  # Fallback
-                        
-                        # CODUG - CORREÇÃO com fallbacks
-                        codug_qr = ""
-                        codug_qs = ""
-                        
-                        if col_map['codug_qr'] and pd.notna(row[col_map['codug_qr']]):
-                            codug_qr = str(row[col_map['codug_qr']]).strip()
-                            # Remover caracteres não numéricos e limitar a 6 dígitos
-                            codug_qr = ''.join(filter(str.isdigit, codug_qr))[:6]
-                        else:
-                            codug_qr = f"160{index+1:03d}"  # Fallback
-                            
-                        if col_map['codug_qs'] and pd.notna(row[col_map['codug_qs']]):
-                            codug_qs = str(row[col_map['codug_qs']]).strip()
-                            # Remover caracteres não numéricos e limitar a 6 dígitos
-                            codug_qs = ''.join(filter(str.isdigit, codug_qs))[:6]
-                        else:
-                            codug_qs = f"160{index+1:03d}"  # Fallback
-                        
-                        # Garantir que CODUG comece com 160
-                        if not codug_qr.startswith('160'):
-                            codug_qr = f"160{index+1:03d}"
-                        if not codug_qs.startswith('160'):
-                            codug_qs = f"160{index+1:03d}"
-                        
-                        self.codom_data[codom] = {
-                            'descricao': descricao,
-                            'sigla_qr': sigla_qr,
-                            'sigla_qs': sigla_qs,
-                            'codug_qr': codug_qr,
-                            'codug_qs': codug_qs
-                        }
-                        
-                    except Exception as e:
-                        print(f"❌ Erro na linha {index}: {e}")
-                        continue
-                
-                # Criar lista de opções para o Spinner
-                self.all_options = self._criar_lista_opcoes()
+                    self._gravar_cache(assinatura, dados)
+                else:
+                    print(f"⚡ Dados CODOM carregados do cache ({self.arquivo_cache})")
+
+                # Troca atômica: quem já leu o retrato anterior continua com uma visão consistente
+                self.snapshot = DiretorioCODOM(dados, assinatura)
                 print(f"✅ Dados CODOM carregados: {len(self.codom_data)} registros")
                 print(f"📋 Total de opções: {len(self.all_options)}")
                 
                 return True
                 
+            elif not usar_padrao_em_erro:
+                print("⚠️  Arquivo CODOM.xlsx não encontrado. Mantendo os dados atuais.")
+                return False
+                
             else:
                 print("⚠️  Arquivo CODOM.xlsx não encontrado. Usando dados padrão.")
                 self.carregar_dados_padrao()
@@ -129,17 +443,267 @@ class CODOMManager:
             print(f"❌ Erro ao carregar CODOM.xlsx: {e}")
             import traceback
             print(f"🔍 Detalhes: {traceback.format_exc()}")
+            if not usar_padrao_em_erro:
+                raise
             self.carregar_dados_padrao()
             return True
-    
-    def _criar_lista_opcoes(self):
-        """Cria a lista de opções para o Spinner"""
-        opcoes = ["Selecione o CODOM"]
-        for codom, dados in self.codom_data.items():
-            # Usar formato: CODOM - Descrição (ao invés de sigla)
-            opcoes.append(f"{codom} - {dados['descricao']}")
-        return sorted(opcoes, key=lambda x: x.lower())
-    
+
+    def _assinatura_arquivo(self):
+        """mtime, tamanho e sha256 da planilha (o hash só é calculado se o mtime mudou)"""
+        info = os.stat(self.arquivo)
+        return {'mtime_ns': info.st_mtime_ns, 'tamanho': info.st_size}
+
+    def _sha256_arquivo(self):
+        with open(self.arquivo, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _ler_cache(self, assinatura):
+        """Tabela já interpretada, se o cache corresponder à planilha atual; None caso contrário"""
+        try:
+            if not os.path.exists(self.arquivo_cache):
+                return None
+            with open(self.arquivo_cache, 'rb') as f:
+                cache = carregar(f.read())
+            if cache.get('versao') != VERSAO_CACHE:
+                return None
+            if cache.get('mtime_ns') == assinatura['mtime_ns'] and cache.get('tamanho') == assinatura['tamanho']:
+                assinatura['sha256'] = cache.get('sha256')
+                return cache['dados']
+            # Arquivo tocado (cópia, checkout) mas com o mesmo conteúdo: aproveita o cache e atualiza o mtime
+            assinatura['sha256'] = self._sha256_arquivo()
+            if cache.get('sha256') == assinatura['sha256']:
+                self._gravar_cache(assinatura, cache['dados'])
+                return cache['dados']
+        except Exception as e:
+            print(f"⚠️ Cache do CODOM ignorado: {e}")
+        return None
+
+    def _gravar_cache(self, assinatura, dados):
+        """Persiste a tabela interpretada, identificada pelo hash e mtime da planilha"""
+        try:
+            cache = {
+                'versao': VERSAO_CACHE,
+                'mtime_ns': assinatura['mtime_ns'],
+                'tamanho': assinatura['tamanho'],
+                'sha256': assinatura.get('sha256') or self._sha256_arquivo(),
+                'dados': dados
+            }
+            conteudo = para_bytes(obter_serializador().dumps(cache))
+
+            def escrever(temp_file):
+                with open(temp_file, 'wb') as f:
+                    f.write(conteudo)
+
+            gravar_arquivo_atomico(self.arquivo_cache, escrever)
+        except Exception as e:
+            print(f"⚠️ Não foi possível gravar o cache do CODOM: {e}")
+
+    def _interpretar_planilha(self, arquivo=None):
+        """Lê a aba Cod_OM_UG e monta {CODOM: dados} com operações por coluna"""
+        # pandas só é importado quando a planilha é lida (com o cache válido, a carga não precisa dele)
+        import pandas as pd
+        arquivo = arquivo or self.arquivo
+        print(f"📂 Carregando dados do {arquivo}...")
+        df = pd.read_excel(arquivo, sheet_name='Cod_OM_UG')
+        print(f"📊 Colunas encontradas: {list(df.columns)}")
+        print(f"📊 Total de registros: {len(df)}")
+        
+        # Mapear colunas (DAR PRIORIDADE À DESCRIÇÃO)
+        col_map = {}
+        for col in df.columns:
+            col_lower = col.lower().strip()
+            if 'codom' in col_lower:
+                col_map['codom'] = col
+            elif 'descrição' in col_lower or 'descricao' in col_lower:
+                col_map['descricao'] = col
+            elif 'sigla om vinc qr' in col_lower:
+                col_map['sigla_qr'] = col
+            elif 'sigla om vinc qs' in col_lower:
+                col_map['sigla_qs'] = col
+            elif 'codug_qr' in col_lower or ('codug' in col_lower and 'qr' in col_lower):
+                col_map['codug_qr'] = col
+            elif 'codug_qs' in col_lower or ('codug' in col_lower and 'qs' in col_lower):
+                col_map['codug_qs'] = col
+        
+        print(f"🔍 Mapeamento de colunas: {col_map}")
+        
+        # Verificar se temos todas as colunas necessárias
+        colunas_necessarias = ['codom', 'descricao']
+        for coluna in colunas_necessarias:
+            if coluna not in col_map:
+                print(f"❌ Coluna {coluna} não encontrada no arquivo Excel")
+                return None
+
+        def texto(coluna):
+            """Coluna como texto sem espaços nas pontas; None onde a célula está vazia"""
+            valores = df[coluna].astype(str).str.strip()
+            return valores.where(df[coluna].notna(), None)
+
+        codom = df[col_map['codom']].astype(str).str.strip()
+        # Pular linhas vazias
+        validas = df[col_map['codom']].notna() & ~codom.isin(['', 'nan', 'None'])
+
+        # USAR A DESCRIÇÃO COMO PRINCIPAL (não a sigla)
+        descricao = texto(col_map['descricao']).fillna("")
+
+        # SIGLA para QR e QS: a descrição é o fallback
+        def sigla(chave):
+            if chave not in col_map:
+                return descricao
+            return texto(col_map[chave]).fillna(descricao)
+
+        # CODUG: somente dígitos, até 6, começando com 160; senão fica vazio (nenhum valor inventado,
+        # que poderia coincidir com a UG de outra OM): o formulário exige o CODUG e validar_itens aponta
+        fallback_codug = pd.Series("", index=codom.index)
+
+        def codug(chave):
+            if chave not in col_map:
+                return fallback_codug
+            digitos = texto(col_map[chave]).str.replace(r'\D', '', regex=True).str[:6]
+            return digitos.where(digitos.str.startswith('160', na=False), fallback_codug)
+
+        tabela = pd.DataFrame({
+            'descricao': descricao,
+            'sigla_qr': sigla('sigla_qr'),
+            'sigla_qs': sigla('sigla_qs'),
+            'codug_qr': codug('codug_qr'),
+            'codug_qs': codug('codug_qs')
+        })[validas]
+
+        return dict(zip(codom[validas], tabela.to_dict('records')))
+
+    def recarregar(self, em_segundo_plano=True):
+        """Relê o CODOM.xlsx em um novo retrato e o troca atomicamente; as consultas seguem no retrato atual"""
+        with self.lock_recarga:
+            if self.recarga and self.recarga.is_alive():
+                return False
+            if not em_segundo_plano:
+                self._recarregar()
+                return True
+            self.recarga = threading.Thread(target=self._recarregar, name='recarga_codom', daemon=True)
+            self.recarga.start()
+            return True
+
+    def _recarregar(self):
+        try:
+            print("🔄 Recarregando diretório CODOM...")
+            # Em caso de erro o retrato atual é mantido (nunca troca pelos dados padrão)
+            if self.carregar_dados_codom(usar_padrao_em_erro=False):
+                self.ultimo_erro = None
+            else:
+                self.ultimo_erro = "Planilha ausente ou sem as colunas necessárias"
+        except Exception as e:
+            self.ultimo_erro = str(e)
+            print(f"❌ Erro ao recarregar CODOM: {e}")
+
+    def verificar_atualizacao(self):
+        """Observador do CODOM.xlsx (no máximo um stat a cada INTERVALO_VERIFICACAO s): recarrega em segundo plano se mudou"""
+        agora = datetime.now().timestamp()
+        if agora - self.ultima_verificacao < INTERVALO_VERIFICACAO:
+            return False
+        self.ultima_verificacao = agora
+        if not os.path.exists(self.arquivo):
+            return False
+        assinatura = self._assinatura_arquivo()
+        verificada = self.assinatura_verificada or {}
+        if (verificada.get('mtime_ns'), verificada.get('tamanho')) == (assinatura['mtime_ns'], assinatura['tamanho']):
+            return False
+        return self.recarregar()
+
+    def comparar_planilha(self, arquivo):
+        """Compara uma nova planilha com o diretório em uso (um único merge): retorna (dados novos, diferenças)"""
+        import pandas as pd
+        dados = self._interpretar_planilha(arquivo)
+        if dados is None:
+            raise ValueError("Planilha sem as colunas necessárias (CODOM e Descrição)")
+
+        diretorio = self.snapshot
+        atual = pd.DataFrame(diretorio.colunas, index=pd.Index(diretorio.codoms, name='codom'), columns=CAMPOS_CODOM)
+        novo = pd.DataFrame.from_dict(dados, orient='index', columns=CAMPOS_CODOM).rename_axis('codom')
+        comparacao = atual.merge(novo, how='outer', left_index=True, right_index=True,
+                                 suffixes=('_antes', '_depois'), indicator=True)
+
+        def registros(linhas, sufixo):
+            tabela = linhas[[f"{campo}_{sufixo}" for campo in CAMPOS_CODOM]]
+            tabela.columns = CAMPOS_CODOM
+            return tabela.reset_index().to_dict('records')
+
+        em_ambos = comparacao[comparacao['_merge'] == 'both']
+        alteracoes = []
+        for campo in CAMPOS_CODOM:
+            mudou = em_ambos[em_ambos[f"{campo}_antes"] != em_ambos[f"{campo}_depois"]]
+            alteracoes.append(pd.DataFrame({
+                'codom': mudou.index, 'campo': campo,
+                'antes': mudou[f"{campo}_antes"].values, 'depois': mudou[f"{campo}_depois"].values
+            }))
+        alteradas = pd.concat(alteracoes, ignore_index=True).sort_values(['codom', 'campo'])
+
+        removidas = registros(comparacao[comparacao['_merge'] == 'left_only'], 'antes')
+        alteracoes_codug = alteradas[alteradas['campo'].str.startswith('codug')]
+        # CODUGs envolvidos: os das OMs removidas e os valores antigos e novos das OMs que trocaram de UG
+        codugs = {r[c] for r in removidas for c in ('codug_qr', 'codug_qs')}
+        codugs.update(alteracoes_codug['antes'])
+        codugs.update(alteracoes_codug['depois'])
+
+        diferencas = {
+            'adicionadas': registros(comparacao[comparacao['_merge'] == 'right_only'], 'depois'),
+            'removidas': removidas,
+            'alteradas': alteradas.to_dict('records'),
+            'codugs': sorted(codugs),
+            'codoms_afetados': sorted({r['codom'] for r in removidas} | set(alteradas['codom']))
+        }
+        return dados, diferencas
+
+    def importar_planilha(self, arquivo, dados=None):
+        """Substitui o CODOM.xlsx pela nova planilha e troca o retrato; com os dados de comparar_planilha não relê o Excel.
+        Retorna as diferenças (None quando os dados já foram informados)"""
+        with self.lock_recarga:
+            if dados is None:
+                dados, diferencas = self.comparar_planilha(arquivo)
+            else:
+                diferencas = None
+            gravar_arquivo_atomico(self.arquivo, lambda temp_file: self._copiar_planilha(arquivo, temp_file))
+            assinatura = self._assinatura_arquivo()
+            self.assinatura_verificada = dict(assinatura)
+            # O cache já corresponde ao novo arquivo: os demais processos recarregam sem interpretar a planilha
+            self._gravar_cache(assinatura, dados)
+            self.snapshot = DiretorioCODOM(dados, assinatura)
+            self.ultimo_erro = None
+        print(f"✅ CODOM importado: {len(self.codom_data)} registros")
+        return diferencas
+
+    @staticmethod
+    def _copiar_planilha(arquivo, destino):
+        """Copia a planilha (caminho ou arquivo em memória, como o enviado pela interface) para o destino"""
+        if hasattr(arquivo, 'read'):
+            arquivo.seek(0)
+            with open(destino, 'wb') as f:
+                shutil.copyfileobj(arquivo, f)
+        else:
+            shutil.copyfile(arquivo, destino)
+
+    def itens_afetados(self, diferencas, itens):
+        """Itens de um rascunho que apontam para OMs removidas ou cujo CODUG/sigla muda: {número do item: [motivos]}"""
+        removidas = {r['codom'] for r in diferencas['removidas']}
+        alteradas = {}
+        for alteracao in diferencas['alteradas']:
+            alteradas.setdefault(alteracao['codom'], {})[alteracao['campo']] = alteracao
+        afetados = {}
+        for n, item in enumerate(itens, start=1):
+            codom = self.extract_codom_from_selection(str(item.get('codom') or ""))
+            campo = self.snapshot._campo_por_tipo(item.get('tipo'))
+            motivos = []
+            if codom in removidas:
+                motivos.append(f"CODOM {codom} foi removido do diretório")
+            for chave in (f"codug_{campo}", f"sigla_{campo}"):
+                alteracao = alteradas.get(codom, {}).get(chave)
+                if alteracao:
+                    motivos.append(f"{chave.split('_')[0].upper()} {campo.upper()} do CODOM {codom} muda de "
+                                   f"'{alteracao['antes']}' para '{alteracao['depois']}'")
+            if motivos:
+                afetados[n] = motivos
+        return afetados
+
     def carregar_dados_padrao(self):
         """Carrega dados padrão caso o arquivo Excel não exista"""
         print("🔄 Carregando dados padrão do CODOM...")
@@ -168,86 +732,8 @@ class CODOMManager:
             }
         }
         
-        self.codom_data = dados_padrao
-        self.all_options = self._criar_lista_opcoes()
+        self.snapshot = DiretorioCODOM(dados_padrao)
         print("✅ Dados CODOM padrão carregados")
-    
-    def get_all_options(self):
-        """Retorna todas as opções disponíveis"""
-        return self.all_options
-    
-    def search_options(self, termo):
-        """Pesquisa opções por CODOM ou descrição da OM"""
-        if not termo:
-            return self.all_options
-        
-        termo = termo.lower().strip()
-        resultados = ["Selecione o CODOM"]
-        
-        for opcao in self.all_options[1:]:  # Pular o primeiro item "Selecione o CODOM"
-            if termo in opcao.lower():
-                resultados.append(opcao)
-        
-        return resultados if len(resultados) > 1 else ["Selecione o CODOM", "Nenhum resultado encontrado"]
-    
-    def extract_codom_from_selection(self, selection):
-        """Extrai apenas o código CODOM da seleção do Spinner"""
-        if selection and ' - ' in selection:
-            return selection.split(' - ')[0].strip()
-        return selection.strip() if selection else ""
-    
-    def get_sigla_for_tipo(self, codom_selection, tipo):
-        """Retorna a SIGLA da OM baseada no CODOM e tipo (QR/QS/Ração) - CORRIGIDO"""
-        if not codom_selection or codom_selection == "Selecione o CODOM":
-            return ""
-            
-        codom = self.extract_codom_from_selection(codom_selection)
-        if codom in self.codom_data:
-            # Para ração operacional, usar QR como base
-            if 'Ração Operacional' in str(tipo):
-                return self.codom_data[codom]['sigla_qr']
-            elif tipo == 'QR':
-                return self.codom_data[codom]['sigla_qr']
-            else:  # QS
-                return self.codom_data[codom]['sigla_qs']
-        return ""
-    
-    def get_codug_for_tipo(self, codom_selection, tipo):
-        """Retorna o CODUG correto baseado no CODOM e tipo (QR/QS/Ração) - CORRIGIDO"""
-        if not codom_selection or codom_selection == "Selecione o CODOM":
-            return ""
-            
-        codom = self.extract_codom_from_selection(codom_selection)
-        if codom in self.codom_data:
-            # Para ração operacional, usar QR como base
-            if 'Ração Operacional' in str(tipo):
-                return self.codom_data[codom]['codug_qr']
-            elif tipo == 'QR':
-                return self.codom_data[codom]['codug_qr']
-            else:  # QS
-                return self.codom_data[codom]['codug_qs']
-        return ""
-    
-    def get_descricao_completa(self, codom):
-        """Retorna a descrição completa para exibição no PDF"""
-        if not codom or codom == "Selecione o CODOM":
-            return ""
-            
-        codom_limpo = self.extract_codom_from_selection(codom) if ' - ' in str(codom) else codom
-        if codom_limpo in self.codom_data:
-            descricao = self.codom_data[codom_limpo]['descricao']
-            return f"{codom_limpo} - {descricao}"
-        return f"{codom_limpo} - OM Não Identificada"
-    
-    def get_om_from_codom(self, codom_selection):
-        """Retorna a descrição da OM baseada no CODOM selecionado"""
-        if not codom_selection or codom_selection == "Selecione o CODOM":
-            return ""
-            
-        codom = self.extract_codom_from_selection(codom_selection)
-        if codom in self.codom_data:
-            return self.codom_data[codom]['descricao']
-        return ""
 
 # Instância global do gerenciador de CODOM
 codom_manager = CODOMManager()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import atexit
+import os
+import re
+import socket
+import threading
+from datetime import datetime
+from storage import storage
+
+PADRAO_NUMERO_CONTROLE = re.compile(r'P\s*Trab\s*Nr\s*(\d+)\s*/\s*(\d{4})')
+
+class ControleNumeracao:
+    def __init__(self, tamanho_bloco=1):
+        # tamanho_bloco > 1 reserva vários números por acesso ao banco (menos disputa entre processos),
+        # ao custo de saltos na sequência: as sobras são registradas como não utilizadas ao encerrar
+        self.tamanho_bloco = tamanho_bloco
+        self.processo = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.reservados = {}  # {ano: [números reservados por este processo e ainda não emitidos]}
+        atexit.register(self.liberar_reservas)
+
+    def formatar(self, numero, ano):
+        """Formata o número de controle impresso no P Trab"""
+        return f"P Trab Nr {numero:05d}/{ano}"
+
+    def interpretar(self, numero_controle):
+        """Converte 'P Trab Nr 00012/2025' em (12, 2025); None se não reconhecer"""
+        match = PADRAO_NUMERO_CONTROLE.search(numero_controle or "")
+        return (int(match.group(1)), int(match.group(2))) if match else None
+
+    def emitir(self, usuario=None, documento=None):
+        """Entrega o próximo número de controle do ano e o registra como emitido"""
+        ano = datetime.now().year
+        with self.lock:
+            # Reserva e emissão na mesma transação; a lista em memória só muda depois do commit
+            reservados = list(self.reservados.get(ano, []))
+            with storage.transacao(duravel=True):
+                if not reservados:
+                    reservados = storage.reservar_numeros_controle(ano, self.tamanho_bloco, self.processo)
+                numero = reservados.pop(0)
+                storage.atualizar_numero_controle(ano, numero, 'emitido', usuario=usuario, documento=documento)
+            self.reservados[ano] = reservados
+        return self.formatar(numero, ano)
+
+    def registrar_documento(self, numero_controle, documento, usuario=None):
+        """Associa o número emitido ao arquivo gerado"""
+        numero, ano = self.interpretar(numero_controle)
+        return storage.atualizar_numero_controle(ano, numero, 'emitido', documento=documento, usuario=usuario)
+
+    def descartar(self, numero_controle, motivo):
+        """Registra um número emitido que não chegou a ser usado (ex.: falha na geração do PDF)"""
+        numero, ano = self.interpretar(numero_controle)
+        return storage.atualizar_numero_controle(ano, numero, 'nao_utilizado', motivo=motivo)
+
+    def liberar_reservas(self):
+        """Registra como não utilizados os números reservados por este processo e não emitidos"""
+        with self.lock:
+            for ano, numeros in self.reservados.items():
+                for numero in numeros:
+                    try:
+                        storage.atualizar_numero_controle(ano, numero, 'nao_utilizado', motivo='Reserva não utilizada')
+                    except Exception as e:
+                        print(f"Erro ao liberar número de controle {numero}/{ano}: {e}")
+            self.reservados = {}
+
+    def listar(self, ano=None, status=None):
+        """Registro dos números emitidos, reservados e não utilizados"""
+        return storage.listar_numeros_controle(ano, status)
+
+# Instância global do controle de numeração dos P Trab
+controle_numeracao = ControleNumeracao()
+
+if __name__ == "__main__":
+    for registro in controle_numeracao.listar(ano=datetime.now().year):
+        print(f"{registro['numero']:05d}/{registro['ano']}  {registro['status']:<14} "
+              f"{registro['documento'] or ''}  {registro['motivo'] or ''}")
@@ -1,63 +1,116 @@
 import streamlit as st
-import pandas as pd
 import json
 import os
 from datetime import datetime
 import secrets
+import hashlib
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from storage import storage
+from arquivos import trava_arquivo, gravar_arquivo_atomico
+from pdf_search_index import pdf_search_index
+from arquivo_morto import arquivo_morto, ano_do_registro
+
+NC_AUDITOR_COLUNAS = [
+    'ID_PDF', 'Numero_PTrab', 'Data_Homologacao', 'Usuario', 'OM_Usuario',
+    'Nome_Operacao', 'Periodo', 'Local', 'Solicitante',
+    'Efetivo_Total', 'Valor_Operacao', 'Status', 'Tipo_Operacao', 'Homologador'
+]
+
+def resultado_da_operacao(metodo):
+    """Erro ao gravar (transação já desfeita por operacao()) vira (False, mensagem) para a interface"""
+    @wraps(metodo)
+    def executar(self, *args, **kwargs):
+        try:
+            return metodo(self, *args, **kwargs)
+        except Exception as e:
+            print(f"Erro em {metodo.__name__}: {e}")
+            return False, f"Erro ao gravar (nenhuma alteração foi registrada): {e}"
+    return executar
 
 class HomologacaoSystem:
     def __init__(self):
-        self.homologacao_file = 'homologacao_data.json'
-        self.pdf_uploads_file = 'pdf_uploads.json'
+        # Pasta servida pelo Streamlit em app/static/ sem verificação de login (ver .streamlit/config.toml);
+        # o nome pelo SHA-256 torna a URL não adivinhável, mas quem a tiver acessa o arquivo
+        self.uploads_dir = os.path.join('static', 'pdf_uploads')
+        self.legacy_uploads_dir = 'pdf_uploads'
+        # Aprovações são acrescentadas ao diário (tabela nc_auditor); a planilha é gerada sob demanda.
+        # O diário em JSON Lines de versões anteriores só é lido na migração
+        self.nc_auditor_file = 'nc_auditor.xlsx'
+        self.nc_auditor_journal = 'nc_auditor_journal.jsonl'
+        # Protege pdf_uploads contra o worker de processamento de PDFs
+        self.lock = threading.RLock()
         self.load_data()
+        self._indexar_uploads_arquivados()
     
     def load_data(self):
         """Carrega os dados de homologação"""
         try:
-            if os.path.exists(self.homologacao_file):
-                with open(self.homologacao_file, 'r', encoding='utf-8') as f:
-                    self.homologacao_data = json.load(f)
-            else:
-                self.homologacao_data = {}
-                self.save_data()
-            
-            if os.path.exists(self.pdf_uploads_file):
-                with open(self.pdf_uploads_file, 'r', encoding='utf-8') as f:
-                    self.pdf_uploads = json.load(f)
-            else:
-                self.pdf_uploads = {}
-                self.save_pdf_uploads()
-                
+            storage.invalidar_cache('homologacao_data')
+            storage.invalidar_cache('pdf_uploads')
+            self.sincronizar()
         except Exception as e:
             st.error(f"Erro ao carregar dados de homologação: {e}")
             self.homologacao_data = {}
             self.pdf_uploads = {}
     
+    def sincronizar(self):
+        """Aponta para as coleções compartilhadas (relidas do banco só se outro processo as alterou)"""
+        with self.lock:
+            self.homologacao_data = storage.colecao_compartilhada('homologacao_data')
+            self.pdf_uploads = storage.colecao_compartilhada('pdf_uploads')
+    
+    @contextmanager
+    def operacao(self):
+        """Operação exclusiva entre processos: trava a escrita no banco e parte dos registros mais recentes.
+        Saldo e uploads são gravados na mesma transação; se algo falhar, a memória é recarregada.
+        Ordem das travas (a mesma do saldo_manager): homologação, saldo e só então a escrita no banco"""
+        try:
+            from saldo_manager import saldo_manager
+            trava_saldo = saldo_manager.lock
+        except ImportError:
+            saldo_manager, trava_saldo = None, nullcontext()
+        try:
+            with self.lock, trava_saldo, storage.transacao(duravel=True):
+                self.sincronizar()
+                yield
+            # O cache só recebe as gravações no COMMIT: aponta para as coleções já atualizadas
+            self.sincronizar()
+        except Exception:
+            self.load_data()
+            if saldo_manager is not None:
+                saldo_manager.load_saldo()
+            raise
+    
     def save_data(self):
         """Salva os dados de homologação"""
         try:
-            with open(self.homologacao_file, 'w', encoding='utf-8') as f:
-                json.dump(self.homologacao_data, f, ensure_ascii=False, indent=2)
+            storage.salvar_registros('homologacao_data', self.homologacao_data)
         except Exception as e:
             st.error(f"Erro ao salvar dados de homologação: {e}")
     
-    def save_pdf_uploads(self):
-        """Salva os uploads de PDF"""
-        try:
-            with open(self.pdf_uploads_file, 'w', encoding='utf-8') as f:
-                json.dump(self.pdf_uploads, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            st.error(f"Erro ao salvar uploads de PDF: {e}")
+    def save_pdf_uploads(self, registros=None):
+        """Salva os registros {pdf_id: registro} informados (ou todos, se None).
+        Os registros alterados são cópias: a coleção compartilhada só muda depois do commit (storage).
+        Erros são repassados: a transação é desfeita e quem chamou informa a falha (interface ou worker)"""
+        with self.lock:
+            if registros is None:
+                registros = dict(self.pdf_uploads)
+            storage.salvar_registros('pdf_uploads', registros)
     
-    def register_pdf_upload(self, pdf_file, user_info, dados_operacao, valor_operacao=0):
-        """Registra um upload de PDF para homologação"""
+    @resultado_da_operacao
+    def register_pdf_upload(self, pdf_file, user_info, dados_operacao, valor_operacao=0, sha256=None):
+        """Registra um upload de PDF para homologação (sha256 vem de armazenar_pdf); retorna (True, pdf_id) ou (False, motivo)"""
         pdf_id = f"PDF_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
         
         # Garantir que tipo_operacao tenha um valor padrão
         tipo_operacao = dados_operacao.get('tipo', '1')  # 1=Emprego, 2=Preparo
         
-        self.pdf_uploads[pdf_id] = {
+        registro = {
             'nome_arquivo': pdf_file.name,
+            'sha256': sha256,
+            'arquivo': os.path.basename(self._caminho_por_hash(sha256)) if sha256 else None,
             'data_upload': datetime.now().isoformat(),
             'usuario': user_info['nome'],
             'cpf_usuario': list(user_info.keys())[0] if isinstance(user_info, dict) else 'N/A',
@@ -70,145 +123,489 @@ class HomologacaoSystem:
             'homologador': None,
             'justificativa': None,
             'tipo_operacao': tipo_operacao,  # Garantir que sempre existe
-            'numero_ptrab': None  # Será preenchido na homologação
+            'numero_ptrab': None,  # Será preenchido na homologação
+            'metadados': None  # Preenchido pelo pdf_processor após o upload
         }
         
-        self.save_pdf_uploads()
-        return pdf_id
+        # Verificação de duplicidade e gravação na mesma transação: dois envios simultâneos não passam ambos
+        with self.operacao():
+            if sha256:
+                existente = self.buscar_pdf_por_sha256(sha256)
+                if existente:
+                    pdf_id_existente, status_existente = existente
+                    return False, f"Este PDF já foi enviado (ID: {pdf_id_existente}, status: {status_existente.upper()})."
+                if not os.path.exists(self._caminho_por_hash(sha256)):
+                    # O mesmo conteúdo foi excluído por outro processo entre o armazenamento e o registro
+                    return False, "O arquivo foi removido durante o envio. Envie o PDF novamente."
+            self.save_pdf_uploads({pdf_id: registro})
+        
+        # Já pesquisável pelos dados do formulário; o texto do PDF entra quando o worker terminar
+        self.indexar_pdf(pdf_id)
+        return True, pdf_id
+    
+    def atualizar_metadados_pdf(self, pdf_id, metadados, texto=None):
+        """Grava os metadados extraídos do PDF (páginas, tamanho, SHA-256, miniatura) e indexa o texto"""
+        # O registro pode ter sido homologado ou excluído por outro processo enquanto o PDF era processado
+        thumbnail_anterior = None
+        try:
+            with self.operacao():
+                if pdf_id not in self.pdf_uploads:
+                    self._remover_arquivo(metadados.get('thumbnail'))
+                    return False
+                pdf_data = dict(self.pdf_uploads[pdf_id])
+                thumbnail_anterior = (pdf_data.get('metadados') or {}).get('thumbnail')
+                pdf_data['metadados'] = metadados
+                self.save_pdf_uploads({pdf_id: pdf_data})
+        except Exception:
+            # A miniatura nova não ficou registrada
+            self._remover_arquivo(metadados.get('thumbnail'))
+            raise
+        
+        # Reprocessamento: a miniatura anterior deixa de ser usada
+        if thumbnail_anterior and thumbnail_anterior != metadados.get('thumbnail'):
+            self._remover_arquivo(thumbnail_anterior)
+        
+        if texto is not None:
+            self.indexar_pdf(pdf_id, texto)
+        return True
+    
+    def indexar_pdf(self, pdf_id, texto_pdf=""):
+        """Atualiza o índice de busca com os campos do registro e o texto extraído do PDF"""
+        self.sincronizar()
+        pdf_data = self.pdf_uploads.get(pdf_id)
+        if pdf_data is None:
+            return
+        dados_operacao = pdf_data.get('dados_operacao', {})
+        campos = [
+            pdf_data.get('nome_arquivo', ''),
+            pdf_data.get('numero_ptrab') or '',
+            pdf_data.get('usuario', ''),
+            pdf_data.get('om_usuario', ''),
+            dados_operacao.get('nome_operacao', ''),
+            dados_operacao.get('local', ''),
+            dados_operacao.get('solicitante', ''),
+            texto_pdf
+        ]
+        pdf_search_index.indexar(pdf_id, "\n".join(campos))
+    
+    def buscar_pdfs(self, consulta, limite=20):
+        """Busca textual nos P Trab enviados; retorna [(pdf_id, relevância), ...]"""
+        self.sincronizar()
+        return [(pdf_id, relevancia) for pdf_id, relevancia in pdf_search_index.buscar(consulta, limite)
+                if pdf_id in self.pdf_uploads]
+    
+    def armazenar_pdf(self, pdf_file, chunk_size=1024 * 1024):
+        """Grava o PDF em blocos calculando o SHA-256; o arquivo final é nomeado pelo hash"""
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        temp_path = os.path.join(self.uploads_dir, f".upload_{secrets.token_hex(8)}.tmp")
+        sha256 = hashlib.sha256()
+        
+        try:
+            pdf_file.seek(0)
+            with open(temp_path, 'wb') as f:
+                for bloco in iter(lambda: pdf_file.read(chunk_size), b''):
+                    sha256.update(bloco)
+                    f.write(bloco)
+            
+            file_path = self._caminho_por_hash(sha256.hexdigest())
+            if os.path.exists(file_path):
+                # Conteúdo idêntico já armazenado: descartar a cópia
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        return sha256.hexdigest(), file_path
+    
+    def buscar_pdf_por_sha256(self, sha256):
+        """Retorna (ID, status) do upload pendente ou aprovado com o mesmo conteúdo, inclusive aprovados
+        já arquivados (ou None); rejeitados podem ser reenviados"""
+        with self.lock:
+            self.sincronizar()
+            for pdf_id, pdf_data in self.pdf_uploads.items():
+                if pdf_data.get('sha256') == sha256 and pdf_data['status'] in ('pendente', 'aprovado'):
+                    return pdf_id, pdf_data['status']
+        arquivado = storage.buscar_upload_arquivado(sha256, status='aprovado')
+        if arquivado:
+            pdf_id, ano, status = arquivado
+            return pdf_id, f"{status}, arquivado em {ano}"
+        return None
+    
+    def _sha256_em_uso(self, sha256, exceto=None):
+        """Se algum registro (do exercício aberto ou arquivado, fora 'exceto') ainda aponta para o conteúdo"""
+        if any(pdf_data.get('sha256') == sha256
+               for pdf_id, pdf_data in self.pdf_uploads.items() if pdf_id != exceto):
+            return True
+        return storage.buscar_upload_arquivado(sha256) is not None
+    
+    def _indexar_uploads_arquivados(self):
+        """Na primeira execução, indexa pelo SHA-256 os uploads que já estavam no arquivo morto"""
+        if storage.get_configuracao('indice_uploads_arquivados_em'):
+            return
+        try:
+            with storage.transacao() as conn:
+                for ano in self.get_exercicios_arquivados():
+                    storage.registrar_uploads_arquivados(ano, self.get_pdfs_exercicio(ano))
+                storage.set_configuracoes({'indice_uploads_arquivados_em': datetime.now().isoformat()}, conn)
+        except Exception as e:
+            print(f"❌ Erro ao indexar os uploads arquivados: {e}")
+    
+    def _remover_arquivo(self, caminho):
+        """Apaga um arquivo do armazenamento, se existir"""
+        try:
+            if caminho and os.path.exists(caminho):
+                os.remove(caminho)
+        except OSError as e:
+            print(f"⚠️ Não foi possível remover {caminho}: {e}")
+    
+    def _caminho_por_hash(self, sha256):
+        """Caminho do arquivo armazenado pelo conteúdo"""
+        return os.path.join(self.uploads_dir, f"{sha256}.pdf")
+    
+    def get_pdf_path(self, pdf_id):
+        """Retorna o caminho do arquivo do PDF, migrando uploads antigos para o armazenamento por hash"""
+        self.sincronizar()
+        if pdf_id not in self.pdf_uploads:
+            return None
+        
+        pdf_data = self.pdf_uploads[pdf_id]
+        if pdf_data.get('sha256'):
+            return self._caminho_por_hash(pdf_data['sha256'])
+        
+        # Uploads antigos eram gravados como {pdf_id}_{nome}, em pdf_uploads/ ou static/pdf_uploads/
+        nome_arquivo = f"{pdf_id}_{pdf_data['nome_arquivo']}"
+        for pasta in [self.uploads_dir, self.legacy_uploads_dir]:
+            legacy_path = os.path.join(pasta, nome_arquivo)
+            if os.path.exists(legacy_path):
+                # O arquivo antigo só é apagado depois que o registro aponta para a cópia por hash
+                try:
+                    with open(legacy_path, 'rb') as f:
+                        sha256, file_path = self.armazenar_pdf(f)
+                    with self.operacao():
+                        if pdf_id in self.pdf_uploads:
+                            pdf_data = dict(self.pdf_uploads[pdf_id], sha256=sha256, arquivo=os.path.basename(file_path))
+                            self.save_pdf_uploads({pdf_id: pdf_data})
+                    os.remove(legacy_path)
+                except Exception as e:
+                    print(f"Erro ao migrar PDF {pdf_id}: {e}")
+                    return legacy_path
+                return file_path
+        
+        return None
     
     def get_pdfs_pendentes(self):
         """Retorna todos os PDFs pendentes de homologação"""
+        self.sincronizar()
         return {k: v for k, v in self.pdf_uploads.items() if v['status'] == 'pendente'}
     
+    def get_pdfs_pendentes_afetados(self, termos):
+        """Pendentes cujo registro ou texto cita algum dos termos (CODOM, CODUG): {pdf_id: [termos citados]}"""
+        pendentes = self.get_pdfs_pendentes()
+        return {pdf_id: citados for pdf_id, citados in pdf_search_index.documentos_com_termos(termos).items()
+                if pdf_id in pendentes}
+    
     def get_pdfs_aprovados(self):
         """Retorna todos os PDFs aprovados"""
+        self.sincronizar()
         return {k: v for k, v in self.pdf_uploads.items() if v['status'] == 'aprovado'}
     
     def get_pdfs_rejeitados(self):
         """Retorna todos os PDFs rejeitados"""
+        self.sincronizar()
         return {k: v for k, v in self.pdf_uploads.items() if v['status'] == 'rejeitado'}
     
-    def homologar_pdf(self, pdf_id, homologador, status, justificativa=None):
+    @resultado_da_operacao
+    def homologar_pdf(self, pdf_id, homologador, status, justificativa=None, numero_ptrab=None):
         """Realiza a homologação de um PDF integrado com o saldo - CORRIGIDO"""
-        if pdf_id not in self.pdf_uploads:
-            return False, "PDF não encontrado"
+        # Verificação e gravação na mesma transação: dois processos não homologam o mesmo PDF
+        with self.operacao():
+            if pdf_id not in self.pdf_uploads:
+                return False, "PDF não encontrado"
         
-        pdf_data = self.pdf_uploads[pdf_id]
-        status_anterior = pdf_data['status']
+            # Alterações numa cópia: a coleção compartilhada só muda depois do commit
+            pdf_data = dict(self.pdf_uploads[pdf_id])
+            status_anterior = pdf_data['status']
+            # Mesma data no upload, no saldo e na NC Auditor: os três são arquivados pelo mesmo exercício
+            data_homologacao = datetime.now().isoformat()
+            if numero_ptrab is not None:
+                pdf_data['numero_ptrab'] = numero_ptrab
+        
+            # Obter tipo_operacao com fallback seguro
+            tipo_operacao = pdf_data.get('tipo_operacao', '1')  # Default para EMPREGO se não existir
+            numero_ptrab = pdf_data.get('numero_ptrab', '')
         
-        # Obter tipo_operacao com fallback seguro
-        tipo_operacao = pdf_data.get('tipo_operacao', '1')  # Default para EMPREGO se não existir
-        numero_ptrab = pdf_data.get('numero_ptrab', '')
+            # Se estava aprovado e agora está sendo rejeitado, estornar valor
+            if status_anterior == 'aprovado' and status == 'rejeitado':
+                if tipo_operacao == '2':  # Preparo
+                    try:
+                        from saldo_manager import saldo_manager
+                        if numero_ptrab:
+                            success, msg = saldo_manager.estornar_valor_por_ptrab(numero_ptrab, homologador,
+                                                                                  data_homologacao)
+                            if not success:
+                                return False, f"Erro no estorno: {msg}"
+                    except ImportError as e:
+                        return False, f"Erro ao acessar sistema de saldo: {e}"
         
-        # Se estava aprovado e agora está sendo rejeitado, estornar valor
-        if status_anterior == 'aprovado' and status == 'rejeitado':
-            if tipo_operacao == '2':  # Preparo
+            # Se está sendo aprovado agora, abater valor (apenas para preparo)
+            if status == 'aprovado' and tipo_operacao == '2':  # Preparo
                 try:
                     from saldo_manager import saldo_manager
+                    valor_operacao = pdf_data.get('valor_operacao', 0)
+                    descricao = f"P Trab: {numero_ptrab} - {pdf_data['dados_operacao'].get('nome_operacao', 'N/A')}"
                     if numero_ptrab:
-                        success, msg = saldo_manager.estornar_valor_por_ptrab(numero_ptrab, homologador)
+                        success, msg = saldo_manager.abater_valor_por_ptrab(numero_ptrab, valor_operacao, descricao,
+                                                                            homologador, data_homologacao)
                         if not success:
-                            return False, f"Erro no estorno: {msg}"
+                            return False, f"Erro no abatimento: {msg}"
                 except ImportError as e:
                     return False, f"Erro ao acessar sistema de saldo: {e}"
         
-        # Se está sendo aprovado agora, abater valor (apenas para preparo)
-        if status == 'aprovado' and tipo_operacao == '2':  # Preparo
-            try:
-                from saldo_manager import saldo_manager
-                valor_operacao = pdf_data.get('valor_operacao', 0)
-                descricao = f"P Trab: {numero_ptrab} - {pdf_data['dados_operacao'].get('nome_operacao', 'N/A')}"
-                if numero_ptrab:
-                    success, msg = saldo_manager.abater_valor_por_ptrab(numero_ptrab, valor_operacao, descricao, homologador)
-                    if not success:
-                        return False, f"Erro no abatimento: {msg}"
-            except ImportError as e:
-                return False, f"Erro ao acessar sistema de saldo: {e}"
-        
-        # Atualizar status do PDF
-        self.pdf_uploads[pdf_id]['status'] = status
-        self.pdf_uploads[pdf_id]['data_homologacao'] = datetime.now().isoformat()
-        self.pdf_uploads[pdf_id]['homologador'] = homologador
-        self.pdf_uploads[pdf_id]['justificativa'] = justificativa
-        
-        # Se aprovado, carregar na planilha NC Auditor
-        if status == 'aprovado':
-            self.carregar_nc_auditor(pdf_id)
-        
-        self.save_pdf_uploads()
-        return True, f"PDF {status} com sucesso"
+            # Atualizar status do PDF
+            pdf_data['status'] = status
+            pdf_data['data_homologacao'] = data_homologacao
+            pdf_data['homologador'] = homologador
+            pdf_data['justificativa'] = justificativa
+        
+            # Se aprovado, carregar na planilha NC Auditor
+            if status == 'aprovado':
+                self.carregar_nc_auditor(pdf_id, pdf_data)
+        
+            self.save_pdf_uploads({pdf_id: pdf_data})
+            return True, f"PDF {status} com sucesso"
     
+    @resultado_da_operacao
+    def homologar_lote(self, numeros_ptrab, homologador, status, justificativa=None):
+        """Homologa vários PDFs pendentes de uma vez; numeros_ptrab = {pdf_id: numero_ptrab}.
+        O saldo é verificado para o lote inteiro e cada arquivo é gravado uma única vez."""
+        # Verificação e gravação na mesma transação: dois processos não homologam o mesmo PDF
+        with self.operacao():
+            if not numeros_ptrab:
+                return False, "Nenhum PDF selecionado"
+        
+            for pdf_id, numero_ptrab in numeros_ptrab.items():
+                if pdf_id not in self.pdf_uploads:
+                    return False, f"PDF {pdf_id} não encontrado"
+                if self.pdf_uploads[pdf_id]['status'] != 'pendente':
+                    return False, f"PDF {pdf_id} não está pendente"
+                if status == 'aprovado' and not (numero_ptrab or '').strip():
+                    return False, f"Número do P Trab é obrigatório para aprovação ({self.pdf_uploads[pdf_id]['nome_arquivo']})"
+        
+            # Mesma data no upload, no saldo e na NC Auditor: os três são arquivados pelo mesmo exercício
+            data_homologacao = datetime.now().isoformat()
+            
+            # Abater todo o PREPARO do lote de uma vez
+            if status == 'aprovado':
+                itens_saldo = []
+                for pdf_id, numero_ptrab in numeros_ptrab.items():
+                    pdf_data = self.pdf_uploads[pdf_id]
+                    if pdf_data.get('tipo_operacao', '1') == '2':
+                        descricao = f"P Trab: {numero_ptrab} - {pdf_data['dados_operacao'].get('nome_operacao', 'N/A')}"
+                        itens_saldo.append((numero_ptrab, pdf_data.get('valor_operacao', 0), descricao))
+            
+                if itens_saldo:
+                    try:
+                        from saldo_manager import saldo_manager
+                        success, msg = saldo_manager.abater_lote(itens_saldo, homologador, data_homologacao)
+                        if not success:
+                            return False, f"Erro no abatimento: {msg}"
+                    except ImportError as e:
+                        return False, f"Erro ao acessar sistema de saldo: {e}"
+        
+            # Alterações em cópias: a coleção compartilhada só muda depois do commit
+            registros = {}
+            for pdf_id, numero_ptrab in numeros_ptrab.items():
+                registros[pdf_id] = dict(self.pdf_uploads[pdf_id], numero_ptrab=numero_ptrab, status=status,
+                                         data_homologacao=data_homologacao, homologador=homologador,
+                                         justificativa=justificativa)
+        
+            if status == 'aprovado':
+                self._garantir_journal_nc_auditor()
+                storage.registrar_linhas_nc_auditor([self._linha_nc_auditor(pdf_id, pdf_data)
+                                                     for pdf_id, pdf_data in registros.items()])
+        
+            self.save_pdf_uploads(registros)
+            return True, f"{len(numeros_ptrab)} PDF(s) {status}(s) com sucesso"
+    
+    @resultado_da_operacao
     def excluir_pdf(self, pdf_id, homologador):
         """Exclui um PDF e estorna o valor se estiver aprovado - CORRIGIDO"""
-        if pdf_id not in self.pdf_uploads:
-            return False, "PDF não encontrado"
+        # Verificação e gravação na mesma transação
+        with self.operacao():
+            if pdf_id not in self.pdf_uploads:
+                return False, "PDF não encontrado"
         
-        pdf_data = self.pdf_uploads[pdf_id]
+            pdf_data = self.pdf_uploads[pdf_id]
         
-        # Obter tipo_operacao com fallback seguro
-        tipo_operacao = pdf_data.get('tipo_operacao', '1')
-        numero_ptrab = pdf_data.get('numero_ptrab', '')
-        
-        # Se estava aprovado, estornar valor (apenas para preparo)
-        if pdf_data['status'] == 'aprovado' and tipo_operacao == '2':
-            try:
-                from saldo_manager import saldo_manager
-                if numero_ptrab:
-                    success, msg = saldo_manager.estornar_valor_por_ptrab(numero_ptrab, homologador)
-                    if not success:
-                        return False, f"Erro no estorno: {msg}"
-            except ImportError as e:
-                return False, f"Erro ao acessar sistema de saldo: {e}"
-        
-        # Remover o PDF
-        del self.pdf_uploads[pdf_id]
-        self.save_pdf_uploads()
+            # Obter tipo_operacao com fallback seguro
+            tipo_operacao = pdf_data.get('tipo_operacao', '1')
+            numero_ptrab = pdf_data.get('numero_ptrab', '')
         
+            # Se estava aprovado, estornar valor (apenas para preparo)
+            if pdf_data['status'] == 'aprovado' and tipo_operacao == '2':
+                try:
+                    from saldo_manager import saldo_manager
+                    if numero_ptrab:
+                        success, msg = saldo_manager.estornar_valor_por_ptrab(numero_ptrab, homologador)
+                        if not success:
+                            return False, f"Erro no estorno: {msg}"
+                except ImportError as e:
+                    return False, f"Erro ao acessar sistema de saldo: {e}"
+        
+            # Remover o PDF (a coleção compartilhada só perde o registro depois do commit)
+            storage.excluir_registro('pdf_uploads', pdf_id)
+            pdf_search_index.remover(pdf_id)
+            
+            # O arquivo sai ainda com a escrita travada: um envio simultâneo do mesmo conteúdo
+            # só registra depois e encontra o arquivo ausente (ver register_pdf_upload)
+            if pdf_data.get('sha256') and not self._sha256_em_uso(pdf_data['sha256'], exceto=pdf_id):
+                self._remover_arquivo(self._caminho_por_hash(pdf_data['sha256']))
+        
+        self._remover_arquivo((pdf_data.get('metadados') or {}).get('thumbnail'))
         return True, "PDF excluído com sucesso"
     
-    def carregar_nc_auditor(self, pdf_id):
-        """Carrega os dados do PDF aprovado na planilha NC Auditor - ATUALIZADA"""
-        try:
+    def carregar_nc_auditor(self, pdf_id, pdf_data=None):
+        """Registra o PDF aprovado no diário da planilha NC Auditor (uma linha, sem reescrever a planilha).
+        Dentro de operacao() a linha entra na mesma transação da homologação: um erro desfaz as duas"""
+        self._garantir_journal_nc_auditor()
+        storage.registrar_linhas_nc_auditor([self._linha_nc_auditor(pdf_id, pdf_data)])
+        return True
+    
+    def _linha_nc_auditor(self, pdf_id, pdf_data=None):
+        """Monta a linha da planilha NC Auditor para um PDF aprovado"""
+        if pdf_data is None:
             pdf_data = self.pdf_uploads[pdf_id]
+        return {
+            'ID_PDF': pdf_id,
+            'Numero_PTrab': pdf_data.get('numero_ptrab', ''),
+            'Data_Homologacao': pdf_data['data_homologacao'],
+            'Usuario': pdf_data['usuario'],
+            'OM_Usuario': pdf_data['om_usuario'],
+            'Nome_Operacao': pdf_data['dados_operacao'].get('nome_operacao', ''),
+            'Periodo': pdf_data['dados_operacao'].get('periodo', ''),
+            'Local': pdf_data['dados_operacao'].get('local', ''),
+            'Solicitante': pdf_data['dados_operacao'].get('solicitante', ''),
+            'Efetivo_Total': pdf_data['dados_operacao'].get('efetivo_total', ''),
+            'Valor_Operacao': pdf_data.get('valor_operacao', 0),
+            'Status': 'APROVADO',
+            'Tipo_Operacao': 'PREPARO' if pdf_data.get('tipo_operacao', '1') == '2' else 'EMPREGO',
+            'Homologador': pdf_data['homologador']
+        }
+    
+    def _garantir_journal_nc_auditor(self):
+        """Na primeira execução, importa para o diário (tabela nc_auditor) as linhas já existentes:
+        do diário em JSON Lines, se houver, senão da planilha"""
+        if storage.get_configuracao('migracao_nc_auditor_em'):
+            return
+        
+        linhas = []
+        if os.path.exists(self.nc_auditor_journal):
+            with open(self.nc_auditor_journal, 'r', encoding='utf-8') as f:
+                linhas = [json.loads(linha) for linha in f if linha.strip()]
+        elif os.path.exists(self.nc_auditor_file):
+            import pandas as pd
+            df = pd.read_excel(self.nc_auditor_file)
+            df = df.astype(object).where(pd.notna(df), None)
+            linhas = df.to_dict('records')
+        
+        with storage.transacao() as conn:
+            # Outro processo pode ter feito a importação enquanto esperávamos a transação
+            if storage.get_configuracao('migracao_nc_auditor_em'):
+                return
+            if linhas:
+                storage.registrar_linhas_nc_auditor(linhas)
+            storage.set_configuracoes({'migracao_nc_auditor_em': datetime.now().isoformat()}, conn)
+        if linhas:
+            print(f"📦 NC Auditor: {len(linhas)} linha(s) migrada(s) para o SQLite")
+    
+    def ler_journal_nc_auditor(self, ano=None):
+        """Lê as linhas do diário da NC Auditor (exercício aberto) ou de um exercício arquivado"""
+        if ano is not None and ano in arquivo_morto.anos('nc_auditor'):
+            return arquivo_morto.ler('nc_auditor', ano, [])
+        
+        self._garantir_journal_nc_auditor()
+        return storage.carregar_linhas_nc_auditor()
+    
+    def materializar_nc_auditor(self):
+        """Gera nc_auditor.xlsx a partir do diário, apenas se houver aprovações novas"""
+        try:
+            self._garantir_journal_nc_auditor()
             
-            nc_auditor_file = 'nc_auditor.xlsx'
-            
-            # Criar ou carregar planilha existente
-            if os.path.exists(nc_auditor_file):
-                df = pd.read_excel(nc_auditor_file)
-            else:
-                df = pd.DataFrame(columns=[
-                    'ID_PDF', 'Numero_PTrab', 'Data_Homologacao', 'Usuario', 'OM_Usuario',
-                    'Nome_Operacao', 'Periodo', 'Local', 'Solicitante',
-                    'Efetivo_Total', 'Valor_Operacao', 'Status', 'Tipo_Operacao', 'Homologador'
-                ])
-            
-            # Adicionar nova linha
-            nova_linha = {
-                'ID_PDF': pdf_id,
-                'Numero_PTrab': pdf_data.get('numero_ptrab', ''),
-                'Data_Homologacao': pdf_data['data_homologacao'],
-                'Usuario': pdf_data['usuario'],
-                'OM_Usuario': pdf_data['om_usuario'],
-                'Nome_Operacao': pdf_data['dados_operacao'].get('nome_operacao', ''),
-                'Periodo': pdf_data['dados_operacao'].get('periodo', ''),
-                'Local': pdf_data['dados_operacao'].get('local', ''),
-                'Solicitante': pdf_data['dados_operacao'].get('solicitante', ''),
-                'Efetivo_Total': pdf_data['dados_operacao'].get('efetivo_total', ''),
-                'Valor_Operacao': pdf_data['valor_operacao'],
-                'Status': 'APROVADO',
-                'Tipo_Operacao': 'PREPARO' if pdf_data.get('tipo_operacao', '1') == '2' else 'EMPREGO',
-                'Homologador': pdf_data['homologador']
-            }
-            
-            df = pd.concat([df, pd.DataFrame([nova_linha])], ignore_index=True)
-            df.to_excel(nc_auditor_file, index=False)
-            
+            with trava_arquivo(self.nc_auditor_file):
+                versao = storage.versao('nc_auditor')
+                if (os.path.exists(self.nc_auditor_file) and
+                        storage.get_configuracao('nc_auditor_materializado_versao') == versao):
+                    return True
+                
+                from openpyxl import Workbook
+                
+                # write_only grava em fluxo, sem manter a planilha inteira em memória
+                wb = Workbook(write_only=True)
+                ws = wb.create_sheet()
+                ws.append(NC_AUDITOR_COLUNAS)
+                for linha in self.ler_journal_nc_auditor():
+                    ws.append([linha.get(coluna) for coluna in NC_AUDITOR_COLUNAS])
+                
+                gravar_arquivo_atomico(self.nc_auditor_file, wb.save)
+                storage.set_configuracoes({'nc_auditor_materializado_versao': versao})
             return True
             
         except Exception as e:
-            st.error(f"Erro ao carregar na planilha NC Auditor: {e}")
+            st.error(f"Erro ao gerar a planilha NC Auditor: {e}")
             return False
 
+    def arquivar_exercicios(self, ano_aberto):
+        """Move para o arquivo morto os uploads já homologados e as linhas da NC Auditor de exercícios encerrados.
+        O exercício é o da homologação, como no diário do saldo e na NC Auditor"""
+        with self.operacao():
+            por_ano = {}
+            for pdf_id, pdf_data in self.pdf_uploads.items():
+                # Registros antigos sem data de homologação ficam no ano do envio
+                ano = ano_do_registro(pdf_data.get('data_homologacao') or pdf_data.get('data_upload'))
+                # Pendentes continuam no exercício aberto até serem homologados
+                if ano and ano < ano_aberto and pdf_data['status'] != 'pendente':
+                    por_ano.setdefault(ano, {})[pdf_id] = pdf_data
+            
+            for ano, registros in por_ano.items():
+                arquivo_morto.acrescentar('pdf_uploads', ano, registros)
+                storage.registrar_uploads_arquivados(ano, registros)
+            arquivados = [pdf_id for registros in por_ano.values() for pdf_id in registros]
+            if arquivados:
+                storage.excluir_registros('pdf_uploads', arquivados)
+                pdf_search_index.remover_lote(arquivados)
+                print(f"📦 {len(arquivados)} upload(s) arquivado(s): {sorted(por_ano)}")
+            
+            self._arquivar_nc_auditor(ano_aberto)
+        return len(arquivados)
+    
+    def _arquivar_nc_auditor(self, ano_aberto):
+        """Separa do diário as linhas de exercícios encerrados; o diário (e a planilha) ficam só com o ano aberto"""
+        self._garantir_journal_nc_auditor()
+        
+        with storage.transacao():
+            por_ano, arquivadas = {}, []
+            for seq, linha in storage.linhas_nc_auditor_anteriores(ano_aberto):
+                ano = ano_do_registro(linha.get('Data_Homologacao'))
+                if ano and ano < ano_aberto:
+                    por_ano.setdefault(ano, []).append(linha)
+                    arquivadas.append(seq)
+            
+            for ano, linhas in por_ano.items():
+                arquivo_morto.acrescentar('nc_auditor', ano, linhas)
+            if arquivadas:
+                storage.excluir_linhas_nc_auditor(arquivadas)
+        
+        return len(arquivadas)
+    
+    def get_pdfs_exercicio(self, ano):
+        """Uploads de um exercício encerrado, lidos sob demanda do arquivo morto"""
+        return arquivo_morto.ler('pdf_uploads', ano, {})
+    
+    def get_exercicios_arquivados(self):
+        """Exercícios com uploads no arquivo morto"""
+        return arquivo_morto.anos('pdf_uploads')
+
 # Instância global do sistema de homologação
 homologacao_system = HomologacaoSystem()
\ No newline at end of file
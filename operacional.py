@@ -10,7 +10,6 @@ from datetime import datetime, timedelta
 import math
 import re
 import locale
-import json
 import pandas as pd
 
 class GeradorPDFPTrab:
@@ -135,35 +134,10 @@ class GeradorPDFPTrab:
             fontName='Helvetica'
         ))
 
-    def obter_numero_controle(self):
-        """Obtém o próximo número de controle sequencial por ano"""
-        ano_atual = datetime.now().year
-        arquivo_controle = 'controle_ptrab.json'
-        
-        try:
-            if os.path.exists(arquivo_controle):
-                with open(arquivo_controle, 'r') as f:
-                    controle = json.load(f)
-            else:
-                controle = {}
-            
-            if str(ano_atual) not in controle:
-                controle[str(ano_atual)] = 1
-            else:
-                controle[str(ano_atual)] += 1
-            
-            # SALVAR ANTES DE RETORNAR para garantir consistência
-            with open(arquivo_controle, 'w') as f:
-                json.dump(controle, f)
-            
-            numero = controle[str(ano_atual)]
-            return f"P Trab Nr {numero:05d}/{ano_atual}"
-            
-        except Exception as e:
-            print(f"Erro ao gerar número de controle: {e}")
-            # Em caso de erro, usar timestamp como fallback
-            timestamp = datetime.now().strftime("%H%M%S")
-            return f"P Trab Nr {timestamp}/{ano_atual}"
+    def obter_numero_controle(self, usuario=None):
+        """Obtém o próximo número de controle sequencial por ano (erros são propagados: nunca inventa um número)"""
+        from controle_numeracao import controle_numeracao
+        return controle_numeracao.emitir(usuario)
 
     def criar_cabecalho_com_brasao(self, dados_cabecalho, numero_controle=None):
         """Cria o cabeçalho do documento com brasão da república"""
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import re
+import secrets
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from pypdf import PdfReader
+    PYPDF_CARREGADO = True
+except ImportError:
+    PYPDF_CARREGADO = False
+
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_CARREGADO = True
+except ImportError:
+    PDFIUM_CARREGADO = False
+
+# Número de controle e TOTAL GERAL impressos pelo gerador (operacional.py) em uma única passada.
+# O total da tabela vem sem ":" (as memórias de cálculo usam "TOTAL GERAL: R$ ...").
+PADRAO_DADOS_PTRAB = re.compile(
+    r'P\s*Trab\s*Nr\s*(?P<numero>\d{1,5})\s*/\s*(?P<ano>\d{4})'
+    r'|TOTAL\s+GERAL\s+(?:R\$\s*)?(?P<total>\d{1,3}(?:\.\d{3})*,\d{2})',
+    re.IGNORECASE
+)
+
+class PDFProcessor:
+    def __init__(self, max_workers=2):
+        # Miniaturas ficam na pasta servida pelo Streamlit em app/static/ (rota pública, sem login:
+        # o nome é um token aleatório, não o pdf_id)
+        self.thumbnails_dir = os.path.join('static', 'pdf_thumbnails')
+        self.thumbnail_largura = 200  # pixels
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf_processor')
+
+    def calcular_sha256(self, file_path, chunk_size=1024 * 1024):
+        """Calcula o SHA-256 do arquivo lendo em blocos"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for bloco in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(bloco)
+        return sha256.hexdigest()
+
+    def contar_paginas(self, file_path):
+        """Retorna o número de páginas do PDF (None se não for possível ler)"""
+        if not PYPDF_CARREGADO:
+            return None
+        try:
+            return len(PdfReader(file_path).pages)
+        except Exception as e:
+            print(f"⚠️ Não foi possível contar as páginas de {file_path}: {e}")
+            return None
+
+    def extrair_texto(self, file_path):
+        """Extrai o texto de todas as páginas do PDF"""
+        if not PYPDF_CARREGADO:
+            return ""
+        try:
+            return "\n".join(pagina.extract_text() or "" for pagina in PdfReader(file_path).pages)
+        except Exception as e:
+            print(f"⚠️ Não foi possível extrair o texto de {file_path}: {e}")
+            return ""
+
+    def extrair_dados_ptrab(self, texto):
+        """Lê o número do P Trab e o TOTAL GERAL do texto do documento"""
+        numero_ptrab = None
+        total_geral = None
+        for match in PADRAO_DADOS_PTRAB.finditer(texto or ""):
+            if match.group('numero') and numero_ptrab is None:
+                numero_ptrab = f"P Trab Nr {match.group('numero').zfill(5)}/{match.group('ano')}"
+            elif match.group('total'):
+                # O total geral do documento é o último impresso
+                total_geral = float(match.group('total').replace('.', '').replace(',', '.'))
+        return numero_ptrab, total_geral
+
+    def gerar_thumbnail(self, file_path):
+        """Renderiza a primeira página do PDF em PNG e retorna o caminho da miniatura"""
+        if not PDFIUM_CARREGADO:
+            return None
+        try:
+            os.makedirs(self.thumbnails_dir, exist_ok=True)
+            thumbnail_path = os.path.join(self.thumbnails_dir, f"{secrets.token_urlsafe(16)}.png")
+
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                pagina = pdf[0]
+                escala = self.thumbnail_largura / pagina.get_width()
+                imagem = pagina.render(scale=escala).to_pil()
+                imagem.save(thumbnail_path, format='PNG', optimize=True)
+            finally:
+                pdf.close()
+
+            return thumbnail_path
+        except Exception as e:
+            print(f"⚠️ Não foi possível gerar a miniatura de {file_path}: {e}")
+            return None
+
+    def extrair_metadados(self, file_path, sha256=None):
+        """Extrai tamanho, número de páginas, SHA-256 e miniatura da primeira página"""
+        return {
+            'tamanho_bytes': os.path.getsize(file_path),
+            'paginas': self.contar_paginas(file_path),
+            'sha256': sha256 or self.calcular_sha256(file_path),
+            'thumbnail': self.gerar_thumbnail(file_path),
+            'processado_em': datetime.now().isoformat()
+        }
+
+    def processar_upload(self, pdf_id, file_path, callback, sha256=None):
+        """Agenda a extração em segundo plano; callback(pdf_id, metadados, texto) recebe o resultado"""
+        return self.executor.submit(self._processar, pdf_id, file_path, callback, sha256)
+
+    def _processar(self, pdf_id, file_path, callback, sha256=None):
+        """Executa a extração no worker e entrega o resultado ao callback"""
+        try:
+            metadados = self.extrair_metadados(file_path, sha256)
+            texto = self.extrair_texto(file_path)
+            metadados['numero_ptrab'], metadados['total_geral'] = self.extrair_dados_ptrab(texto)
+            callback(pdf_id, metadados, texto)
+            return metadados
+        except Exception as e:
+            print(f"❌ Erro ao processar PDF {pdf_id}: {e}")
+            return None
+
+# Instância global do processador de PDFs
+pdf_processor = PDFProcessor()
+
+def reprocessar_uploads():
+    """Reprocessa os uploads já registrados (metadados, número/total do P Trab e índice de busca)"""
+    from homologacao_system import homologacao_system
+
+    pdf_ids = list(homologacao_system.pdf_uploads.keys())
+    print(f"🔄 Reprocessando {len(pdf_ids)} upload(s)...")
+
+    futuros = []
+    for pdf_id in pdf_ids:
+        file_path = homologacao_system.get_pdf_path(pdf_id)
+        if not file_path or not os.path.exists(file_path):
+            # Sem o arquivo, ao menos os dados do registro ficam pesquisáveis
+            print(f"⚠️ Arquivo não encontrado para {pdf_id}")
+            homologacao_system.indexar_pdf(pdf_id)
+            continue
+        sha256 = homologacao_system.pdf_uploads[pdf_id].get('sha256')
+        futuros.append(pdf_processor.processar_upload(pdf_id, file_path, homologacao_system.atualizar_metadados_pdf, sha256))
+
+    processados = sum(1 for futuro in futuros if futuro.result() is not None)
+    print(f"✅ {processados} upload(s) reprocessado(s)")
+
+if __name__ == "__main__":
+    reprocessar_uploads()
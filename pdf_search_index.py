@@ -0,0 +1,201 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime
+from storage import storage
+from serializador import carregar
+
+class PDFSearchIndex:
+    def __init__(self):
+        # Arquivo usado antes das tabelas postings/documentos_busca do banco (importado uma única vez)
+        self.index_file = 'pdf_search_index.json'
+        self.lock = threading.RLock()
+        # Parâmetros do ranking BM25
+        self.k1 = 1.2
+        self.b = 0.75
+        self.migrar_arquivo()
+        self.load_index()
+
+    def sincronizar(self):
+        """Recarrega o índice se outro processo o alterou"""
+        with self.lock:
+            # A transação em curso já gravou no índice: o banco ainda não está confirmado
+            if storage.tem_pendente('indice_busca'):
+                return
+            if storage.versao('indice_busca') != self.versao:
+                self.load_index()
+
+    def load_index(self):
+        """Carrega o índice invertido do banco"""
+        try:
+            versao, postings, comprimentos = storage.carregar_indice_busca()
+        except Exception as e:
+            print(f"Erro ao carregar índice de busca: {e}")
+            versao, postings, comprimentos = None, {}, {}
+        termos = {}
+        for termo, lista in postings.items():
+            for pdf_id in lista:
+                termos.setdefault(pdf_id, []).append(termo)
+        with self.lock:
+            self.versao = versao  # None: a próxima consulta tenta de novo
+            self.postings = postings  # {termo: {pdf_id: frequência}}
+            self.documentos = {pdf_id: {'comprimento': comprimento, 'termos': termos.get(pdf_id, [])}
+                               for pdf_id, comprimento in comprimentos.items()}  # {pdf_id: {comprimento, termos}}
+            self._vocabulario = None
+
+    def migrar_arquivo(self):
+        """Importa uma única vez o índice que era gravado inteiro em arquivo"""
+        if not os.path.exists(self.index_file) or storage.get_configuracao('migracao_indice_busca_em'):
+            return False
+        try:
+            # JSON ou MessagePack, conforme o serializador que gravou
+            with open(self.index_file, 'rb') as f:
+                data = carregar(f.read())
+            frequencias = {}
+            for termo, lista in data.get('postings', {}).items():
+                for pdf_id, frequencia in lista.items():
+                    frequencias.setdefault(pdf_id, {})[termo] = frequencia
+            documentos = {pdf_id: (frequencias.get(pdf_id, {}), documento['comprimento'])
+                          for pdf_id, documento in data.get('documentos', {}).items()}
+            with storage.transacao():
+                if documentos:
+                    storage.indexar_documentos(documentos)
+                storage.set_configuracoes({'migracao_indice_busca_em': datetime.now().isoformat()})
+            print(f"📦 {self.index_file}: {len(documentos)} documento(s) migrado(s)")
+            return True
+        except Exception as e:
+            print(f"❌ Erro na migração do índice de busca para o SQLite: {e}")
+            return False
+
+    def tokenizar(self, texto):
+        """Normaliza (minúsculas, sem acentos, º/ª viram o/a) e separa o texto em termos"""
+        texto = unicodedata.normalize('NFKD', texto or '').lower()
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+        return [termo for termo in re.findall(r'\w+', texto) if len(termo) > 1 or termo.isdigit()]
+
+    def indexar(self, pdf_id, texto):
+        """Indexa (ou reindexa) um documento; no banco, só as linhas dele são regravadas"""
+        termos = self.tokenizar(texto)
+        frequencias = {}
+        for termo in termos:
+            frequencias[termo] = frequencias.get(termo, 0) + 1
+
+        documentos = {pdf_id: (frequencias, len(termos))}
+        try:
+            # Gravação fora de self.lock: quem está numa transação do banco pode estar esperando a trava
+            versao_anterior, nova_versao = storage.indexar_documentos(documentos)
+        except Exception as e:
+            print(f"Erro ao salvar índice de busca: {e}")
+            return
+        storage.apos_commit('indice_busca', lambda: self._aplicar(versao_anterior, nova_versao, documentos=documentos))
+
+    def remover(self, pdf_id):
+        """Remove um documento do índice"""
+        return self.remover_lote([pdf_id]) > 0
+
+    def remover_lote(self, pdf_ids):
+        """Remove vários documentos em uma única transação; retorna quantos foram removidos"""
+        with self.lock:
+            self.sincronizar()
+            removidos = [pdf_id for pdf_id in pdf_ids if pdf_id in self.documentos]
+        if not removidos:
+            return 0
+        try:
+            versao_anterior, nova_versao = storage.remover_documentos_busca(removidos)
+        except Exception as e:
+            print(f"Erro ao salvar índice de busca: {e}")
+            return 0
+        storage.apos_commit('indice_busca', lambda: self._aplicar(versao_anterior, nova_versao, removidos=removidos))
+        return len(removidos)
+
+    def _aplicar(self, versao_anterior, nova_versao, documentos=None, removidos=()):
+        """Aplica a própria gravação ao índice em memória, se ninguém mais gravou desde a última leitura"""
+        with self.lock:
+            if self.versao != versao_anterior:
+                # Outro processo gravou no meio: a próxima consulta recarrega do banco
+                self.versao = None
+                return
+            for pdf_id in removidos:
+                self._remover_postings(pdf_id)
+            for pdf_id, (frequencias, comprimento) in (documentos or {}).items():
+                self._remover_postings(pdf_id)
+                for termo, frequencia in frequencias.items():
+                    self.postings.setdefault(termo, {})[pdf_id] = frequencia
+                self.documentos[pdf_id] = {'comprimento': comprimento, 'termos': list(frequencias)}
+            self._vocabulario = None
+            self.versao = nova_versao
+
+    def _remover_postings(self, pdf_id):
+        """Retira o documento das listas de cada termo"""
+        documento = self.documentos.pop(pdf_id, None)
+        if not documento:
+            return
+        for termo in documento['termos']:
+            lista = self.postings.get(termo)
+            if lista is not None:
+                lista.pop(pdf_id, None)
+                if not lista:
+                    del self.postings[termo]
+
+    def documentos_com_termos(self, termos):
+        """{pdf_id: [termos citados]} dos documentos que contêm algum dos termos exatos (ex.: CODOM, CODUG)"""
+        encontrados = {}
+        with self.lock:
+            self.sincronizar()
+            for termo in termos:
+                chaves = self.tokenizar(str(termo))
+                if len(chaves) != 1:
+                    continue
+                for pdf_id in self.postings.get(chaves[0], ()):
+                    encontrados.setdefault(pdf_id, []).append(termo)
+        return encontrados
+
+    def _termos_com_prefixo(self, prefixo):
+        """Termos do vocabulário que começam com o prefixo (busca binária no vocabulário ordenado)"""
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self.postings)
+        inicio = bisect_left(self._vocabulario, prefixo)
+        termos = []
+        for termo in self._vocabulario[inicio:]:
+            if not termo.startswith(prefixo):
+                break
+            termos.append(termo)
+        return termos
+
+    def buscar(self, consulta, limite=20):
+        """Retorna [(pdf_id, relevância), ...] ordenado pelo BM25; o último termo casa por prefixo"""
+        termos = self.tokenizar(consulta)
+        if not termos:
+            return []
+
+        with self.lock:
+            self.sincronizar()
+            total_documentos = len(self.documentos)
+            if not total_documentos:
+                return []
+            comprimento_medio = sum(d['comprimento'] for d in self.documentos.values()) / total_documentos
+
+            pontuacao = {}
+            for posicao, termo in enumerate(termos):
+                # Permite achar "batalh" -> "batalhao" enquanto o usuário digita
+                if posicao == len(termos) - 1 and len(termo) >= 3:
+                    variantes = self._termos_com_prefixo(termo)
+                else:
+                    variantes = [termo] if termo in self.postings else []
+
+                for variante in variantes:
+                    lista = self.postings[variante]
+                    idf = math.log(1 + (total_documentos - len(lista) + 0.5) / (len(lista) + 0.5))
+                    for pdf_id, frequencia in lista.items():
+                        comprimento = self.documentos[pdf_id]['comprimento']
+                        peso = frequencia * (self.k1 + 1) / (
+                            frequencia + self.k1 * (1 - self.b + self.b * comprimento / comprimento_medio))
+                        pontuacao[pdf_id] = pontuacao.get(pdf_id, 0) + idf * peso
+
+        return sorted(pontuacao.items(), key=lambda item: item[1], reverse=True)[:limite]
+
+# Instância global do índice de busca dos P Trab
+pdf_search_index = PDFSearchIndex()
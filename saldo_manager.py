@@ -1,52 +1,159 @@
-import json
-import os
+import threading
 from datetime import datetime
+from functools import wraps
+from storage import storage
+from arquivo_morto import arquivo_morto, ano_do_registro
+
+def operacao_exclusiva(metodo):
+    """Executa a operação dentro de uma transação de escrita (exclusiva entre processos),
+    partindo do saldo mais recente gravado por qualquer processo.
+    A trava do saldo é obtida antes do BEGIN IMMEDIATE, como em homologacao_system.operacao()"""
+    @wraps(metodo)
+    def executar(self, *args, **kwargs):
+        try:
+            with self.lock, storage.transacao(duravel=True):
+                self.sincronizar()
+                return metodo(self, *args, **kwargs)
+        except Exception:
+            # A transação foi desfeita: descartar o que foi alterado em memória
+            self.load_saldo()
+            raise
+    return executar
 
 class SaldoManager:
     def __init__(self):
-        self.saldo_file = 'saldo_preparo.json'
         self.saldo_inicial = 5000000.00  # R$ 5.000.000,00
+        self.intervalo_snapshot = 100  # transações entre duas fotografias do saldo
+        self.lock = threading.RLock()
+        self.indice_arquivado = None  # (exercícios, {('ptrab'|'id', chave): abatimento})
         self.load_saldo()
     
     def load_saldo(self):
-        """Carrega o saldo do arquivo JSON"""
+        """Reconstrói o saldo a partir da última fotografia e das transações posteriores"""
         try:
-            if os.path.exists(self.saldo_file):
-                with open(self.saldo_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.saldo_atual = data.get('saldo_atual', self.saldo_inicial)
-                    self.transacoes = data.get('transacoes', [])
-            else:
-                self.saldo_atual = self.saldo_inicial
-                self.transacoes = []
-                self.save_saldo()
+            snapshot = storage.carregar_snapshot_saldo()
+            if snapshot is None:
+                # Primeira execução: parte do saldo migrado (ou do inicial) na posição atual do diário
+                saldo = storage.get_configuracao('saldo_atual', self.saldo_inicial)
+                snapshot = (storage.ultima_seq_saldo(), saldo)
+                storage.salvar_snapshot_saldo(*snapshot)
+            
+            with self.lock:
+                # O histórico completo só é lido quando alguém precisa dele
+                self._transacoes = None
+                self.ultima_transacao, self.saldo_atual = snapshot
+                self.transacoes_desde_snapshot = 0
+                self.sincronizar()
         except Exception as e:
             print(f"Erro ao carregar saldo: {e}")
+            self._transacoes = None
             self.saldo_atual = self.saldo_inicial
-            self.transacoes = []
+            self.ultima_transacao = 0
+            self.transacoes_desde_snapshot = 0
+    
+    def sincronizar(self):
+        """Aplica as transações do diário posteriores à última lida (inclusive as de outros processos)"""
+        with self.lock:
+            cauda = storage.carregar_transacoes_saldo_desde(self.ultima_transacao)
+            for seq, transacao in cauda:
+                self.saldo_atual = self._aplicar_transacao(self.saldo_atual, transacao)
+                self.ultima_transacao = seq
+                if self._transacoes is not None:
+                    self._indexar([transacao])
+            self.transacoes_desde_snapshot += len(cauda)
+    
+    @property
+    def transacoes(self):
+        """Histórico completo das transações (carregado e indexado sob demanda)"""
+        with self.lock:
+            if self._transacoes is None:
+                self._carregar_historico()
+            return self._transacoes
+    
+    def _carregar_historico(self):
+        """Lê o histórico até a última transação já aplicada ao saldo e monta os índices"""
+        self._transacoes = []
+        # Primeiro abatimento de cada id / P Trab (o que é procurado nas duplicidades e estornos)
+        self.abatimentos_por_id = {}
+        self.abatimentos_por_ptrab = {}
+        self._indexar(storage.carregar_transacoes_saldo(ate_seq=self.ultima_transacao))
+    
+    def _indexar(self, novas_transacoes):
+        """Acrescenta as transações ao histórico e aos índices"""
+        for transacao in novas_transacoes:
+            self._transacoes.append(transacao)
+            if transacao['tipo'] == 'abatimento':
+                self.abatimentos_por_id.setdefault(transacao.get('id'), transacao)
+                if transacao.get('numero_ptrab'):
+                    self.abatimentos_por_ptrab.setdefault(transacao['numero_ptrab'], transacao)
+    
+    def get_abatimento(self, pdf_id=None, numero_ptrab=None):
+        """Retorna o abatimento original pelo id ou pelo número do P Trab (None se não houver)"""
+        self.transacoes  # garante o histórico indexado
+        if numero_ptrab is not None:
+            abatimento = self.abatimentos_por_ptrab.get(numero_ptrab)
+        else:
+            abatimento = self.abatimentos_por_id.get(pdf_id)
+        if abatimento is None and self.exercicios_arquivados():
+            abatimento = self._abatimento_arquivado(pdf_id, numero_ptrab)
+        return abatimento
     
-    def save_saldo(self):
-        """Salva o saldo no arquivo JSON"""
+    def _abatimento_arquivado(self, pdf_id=None, numero_ptrab=None):
+        """Procura o abatimento nos exercícios encerrados (P Trab de anos anteriores)"""
+        anos = tuple(self.exercicios_arquivados())
+        with self.lock:
+            if self.indice_arquivado is None or self.indice_arquivado[0] != anos:
+                # Índice montado uma vez por conjunto de exercícios arquivados
+                indice = {}
+                for ano in sorted(anos):
+                    for transacao in self.get_extrato_exercicio(ano):
+                        if transacao['tipo'] == 'abatimento':
+                            indice.setdefault(('id', transacao.get('id')), transacao)
+                            if transacao.get('numero_ptrab'):
+                                indice.setdefault(('ptrab', transacao['numero_ptrab']), transacao)
+                self.indice_arquivado = (anos, indice)
+            if numero_ptrab is not None:
+                return self.indice_arquivado[1].get(('ptrab', numero_ptrab))
+            return self.indice_arquivado[1].get(('id', pdf_id))
+    
+    def _aplicar_transacao(self, saldo, transacao):
+        """Aplica uma transação do diário ao saldo"""
+        if transacao['tipo'] == 'abatimento':
+            return saldo - transacao['valor']
+        # Estorno devolve o valor; no reset o valor é a diferença até o saldo inicial
+        return saldo + transacao['valor']
+    
+    def save_saldo(self, novas_transacoes):
+        """Acrescenta as novas transações ao diário e tira uma fotografia a cada intervalo_snapshot.
+        Falhas são repassadas: a transação (e a homologação que a contém) é desfeita e o saldo recarregado."""
         try:
-            data = {
-                'saldo_inicial': self.saldo_inicial,
-                'saldo_atual': self.saldo_atual,
-                'transacoes': self.transacoes,
-                'ultima_atualizacao': datetime.now().isoformat()
-            }
-            with open(self.saldo_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.ultima_transacao = storage.registrar_transacoes_saldo(list(novas_transacoes))
+            if self._transacoes is not None:
+                self._indexar(novas_transacoes)
+            
+            self.transacoes_desde_snapshot += len(novas_transacoes)
+            if self.transacoes_desde_snapshot >= self.intervalo_snapshot:
+                self.salvar_snapshot()
         except Exception as e:
             print(f"Erro ao salvar saldo: {e}")
+            raise
+    
+    def salvar_snapshot(self):
+        """Registra o saldo atual como ponto de partida para a próxima carga"""
+        storage.salvar_snapshot_saldo(self.ultima_transacao, self.saldo_atual)
+        self.transacoes_desde_snapshot = 0
     
     def get_saldo_atual(self):
         """Retorna o saldo atual formatado"""
+        self.sincronizar()
         return self.saldo_atual
     
     def get_saldo_formatado(self):
         """Retorna o saldo formatado em moeda brasileira"""
+        self.sincronizar()
         return f"R$ {self.saldo_atual:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     
+    @operacao_exclusiva
     def abater_valor(self, pdf_id, valor, descricao, homologador):
         """Abate um valor do saldo (para PDFs aprovados)"""
         if valor <= 0:
@@ -68,20 +175,20 @@ class SaldoManager:
             'saldo_posterior': self.saldo_atual
         }
         
-        self.transacoes.append(transacao)
-        self.save_saldo()
+        self.save_saldo([transacao])
         
         return True, f"Valor de R$ {valor:,.2f} abatido com sucesso. Novo saldo: {self.get_saldo_formatado()}"
     
-    def abater_valor_por_ptrab(self, numero_ptrab, valor, descricao, homologador):
-        """Abate um valor do saldo usando número do P Trab como identificador"""
+    @operacao_exclusiva
+    def abater_valor_por_ptrab(self, numero_ptrab, valor, descricao, homologador, data=None):
+        """Abate um valor do saldo usando número do P Trab como identificador.
+        data: momento da homologação (define o exercício da transação, o mesmo do upload e da NC Auditor)"""
         if valor <= 0:
             return False, "Valor deve ser maior que zero"
         
         # Verificar se já existe transação para este P Trab
-        for transacao in self.transacoes:
-            if transacao.get('numero_ptrab') == numero_ptrab and transacao['tipo'] == 'abatimento':
-                return False, f"Já existe um abatimento para o P Trab {numero_ptrab}"
+        if self.get_abatimento(numero_ptrab=numero_ptrab):
+            return False, f"Já existe um abatimento para o P Trab {numero_ptrab}"
         
         if self.saldo_atual < valor:
             return False, f"Saldo insuficiente. Saldo atual: {self.get_saldo_formatado()}"
@@ -95,24 +202,61 @@ class SaldoManager:
             'valor': valor,
             'descricao': descricao,
             'homologador': homologador,
-            'data': datetime.now().isoformat(),
+            'data': data or datetime.now().isoformat(),
             'saldo_anterior': self.saldo_atual + valor,
             'saldo_posterior': self.saldo_atual
         }
         
-        self.transacoes.append(transacao)
-        self.save_saldo()
+        self.save_saldo([transacao])
         
         return True, f"Valor de R$ {valor:,.2f} abatido com sucesso para {numero_ptrab}. Novo saldo: {self.get_saldo_formatado()}"
     
+    @operacao_exclusiva
+    def abater_lote(self, itens, homologador, data=None):
+        """Abate vários P Trab de uma vez: itens = [(numero_ptrab, valor, descricao), ...]; salva uma única vez.
+        data: momento da homologação do lote"""
+        numeros_lote = set()
+        total = 0
+        
+        # Validar o lote inteiro antes de alterar o saldo
+        for numero_ptrab, valor, descricao in itens:
+            if valor <= 0:
+                return False, f"Valor deve ser maior que zero ({numero_ptrab})"
+            if self.get_abatimento(numero_ptrab=numero_ptrab):
+                return False, f"Já existe um abatimento para o P Trab {numero_ptrab}"
+            if numero_ptrab in numeros_lote:
+                return False, f"P Trab {numero_ptrab} repetido no lote"
+            numeros_lote.add(numero_ptrab)
+            total += valor
+        
+        if self.saldo_atual < total:
+            return False, f"Saldo insuficiente para o lote (R$ {total:,.2f}). Saldo atual: {self.get_saldo_formatado()}"
+        
+        data = data or datetime.now().isoformat()
+        novas_transacoes = []
+        for numero_ptrab, valor, descricao in itens:
+            self.saldo_atual -= valor
+            novas_transacoes.append({
+                'id': f"PTRAB_{numero_ptrab}",
+                'numero_ptrab': numero_ptrab,
+                'tipo': 'abatimento',
+                'valor': valor,
+                'descricao': descricao,
+                'homologador': homologador,
+                'data': data,
+                'saldo_anterior': self.saldo_atual + valor,
+                'saldo_posterior': self.saldo_atual
+            })
+        
+        self.save_saldo(novas_transacoes)
+        
+        return True, f"Lote de {len(itens)} P Trab (R$ {total:,.2f}) abatido com sucesso. Novo saldo: {self.get_saldo_formatado()}"
+    
+    @operacao_exclusiva
     def estornar_valor(self, pdf_id, homologador):
         """Estorna um valor previamente abatido (para PDFs excluídos/rejeitados)"""
         # Encontrar a transação pelo ID do PDF
-        transacao_encontrada = None
-        for transacao in self.transacoes:
-            if transacao['id'] == pdf_id and transacao['tipo'] == 'abatimento':
-                transacao_encontrada = transacao
-                break
+        transacao_encontrada = self.get_abatimento(pdf_id=pdf_id)
         
         if not transacao_encontrada:
             return False, "Transação não encontrada para estorno"
@@ -131,19 +275,15 @@ class SaldoManager:
             'saldo_posterior': self.saldo_atual
         }
         
-        self.transacoes.append(transacao_estorno)
-        self.save_saldo()
+        self.save_saldo([transacao_estorno])
         
         return True, f"Valor de R$ {valor_estorno:,.2f} estornado com sucesso. Novo saldo: {self.get_saldo_formatado()}"
     
-    def estornar_valor_por_ptrab(self, numero_ptrab, homologador):
-        """Estorna um valor previamente abatido usando número do P Trab"""
+    @operacao_exclusiva
+    def estornar_valor_por_ptrab(self, numero_ptrab, homologador, data=None):
+        """Estorna um valor previamente abatido usando número do P Trab (data: momento da nova homologação)"""
         # Encontrar a transação pelo número do P Trab
-        transacao_encontrada = None
-        for transacao in self.transacoes:
-            if transacao.get('numero_ptrab') == numero_ptrab and transacao['tipo'] == 'abatimento':
-                transacao_encontrada = transacao
-                break
+        transacao_encontrada = self.get_abatimento(numero_ptrab=numero_ptrab)
         
         if not transacao_encontrada:
             return False, f"Transação não encontrada para P Trab {numero_ptrab}"
@@ -158,20 +298,54 @@ class SaldoManager:
             'valor': valor_estorno,
             'descricao': f"Estorno: {transacao_encontrada['descricao']}",
             'homologador': homologador,
-            'data': datetime.now().isoformat(),
+            'data': data or datetime.now().isoformat(),
             'saldo_anterior': self.saldo_atual - valor_estorno,
             'saldo_posterior': self.saldo_atual
         }
         
-        self.transacoes.append(transacao_estorno)
-        self.save_saldo()
+        self.save_saldo([transacao_estorno])
         
         return True, f"Valor de R$ {valor_estorno:,.2f} estornado com sucesso para P Trab {numero_ptrab}. Novo saldo: {self.get_saldo_formatado()}"
     
     def get_extrato(self, limite=50):
         """Retorna o extrato das transações"""
-        return self.transacoes[-limite:] if self.transacoes else []
+        self.sincronizar()
+        if self._transacoes is not None:
+            return self._transacoes[-limite:]
+        return storage.ultimas_transacoes_saldo(limite)
+    
+    def get_extrato_exercicio(self, ano):
+        """Transações de um exercício encerrado, lidas sob demanda do arquivo morto"""
+        transacoes = arquivo_morto.ler('saldo_transacoes', ano, {})
+        return [transacoes[seq] for seq in sorted(transacoes, key=int)]
+    
+    def exercicios_arquivados(self):
+        """Exercícios com transações no arquivo morto"""
+        return arquivo_morto.anos('saldo_transacoes')
+    
+    @operacao_exclusiva
+    def arquivar_exercicios(self, ano_aberto):
+        """Move as transações de exercícios encerrados para o arquivo morto; o saldo segue pela fotografia"""
+        antigas = storage.transacoes_saldo_anteriores(ano_aberto)
+        if not antigas:
+            return 0
+        
+        # A fotografia cobre tudo o que sai do diário
+        self.salvar_snapshot()
+        por_ano = {}
+        for seq, transacao in antigas:
+            por_ano.setdefault(ano_do_registro(transacao.get('data')), {})[str(seq)] = transacao
+        for ano, transacoes in por_ano.items():
+            arquivo_morto.acrescentar('saldo_transacoes', ano, transacoes)
+        storage.excluir_transacoes_saldo([seq for seq, _ in antigas])
+        
+        # O histórico em memória passa a conter apenas o exercício aberto
+        self._transacoes = None
+        self.indice_arquivado = None
+        print(f"📦 {len(antigas)} transação(ões) de saldo arquivada(s): {sorted(por_ano)}")
+        return len(antigas)
     
+    @operacao_exclusiva
     def resetar_saldo(self, homologador):
         """Reseta o saldo para o valor inicial (apenas para administração)"""
         saldo_anterior = self.saldo_atual
@@ -188,8 +362,8 @@ class SaldoManager:
             'saldo_posterior': self.saldo_atual
         }
         
-        self.transacoes.append(transacao)
-        self.save_saldo()
+        self.save_saldo([transacao])
+        self.salvar_snapshot()
         
         return True, f"Saldo resetado para {self.get_saldo_formatado()}"
 
@@ -0,0 +1,90 @@
+import json
+import os
+
+try:
+    import orjson
+    ORJSON_CARREGADO = True
+except ImportError:
+    ORJSON_CARREGADO = False
+
+try:
+    import msgpack
+    MSGPACK_CARREGADO = True
+except ImportError:
+    MSGPACK_CARREGADO = False
+
+class SerializadorJSON:
+    """JSON da biblioteca padrão (texto)"""
+    nome = 'json'
+    binario = False
+
+    def dumps(self, dados):
+        return json.dumps(dados, ensure_ascii=False)
+
+    def loads(self, conteudo):
+        return json.loads(conteudo)
+
+class SerializadorOrjson:
+    """JSON via orjson: mesmo formato em texto, serialização bem mais rápida"""
+    nome = 'orjson'
+    binario = False
+
+    def dumps(self, dados):
+        return orjson.dumps(dados, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+
+    def loads(self, conteudo):
+        return orjson.loads(conteudo)
+
+class SerializadorMsgpack:
+    """MessagePack (binário): menor e mais rápido de ler, porém não legível"""
+    nome = 'msgpack'
+    binario = True
+
+    def dumps(self, dados):
+        return msgpack.packb(dados, use_bin_type=True)
+
+    def loads(self, conteudo):
+        return msgpack.unpackb(conteudo, raw=False, strict_map_key=False)
+
+def serializadores_disponiveis():
+    """{nome: serializador} dos formatos cujas bibliotecas estão instaladas"""
+    disponiveis = {'json': SerializadorJSON()}
+    if ORJSON_CARREGADO:
+        disponiveis['orjson'] = SerializadorOrjson()
+    if MSGPACK_CARREGADO:
+        disponiveis['msgpack'] = SerializadorMsgpack()
+    return disponiveis
+
+def obter_serializador(nome=None):
+    """Serializador escolhido em PTRAB_SERIALIZADOR (json, orjson, msgpack); padrão: json.
+    orjson e msgpack são opcionais (fora do requirements.txt) e só gravam quando escolhidos"""
+    disponiveis = serializadores_disponiveis()
+    nome = nome or os.environ.get('PTRAB_SERIALIZADOR') or 'json'
+    if nome not in disponiveis:
+        print(f"⚠️ Serializador '{nome}' indisponível; usando json")
+        return disponiveis['json']
+    return disponiveis[nome]
+
+# Leitura de texto JSON pelo caminho mais rápido disponível
+_leitor_json = SerializadorOrjson() if ORJSON_CARREGADO else SerializadorJSON()
+
+def carregar(conteudo):
+    """Lê conteúdo gravado por qualquer serializador: bytes que não começam como JSON são MessagePack"""
+    if isinstance(conteudo, (bytes, bytearray, memoryview)):
+        conteudo = bytes(conteudo)
+        if conteudo.lstrip()[:1] in (b'{', b'[', b'"') or not conteudo.strip():
+            return _leitor_json.loads(conteudo)
+        if not MSGPACK_CARREGADO:
+            raise ValueError("Conteúdo em MessagePack, mas o pacote msgpack não está instalado")
+        return SerializadorMsgpack().loads(conteudo)
+    return _leitor_json.loads(conteudo)
+
+def para_bytes(conteudo):
+    """Conteúdo serializado pronto para gravar em arquivo binário"""
+    return conteudo if isinstance(conteudo, bytes) else conteudo.encode('utf-8')
+
+if __name__ == "__main__":
+    # Converte o banco para o serializador configurado (o índice de busca fica em colunas, sem serialização)
+    from storage import storage
+    print(f"🔄 Convertendo para {storage.serializador.nome}...")
+    print(f"✅ {storage.converter_serializacao()} registro(s) convertido(s)")
@@ -0,0 +1,615 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from serializador import obter_serializador, carregar
+
+class SQLiteStorage:
+    def __init__(self, db_file='ptrab_log.db'):
+        self.db_file = db_file
+        # sqlite3 não compartilha conexões entre threads: uma conexão por thread
+        self.local = threading.local()
+        # Formato dos registros e transações (PTRAB_SERIALIZADOR); a leitura aceita qualquer formato já gravado
+        self.serializador = obter_serializador()
+        # Coleções carregadas, compartilhadas por todas as sessões do processo: {colecao: [versão, registros]}
+        self.cache = {}
+        self.cache_lock = threading.RLock()
+        self.criar_tabelas()
+        self.migrar_arquivos_json()
+
+    def conexao(self):
+        """Retorna a conexão da thread atual (WAL: leitores não bloqueiam escritores)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def transacao(self, duravel=False):
+        """Transação de escrita; BEGIN IMMEDIATE reserva a escrita (também entre processos) logo no início.
+        Transações aninhadas viram SAVEPOINTs; duravel=True faz o commit externo aguardar o fsync."""
+        conn = self.conexao()
+        profundidade = getattr(self.local, 'profundidade', 0)
+        if profundidade:
+            nome = f"sp_{profundidade}"
+            conn.execute(f"SAVEPOINT {nome}")
+            self.local.profundidade = profundidade + 1
+            pendentes = len(self.local.cache_pendente)
+            try:
+                yield conn
+                conn.execute(f"RELEASE {nome}")
+            except Exception:
+                conn.execute(f"ROLLBACK TO {nome}")
+                conn.execute(f"RELEASE {nome}")
+                # Gravações desfeitas não chegam ao cache
+                del self.local.cache_pendente[pendentes:]
+                raise
+            finally:
+                self.local.profundidade = profundidade
+            return
+        
+        if duravel:
+            conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("BEGIN IMMEDIATE")
+        self.local.profundidade = 1
+        # Atualizações de memória feitas dentro da transação [(colecao, aplicar)]: só valem após o COMMIT
+        self.local.cache_pendente = []
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.local.profundidade = 0
+            pendentes, self.local.cache_pendente = self.local.cache_pendente, []
+            if duravel:
+                conn.execute("PRAGMA synchronous=NORMAL")
+        for _, aplicar in pendentes:
+            aplicar()
+
+    def criar_tabelas(self):
+        """Cria as tabelas caso ainda não existam"""
+        with self.transacao() as conn:
+            # Coleções chave -> registro JSON (users, password_tokens, pdf_uploads, homologacao_data)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS registros (
+                    colecao TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    PRIMARY KEY (colecao, chave)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS saldo_transacoes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT,
+                    numero_ptrab TEXT,
+                    tipo TEXT NOT NULL,
+                    dados TEXT NOT NULL
+                )
+            """)
+            # Fotografias periódicas do saldo: o estado é a última fotografia + as transações posteriores
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS saldo_snapshots (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ultima_transacao INTEGER NOT NULL,
+                    saldo_atual REAL NOT NULL,
+                    data TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS configuracoes (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL
+                )
+            """)
+            # Registro de cada número de controle: reservado -> emitido, ou nao_utilizado
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS numeros_controle (
+                    ano INTEGER NOT NULL,
+                    numero INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    processo TEXT,
+                    usuario TEXT,
+                    documento TEXT,
+                    motivo TEXT,
+                    reservado_em TEXT NOT NULL,
+                    atualizado_em TEXT NOT NULL,
+                    PRIMARY KEY (ano, numero)
+                )
+            """)
+            # Versão de cada coleção, incrementada por gatilho a cada linha gravada (inclusive por
+            # edições feitas fora da aplicação): detecção de mudanças entre processos
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS versoes (
+                    colecao TEXT PRIMARY KEY,
+                    versao INTEGER NOT NULL
+                )
+            """)
+            for evento, linha in [('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')]:
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS versao_registros_{evento.lower()}
+                    AFTER {evento} ON registros
+                    BEGIN
+                        INSERT INTO versoes (colecao, versao) VALUES ({linha}.colecao, 1)
+                        ON CONFLICT(colecao) DO UPDATE SET versao = versao + 1;
+                    END
+                """)
+            # Uploads no arquivo morto, por conteúdo: evita descompactar os exercícios a cada consulta
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploads_arquivados (
+                    pdf_id TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    ano INTEGER NOT NULL,
+                    status TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_arquivados_sha256 ON uploads_arquivados (sha256)")
+            # Diário da planilha NC Auditor: uma linha por aprovação, gravada na transação da homologação
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS nc_auditor (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id_pdf TEXT,
+                    data_homologacao TEXT,
+                    dados TEXT NOT NULL
+                )
+            """)
+            for evento in ('INSERT', 'DELETE'):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS versao_nc_auditor_{evento.lower()}
+                    AFTER {evento} ON nc_auditor
+                    BEGIN
+                        INSERT INTO versoes (colecao, versao) VALUES ('nc_auditor', 1)
+                        ON CONFLICT(colecao) DO UPDATE SET versao = versao + 1;
+                    END
+                """)
+            # Índice de busca dos P Trab (pdf_search_index): cada documento grava só as próprias linhas
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documentos_busca (
+                    pdf_id TEXT PRIMARY KEY,
+                    comprimento INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    termo TEXT NOT NULL,
+                    pdf_id TEXT NOT NULL,
+                    frequencia INTEGER NOT NULL,
+                    PRIMARY KEY (termo, pdf_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_pdf_id ON postings (pdf_id)")
+            for evento in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS versao_documentos_busca_{evento.lower()}
+                    AFTER {evento} ON documentos_busca
+                    BEGIN
+                        INSERT INTO versoes (colecao, versao) VALUES ('indice_busca', 1)
+                        ON CONFLICT(colecao) DO UPDATE SET versao = versao + 1;
+                    END
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS contadores (
+                    nome TEXT PRIMARY KEY,
+                    valor INTEGER NOT NULL
+                )
+            """)
+
+    # VERSÕES
+
+    def versao(self, colecao):
+        """Versão atual da coleção (0 se nunca foi gravada)"""
+        linha = self.conexao().execute("SELECT versao FROM versoes WHERE colecao = ?", (colecao,)).fetchone()
+        return linha[0] if linha else 0
+
+    # COLEÇÕES
+
+    def carregar_colecao(self, colecao):
+        """Retorna todos os registros da coleção como {chave: registro}"""
+        cursor = self.conexao().execute("SELECT chave, valor FROM registros WHERE colecao = ?", (colecao,))
+        return {chave: carregar(valor) for chave, valor in cursor}
+
+    def colecao_compartilhada(self, colecao):
+        """Registros da coleção compartilhados entre as sessões; só relê o banco se a versão mudou
+        (gravação de outro processo ou edição externa)"""
+        with self.cache_lock:
+            # A versão é lida antes dos dados: no pior caso provoca uma recarga a mais
+            versao = self.versao(colecao)
+            em_cache = self.cache.get(colecao)
+            if em_cache is None or em_cache[0] != versao:
+                if self.tem_pendente(colecao):
+                    # A transação em curso já gravou na coleção: a leitura vê dados ainda não confirmados,
+                    # que não podem ir para o cache compartilhado
+                    return self.carregar_colecao(colecao)
+                em_cache = self.cache[colecao] = [versao, self.carregar_colecao(colecao)]
+            return em_cache[1]
+
+    def invalidar_cache(self, colecao=None):
+        """Descarta a coleção (ou todas) do cache; a próxima leitura vai ao banco"""
+        with self.cache_lock:
+            if colecao is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(colecao, None)
+
+    def apos_commit(self, colecao, aplicar):
+        """Chama aplicar() (atualização de dados em memória da coleção) depois do COMMIT da transação em curso,
+        ou na hora, fora de transação; se a transação for desfeita, aplicar nunca é chamado"""
+        if getattr(self.local, 'profundidade', 0):
+            self.local.cache_pendente.append((colecao, aplicar))
+            return
+        aplicar()
+
+    def tem_pendente(self, colecao):
+        """Se a transação em curso já gravou na coleção (dados ainda não confirmados)"""
+        return any(pendente == colecao for pendente, _ in getattr(self.local, 'cache_pendente', ()))
+
+    def _atualizar_cache(self, colecao, versao_anterior, nova_versao, registros=None, excluidas=()):
+        """Aplica a própria gravação ao cache; dentro de uma transação, apenas depois do COMMIT"""
+        self.apos_commit(colecao, lambda: self._aplicar_ao_cache(colecao, versao_anterior, nova_versao,
+                                                                 registros, excluidas))
+
+    def _aplicar_ao_cache(self, colecao, versao_anterior, nova_versao, registros=None, excluidas=()):
+        """Troca a coleção em cache por uma cópia com a gravação, se ninguém mais gravou desde a última leitura.
+        O dicionário anterior não é alterado: quem o está percorrendo (outra sessão) não é afetado."""
+        with self.cache_lock:
+            em_cache = self.cache.get(colecao)
+            if em_cache is None or em_cache[0] != versao_anterior:
+                # Outro processo gravou no meio: a próxima leitura recarrega
+                return
+            atualizados = dict(em_cache[1])
+            if registros:
+                atualizados.update(registros)
+            for chave in excluidas:
+                atualizados.pop(chave, None)
+            self.cache[colecao] = [nova_versao, atualizados]
+
+    def carregar_registro(self, colecao, chave):
+        """Retorna um registro da coleção (None se não existir)"""
+        linha = self.conexao().execute(
+            "SELECT valor FROM registros WHERE colecao = ? AND chave = ?", (colecao, chave)
+        ).fetchone()
+        return carregar(linha[0]) if linha else None
+
+    def salvar_registros(self, colecao, registros):
+        """Grava (insere ou atualiza) apenas os registros informados, em uma transação; retorna a nova versão"""
+        with self.transacao() as conn:
+            versao_anterior = self.versao(colecao)
+            conn.executemany(
+                "INSERT OR REPLACE INTO registros (colecao, chave, valor) VALUES (?, ?, ?)",
+                [(colecao, chave, self.serializador.dumps(valor)) for chave, valor in registros.items()]
+            )
+            nova_versao = self.versao(colecao)
+        self._atualizar_cache(colecao, versao_anterior, nova_versao, registros=registros)
+        return nova_versao
+
+    def salvar_registro(self, colecao, chave, valor):
+        """Grava um único registro"""
+        return self.salvar_registros(colecao, {chave: valor})
+
+    def excluir_registro(self, colecao, chave):
+        """Remove um registro da coleção; retorna a nova versão"""
+        with self.transacao() as conn:
+            versao_anterior = self.versao(colecao)
+            conn.execute("DELETE FROM registros WHERE colecao = ? AND chave = ?", (colecao, chave))
+            nova_versao = self.versao(colecao)
+        self._atualizar_cache(colecao, versao_anterior, nova_versao, excluidas=[chave])
+        return nova_versao
+
+    def excluir_registros(self, colecao, chaves):
+        """Remove vários registros da coleção em uma única transação"""
+        with self.transacao() as conn:
+            versao_anterior = self.versao(colecao)
+            conn.executemany("DELETE FROM registros WHERE colecao = ? AND chave = ?", [(colecao, chave) for chave in chaves])
+            nova_versao = self.versao(colecao)
+        self._atualizar_cache(colecao, versao_anterior, nova_versao, excluidas=chaves)
+        return nova_versao
+
+    # ÍNDICE DE BUSCA
+
+    def carregar_indice_busca(self):
+        """Retorna (versão, {termo: {pdf_id: frequência}}, {pdf_id: comprimento}) de um mesmo retrato do banco"""
+        conn = self.conexao()
+        # Transação de leitura (WAL): versão, postings e documentos vêm do mesmo instante, sem bloquear a escrita
+        em_transacao = getattr(self.local, 'profundidade', 0)
+        if not em_transacao:
+            conn.execute("BEGIN")
+        try:
+            versao = self.versao('indice_busca')
+            postings = {}
+            for termo, pdf_id, frequencia in conn.execute("SELECT termo, pdf_id, frequencia FROM postings"):
+                postings.setdefault(termo, {})[pdf_id] = frequencia
+            documentos = dict(conn.execute("SELECT pdf_id, comprimento FROM documentos_busca"))
+        finally:
+            if not em_transacao:
+                conn.execute("COMMIT")
+        return versao, postings, documentos
+
+    def indexar_documentos(self, documentos):
+        """Grava {pdf_id: (frequências por termo, comprimento)} substituindo apenas as linhas desses documentos;
+        retorna (versão anterior, nova versão) do índice"""
+        with self.transacao() as conn:
+            versao_anterior = self.versao('indice_busca')
+            conn.executemany("DELETE FROM postings WHERE pdf_id = ?", [(pdf_id,) for pdf_id in documentos])
+            conn.executemany(
+                "INSERT INTO postings (termo, pdf_id, frequencia) VALUES (?, ?, ?)",
+                [(termo, pdf_id, frequencia) for pdf_id, (frequencias, _) in documentos.items()
+                 for termo, frequencia in frequencias.items()]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO documentos_busca (pdf_id, comprimento) VALUES (?, ?)",
+                [(pdf_id, comprimento) for pdf_id, (_, comprimento) in documentos.items()]
+            )
+            return versao_anterior, self.versao('indice_busca')
+
+    def remover_documentos_busca(self, pdf_ids):
+        """Retira documentos do índice de busca; retorna (versão anterior, nova versão)"""
+        with self.transacao() as conn:
+            versao_anterior = self.versao('indice_busca')
+            conn.executemany("DELETE FROM postings WHERE pdf_id = ?", [(pdf_id,) for pdf_id in pdf_ids])
+            conn.executemany("DELETE FROM documentos_busca WHERE pdf_id = ?", [(pdf_id,) for pdf_id in pdf_ids])
+            return versao_anterior, self.versao('indice_busca')
+
+    # CONFIGURAÇÕES
+
+    def get_configuracao(self, chave, padrao=None):
+        """Lê um valor de configuração"""
+        linha = self.conexao().execute("SELECT valor FROM configuracoes WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(linha[0]) if linha else padrao
+
+    def set_configuracoes(self, valores, conn=None):
+        """Grava valores de configuração (opcionalmente dentro de uma transação já aberta)"""
+        linhas = [(chave, json.dumps(valor, ensure_ascii=False)) for chave, valor in valores.items()]
+        if conn is not None:
+            conn.executemany("INSERT OR REPLACE INTO configuracoes (chave, valor) VALUES (?, ?)", linhas)
+            return
+        with self.transacao() as conn:
+            conn.executemany("INSERT OR REPLACE INTO configuracoes (chave, valor) VALUES (?, ?)", linhas)
+
+    # SALDO
+
+    def carregar_transacoes_saldo(self, ate_seq=None):
+        """Retorna as transações de saldo na ordem em que foram registradas (opcionalmente até ate_seq)"""
+        if ate_seq is None:
+            cursor = self.conexao().execute("SELECT dados FROM saldo_transacoes ORDER BY seq")
+        else:
+            cursor = self.conexao().execute("SELECT dados FROM saldo_transacoes WHERE seq <= ? ORDER BY seq", (ate_seq,))
+        return [carregar(dados) for (dados,) in cursor]
+
+    def carregar_transacoes_saldo_desde(self, seq):
+        """Retorna [(seq, transação), ...] registradas depois de seq (cauda do diário)"""
+        cursor = self.conexao().execute("SELECT seq, dados FROM saldo_transacoes WHERE seq > ? ORDER BY seq", (seq,))
+        return [(numero, carregar(dados)) for numero, dados in cursor]
+
+    def transacoes_saldo_anteriores(self, ano):
+        """Retorna [(seq, transação), ...] com data anterior ao exercício ano"""
+        # Filtro em Python: em MessagePack o conteúdo não é legível por json_extract
+        return [(numero, transacao) for numero, transacao in self.carregar_transacoes_saldo_desde(0)
+                if (transacao.get('data') or '') < f"{ano}-"]
+
+    def excluir_transacoes_saldo(self, seqs):
+        """Retira transações do diário (após arquivadas); o saldo segue pela fotografia"""
+        with self.transacao() as conn:
+            conn.executemany("DELETE FROM saldo_transacoes WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def ultimas_transacoes_saldo(self, limite):
+        """Retorna as últimas transações em ordem cronológica"""
+        cursor = self.conexao().execute("SELECT dados FROM saldo_transacoes ORDER BY seq DESC LIMIT ?", (limite,))
+        return [carregar(dados) for (dados,) in cursor][::-1]
+
+    def ultima_seq_saldo(self):
+        """Retorna a seq da última transação registrada (0 se não houver)"""
+        return self.conexao().execute("SELECT COALESCE(MAX(seq), 0) FROM saldo_transacoes").fetchone()[0]
+
+    def registrar_transacoes_saldo(self, transacoes):
+        """Acrescenta as transações ao diário (fsync a cada gravação) e retorna a seq da última"""
+        # WAL + synchronous=FULL: o commit só retorna depois do fsync do diário
+        with self.transacao(duravel=True) as conn:
+            self._inserir_transacoes_saldo(conn, transacoes)
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM saldo_transacoes").fetchone()[0]
+
+    def carregar_snapshot_saldo(self):
+        """Retorna (ultima_transacao, saldo_atual) da fotografia mais recente, ou None"""
+        return self.conexao().execute(
+            "SELECT ultima_transacao, saldo_atual FROM saldo_snapshots ORDER BY seq DESC LIMIT 1"
+        ).fetchone()
+
+    def salvar_snapshot_saldo(self, ultima_transacao, saldo_atual):
+        """Registra uma fotografia do saldo após a transação ultima_transacao"""
+        with self.transacao() as conn:
+            conn.execute(
+                "INSERT INTO saldo_snapshots (ultima_transacao, saldo_atual, data) VALUES (?, ?, ?)",
+                (ultima_transacao, saldo_atual, datetime.now().isoformat())
+            )
+
+    def _inserir_transacoes_saldo(self, conn, transacoes):
+        conn.executemany(
+            "INSERT INTO saldo_transacoes (id, numero_ptrab, tipo, dados) VALUES (?, ?, ?, ?)",
+            [(t.get('id'), t.get('numero_ptrab'), t['tipo'], self.serializador.dumps(t)) for t in transacoes]
+        )
+
+    # UPLOADS ARQUIVADOS
+
+    def registrar_uploads_arquivados(self, ano, registros):
+        """Indexa pelo SHA-256 os uploads {pdf_id: registro} movidos para o arquivo morto do exercício ano"""
+        with self.transacao() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO uploads_arquivados (pdf_id, sha256, ano, status) VALUES (?, ?, ?, ?)",
+                [(pdf_id, registro['sha256'], ano, registro.get('status'))
+                 for pdf_id, registro in registros.items() if registro.get('sha256')]
+            )
+
+    def buscar_upload_arquivado(self, sha256, status=None):
+        """(pdf_id, ano, status) de um upload arquivado com o conteúdo (opcionalmente só com o status); None se não houver"""
+        if status is None:
+            return self.conexao().execute(
+                "SELECT pdf_id, ano, status FROM uploads_arquivados WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+        return self.conexao().execute(
+            "SELECT pdf_id, ano, status FROM uploads_arquivados WHERE sha256 = ? AND status = ? LIMIT 1",
+            (sha256, status)).fetchone()
+
+    # NC AUDITOR
+
+    def registrar_linhas_nc_auditor(self, linhas):
+        """Acrescenta linhas ao diário da NC Auditor (na transação em curso, se houver)"""
+        with self.transacao() as conn:
+            conn.executemany(
+                "INSERT INTO nc_auditor (id_pdf, data_homologacao, dados) VALUES (?, ?, ?)",
+                [(linha.get('ID_PDF'), str(linha.get('Data_Homologacao') or ''), self.serializador.dumps(linha))
+                 for linha in linhas]
+            )
+
+    def carregar_linhas_nc_auditor(self):
+        """Linhas do diário da NC Auditor na ordem em que foram registradas"""
+        cursor = self.conexao().execute("SELECT dados FROM nc_auditor ORDER BY seq")
+        return [carregar(dados) for (dados,) in cursor]
+
+    def linhas_nc_auditor_anteriores(self, ano):
+        """Retorna [(seq, linha), ...] homologadas antes do exercício ano"""
+        cursor = self.conexao().execute(
+            "SELECT seq, dados FROM nc_auditor WHERE data_homologacao < ? ORDER BY seq", (f"{ano}-",))
+        return [(seq, carregar(dados)) for seq, dados in cursor]
+
+    def excluir_linhas_nc_auditor(self, seqs):
+        """Retira linhas do diário (após arquivadas)"""
+        with self.transacao() as conn:
+            conn.executemany("DELETE FROM nc_auditor WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def converter_serializacao(self):
+        """Regrava registros e transações no serializador configurado; retorna quantos foram convertidos"""
+        with self.transacao() as conn:
+            linhas = conn.execute("SELECT colecao, chave, valor FROM registros").fetchall()
+            conn.executemany(
+                "UPDATE registros SET valor = ? WHERE colecao = ? AND chave = ?",
+                [(self.serializador.dumps(carregar(valor)), colecao, chave) for colecao, chave, valor in linhas]
+            )
+            transacoes = conn.execute("SELECT seq, dados FROM saldo_transacoes").fetchall()
+            conn.executemany(
+                "UPDATE saldo_transacoes SET dados = ? WHERE seq = ?",
+                [(self.serializador.dumps(carregar(dados)), seq) for seq, dados in transacoes]
+            )
+            linhas_nc = conn.execute("SELECT seq, dados FROM nc_auditor").fetchall()
+            conn.executemany(
+                "UPDATE nc_auditor SET dados = ? WHERE seq = ?",
+                [(self.serializador.dumps(carregar(dados)), seq) for seq, dados in linhas_nc]
+            )
+            convertidos = len(linhas) + len(transacoes) + len(linhas_nc)
+        self.invalidar_cache()
+        return convertidos
+
+    # NÚMEROS DE CONTROLE
+
+    def reservar_numeros_controle(self, ano, quantidade, processo):
+        """Reserva um bloco de números consecutivos do ano (incremento atômico) e retorna a lista"""
+        agora = datetime.now().isoformat()
+        with self.transacao() as conn:
+            ultimo = conn.execute(
+                """INSERT INTO contadores (nome, valor) VALUES (?, ?)
+                   ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor
+                   RETURNING valor""",
+                (f"controle_ptrab_{ano}", quantidade)
+            ).fetchone()[0]
+            numeros = list(range(ultimo - quantidade + 1, ultimo + 1))
+            conn.executemany(
+                """INSERT OR REPLACE INTO numeros_controle (ano, numero, status, processo, reservado_em, atualizado_em)
+                   VALUES (?, ?, 'reservado', ?, ?, ?)""",
+                [(ano, numero, processo, agora, agora) for numero in numeros]
+            )
+        return numeros
+
+    def atualizar_numero_controle(self, ano, numero, status, **campos):
+        """Muda o status de um número (emitido / nao_utilizado) e grava usuario, documento ou motivo"""
+        campos = {chave: valor for chave, valor in campos.items()
+                  if chave in ('usuario', 'documento', 'motivo') and valor is not None}
+        atribuicoes = ''.join(f", {chave} = ?" for chave in campos)
+        with self.transacao() as conn:
+            cursor = conn.execute(
+                f"UPDATE numeros_controle SET status = ?, atualizado_em = ?{atribuicoes} WHERE ano = ? AND numero = ?",
+                (status, datetime.now().isoformat(), *campos.values(), ano, numero)
+            )
+            return cursor.rowcount > 0
+
+    def listar_numeros_controle(self, ano=None, status=None):
+        """Registro dos números de controle, filtrado por ano e/ou status"""
+        condicoes, parametros = [], []
+        if ano is not None:
+            condicoes.append("ano = ?")
+            parametros.append(ano)
+        if status is not None:
+            condicoes.append("status = ?")
+            parametros.append(status)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        cursor = self.conexao().execute(
+            f"""SELECT ano, numero, status, processo, usuario, documento, motivo, reservado_em, atualizado_em
+                FROM numeros_controle {where} ORDER BY ano, numero""",
+            parametros
+        )
+        colunas = [descricao[0] for descricao in cursor.description]
+        return [dict(zip(colunas, linha)) for linha in cursor]
+
+    # MIGRAÇÃO DOS ARQUIVOS JSON
+
+    def migrar_arquivos_json(self):
+        """Importa uma única vez os arquivos JSON usados antes do SQLite"""
+        if self.get_configuracao('migracao_json_em'):
+            return False
+
+        colecoes = {
+            'users': 'users.json',
+            'password_tokens': 'password_tokens.json',
+            'pdf_uploads': 'pdf_uploads.json',
+            'homologacao_data': 'homologacao_data.json'
+        }
+
+        try:
+            with self.transacao() as conn:
+                for colecao, arquivo in colecoes.items():
+                    dados = self._ler_json(arquivo)
+                    if dados:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO registros (colecao, chave, valor) VALUES (?, ?, ?)",
+                            [(colecao, chave, self.serializador.dumps(valor)) for chave, valor in dados.items()]
+                        )
+                        print(f"📦 {arquivo}: {len(dados)} registro(s) migrado(s)")
+
+                saldo = self._ler_json('saldo_preparo.json')
+                if saldo:
+                    self._inserir_transacoes_saldo(conn, saldo.get('transacoes', []))
+                    self.set_configuracoes({
+                        chave: saldo[chave]
+                        for chave in ['saldo_inicial', 'saldo_atual', 'ultima_atualizacao'] if chave in saldo
+                    }, conn)
+                    print(f"📦 saldo_preparo.json: {len(saldo.get('transacoes', []))} transação(ões) migrada(s)")
+
+                controle = self._ler_json('controle_ptrab.json')
+                if controle:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO contadores (nome, valor) VALUES (?, ?)",
+                        [(f"controle_ptrab_{ano}", int(numero)) for ano, numero in controle.items()]
+                    )
+                    print(f"📦 controle_ptrab.json: {len(controle)} ano(s) migrado(s)")
+
+                self.set_configuracoes({'migracao_json_em': datetime.now().isoformat()}, conn)
+            return True
+        except Exception as e:
+            print(f"❌ Erro na migração dos arquivos JSON para o SQLite: {e}")
+            return False
+
+    def _ler_json(self, arquivo):
+        if not os.path.exists(arquivo):
+            return None
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+# Instância global do armazenamento
+storage = SQLiteStorage()
+
+if __name__ == "__main__":
+    print(f"✅ Banco de dados pronto: {storage.db_file}")
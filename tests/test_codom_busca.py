@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from codom_manager import CODOMManager, diferem_em_uma_edicao
+
+@pytest.fixture(scope='module')
+def diretorio(tmp_path_factory):
+    """Diretório carregado do CODOM.xlsx do repositório, com o cache em pasta temporária"""
+    cache = tmp_path_factory.mktemp('codom') / 'codom_cache.bin'
+    manager = CODOMManager(arquivo=os.path.join(RAIZ, 'CODOM.xlsx'), arquivo_cache=str(cache))
+    return manager.snapshot
+
+def descricoes(resultados):
+    return [opcao.split(' - ', 1)[1] for opcao in resultados]
+
+@pytest.mark.parametrize('a, b, esperado', [
+    ('bl', 'bi', True),
+    ('mc', 'mec', True),
+    ('mec', 'mc', True),
+    ('log', 'log', True),
+    ('bl', 'bld', True),
+    ('mc', 'cm', False),
+    ('bl', 'bias', False),
+])
+def test_diferem_em_uma_edicao(a, b, esperado):
+    assert diferem_em_uma_edicao(a, b) is esperado
+
+def test_letra_trocada_em_palavra_curta(diretorio):
+    assert descricoes(diretorio.buscar('40 bl'))[0] == '40º BI'
+
+def test_letra_faltando_em_palavra_curta(diretorio):
+    resultados = descricoes(diretorio.buscar('bda inf mc'))
+    assert 'Cmdo 3ª Bda inf Mec' in resultados
+    assert 'Cmdo 11ª Bda Inf Mec' in resultados
+
+def test_palavra_por_extenso_encontra_abreviatura(diretorio):
+    assert 'B Log' in descricoes(diretorio.buscar('logistica'))[0]
+    assert descricoes(diretorio.buscar('logistica')) == descricoes(diretorio.buscar('logstica'))
+
+def test_numero_nao_aceita_letra_trocada(diretorio):
+    # 41 não é um erro de digitação de 40: seria outra OM
+    assert '41º CT' not in descricoes(diretorio.buscar('40 ct'))
+
+def test_busca_exata_continua_primeiro(diretorio):
+    assert descricoes(diretorio.buscar('40 bi'))[0] == '40º BI'
+    assert diretorio.buscar('xyz') == []